@@ -1,196 +1,138 @@
 import streamlit as st
-import os
-import json
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.prompts import PromptTemplate
-from langchain.memory import ChatMessageHistory
-from langchain_core.runnables.history import RunnableWithMessageHistory
-from dotenv import load_dotenv
+import uuid
+from contextlib import closing
+
+from anakin_core import (
+    find_plan_edit,
+    get_chatbot,
+    get_parse_chain,
+    get_session_history,
+    get_structured_chain,
+    get_task_plan,
+    load_env,
+    semantic_cache_add,
+    settle_plan,
+    stream_parsed_tasks,
+    use_structured_output,
+)
+from chat_view import plan_markdown
+from metrics import setup_from_env, timed
+from resilience import CircuitOpenError, DeadlineExceeded
+from response_cache import get_cache
+from single_flight import suppressed_calls
 
 # Page config
 st.set_page_config(page_title="Anakin - Task Breakdown Assistant", page_icon="🤖")
 
-# Initialize session state for storing chat history
-if 'store' not in st.session_state:
-    st.session_state.store = {}
-
-def get_session_history(session_id: str) -> ChatMessageHistory:
-    if session_id not in st.session_state.store:
-        st.session_state.store[session_id] = ChatMessageHistory()
-    return st.session_state.store[session_id]
-
-# Initialize models
-@st.cache_resource
-def init_models():
-    llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash")
-    
-    template = """
-You are Anakin, an AI assistant designed to help neurodivergent individuals who struggle with starting tasks and maintaining focus.
-Your purpose is to increase their productivity by breaking down any given learning or productivity-related task into clear, manageable, neuro-optimized microtasks.
-
-Guidelines:
-- Always respond with a neutral tone.
-- Only output a step-by-step list of microtasks relevant to the input task.
-- Each microtask should be concise, actionable, and include a relevant emoji to enhance clarity and engagement.
-- Adapt the number and granularity of microtasks based on the task's length and difficulty. Larger or more complex tasks should have more detailed microtasks.
-- Never provide commentary or advice outside of the microtask list, except when the task is unrealistic.
-- If the task is unrealistic (e.g., "Learn full stack web development in one day"), respond with a neutral message indicating it may not be achievable as stated and suggest revising it.
-- If the user does not specify an estimated time range for the task, ask them to provide how much time they expect to spend on it so you can optimize the microtasks more accurately.
-- If the user asks for or implies wanting to know how much time to allocate to each microtask, provide a time estimate for each microtask in the step-by-step list, with each time estimate adding up to the total estimated time.
-
-FORMATTING REQUIREMENTS:
-- Start with a brief header like "📋 Breaking down: [Task Name]" followed by a blank line
-- Present microtasks as a numbered list with clear spacing
-- Use this format for each step:
-  **Step [number]: [Action with emoji]**
-  Brief description if needed
-  ⏱️ **Time:** [X minutes] (if time estimates requested)
-  
-- Add helpful section breaks for complex tasks (e.g., "### 🎯 Phase 1: Setup")
-- End with an encouraging closing line like "✨ You've got this! Take it one step at a time."
-- Use markdown formatting to make the output visually appealing and easy to scan
-- If user specifies a time range, ensure the total estimated time for all microtasks falls within that range.
-- keep the total number of microtasks between 3 to 5 if time is between 1 to 2 hours, increase number of tasks to 5 to 12 if time is between 4-5 unless the task is very complex, And you can keep increase those numbers if times increase in the same manner. 
-
-Chat history:
-{chat_history}
-
-Here is the user's task to break down:
-{input}
-"""
-    
-    prompt = PromptTemplate.from_template(template)
-    chain = prompt | llm
-    
-    chatbot = RunnableWithMessageHistory(
-        chain,
-        get_session_history,
-        input_messages_key="input",
-        history_messages_key="chat_history",
-    )
-    
-    # Second model for parsing
-    llm_2 = ChatGoogleGenerativeAI(model="gemini-2.5-flash")
-    
-    template_2 = """
-You are a task parser that converts formatted task lists into JSON format.
-Your input will be the output from another AI that creates task breakdowns with emojis, formatting, and time estimates.
-
-Your job is to:
-1. Extract only the tasks and their time estimates (for each task respectively)
-2. Return a clean JSON with two fields:
-   - Tasks (numbered as "Task 1", "Task 2", etc.)
-   - Time (numbered as "Time require T1", "Time required T2", etc. )
-
-Remove all formatting, emojis, and extra text. Just extract the core task descriptions and times.
-
-Example input:
-📋 Breaking down: Study for Math Exam
-
-**Step 1: 📚 Review Chapter Notes**
-Organize and read through class notes
-⏱️ **Time:** 30 minutes
-
-**Step 2: 🎯 Practice Problems**
-Work through end-of-chapter exercises
-⏱️ **Time:** 45 minutes
-
-✨ You've got this! Take it one step at a time.
-
-Expected output:
-{{
-    "Task 1": "Review Chapter Notes",
-    "Time required T1": "20 minutes"
-    "Task 2": "Practice Problems",
-    "Time required T2": "75 minutes"
-}}
-
-Here is the task breakdown to parse:
-{input}
-"""
-    
-    prompt_2 = PromptTemplate.from_template(template_2)
-    chain_2 = prompt_2 | llm_2
-    
-    return chatbot, chain_2
+# Every browser session gets its own id, chat history lives in the shared session backend
+if 'session_id' not in st.session_state:
+    # Keep the id in the URL so a page refresh resumes the same session
+    st.session_state.session_id = st.query_params.get("sid") or uuid.uuid4().hex
+    st.query_params["sid"] = st.session_state.session_id
 
 # Main app
 st.title("🤖 Hey, This is Anakin, So what are we doing today?")
 st.markdown("---")
 
 # Check for API key
-load_dotenv()
+load_env()
+# Prometheus endpoint / JSON logs if ANAKIN_METRICS_PORT / ANAKIN_METRICS_LOG are set
+setup_from_env()
 
-# Initialize models
+# Models are built once per process and shared by every session and rerun
 try:
-    chatbot, chain_2 = init_models()
+    get_chatbot()
+    get_parse_chain()
+    get_structured_chain()
 except Exception as e:
     st.error(f"Error initializing models: {e}")
     st.stop()
 
-# User input
-user_input = st.text_area(
-    "What task would you like to break down?",
-    placeholder="e.g., Study for Math exam in 2 hours",
-    height=100
-)
+def render_plan(area, tasks_data, note=None):
+    """Draw the whole plan into area as a single element, replacing what was there."""
+    with timed("render"):
+        area.markdown(plan_markdown(tasks_data, note))
+
+def schedule_note(result):
+    if result.total is None:
+        return None
+    note = f"⏱️ Total: {result.total} minutes"
+    if result.changes:
+        note += f" (adjusted to your time budget: {result.summary})"
+    return note
+
+# Input and plan live in a fragment: pressing the button reruns only this part
+@st.fragment
+def planner():
+    # User input
+    user_input = st.text_area(
+        "What task would you like to break down?",
+        placeholder="e.g., Study for Math exam in 2 hours",
+        height=100
+    )
+    fresh_plan = st.checkbox("Fresh plan (skip cached answers)")
+    one_call = st.checkbox("One-call mode (structured plan, no streaming)", value=use_structured_output())
 
-if st.button("Break it down! 🚀", type="primary"):
-    if user_input:
-        with st.spinner("Anakin is thinking..."):
+    if st.button("Break it down! 🚀", type="primary"):
+        if user_input:
+            task_breakdown = ""
             try:
-                # Get formatted breakdown
-                task_breakdown = chatbot.invoke(
-                    {"input": user_input},
-                    config={"configurable": {"session_id": "user1"}},
-                ).content
-                
-                # Parse to JSON
-                json_response = chain_2.invoke({"input": task_breakdown}).content
-                
-                # Clean JSON response (remove markdown code blocks if present)
-                json_str = json_response.strip()
-                if json_str.startswith("```json"):
-                    json_str = json_str[7:]
-                if json_str.startswith("```"):
-                    json_str = json_str[3:]
-                if json_str.endswith("```"):
-                    json_str = json_str[:-3]
-                json_str = json_str.strip()
-                
-                # Parse JSON
-                tasks_data = json.loads(json_str)
-                
-                # Display results
                 st.markdown("### 📝 Your Task Breakdown")
                 st.markdown("---")
-                
-                # Extract and display tasks
-                task_num = 1
-                while f"Task {task_num}" in tasks_data:
-                    task_key = f"Task {task_num}"
-                    time_key = f"Time required T{task_num}"
-                    
-                    task = tasks_data.get(task_key, "N/A")
-                    time_required = tasks_data.get(time_key, "N/A")
-                    
-                    st.markdown(f"**Task {task_num}:** {task}")
-                    st.markdown(f"**Time required:** {time_required}")
-                    st.markdown("")
-                    
-                    task_num += 1
-                
-                if task_num == 1:
+                status = st.empty()
+                status.caption("Anakin is thinking...")
+                tasks_area = st.empty()
+            
+                session_id = st.session_state.session_id
+                new_conversation = not get_session_history(session_id).messages
+                # "drop step 3", "make it 2 hours instead": the last plan is edited in place
+                editing = not new_conversation and find_plan_edit(user_input, session_id) is not None
+                plan = {}
+                if one_call and not editing:
+                    # The model returns a TaskPlan, nothing to parse
+                    task_plan = get_task_plan(user_input, session_id, not fresh_plan)
+                    task_breakdown = task_plan.to_markdown()
+                    plan = task_plan.to_task_dict()
+                else:
+                    # Show every task as soon as its step closes
+                    # closing(): a rerun that stops this script releases the session right away
+                    with closing(stream_parsed_tasks(user_input, session_id, not fresh_plan)) as tasks:
+                        for task in tasks:
+                            plan.update(task)
+                            render_plan(tasks_area, plan)
+                    if not plan:
+                        # Not a plan (e.g. a question about the time budget), the answer is the last message
+                        messages = get_session_history(session_id).messages
+                        task_breakdown = messages[-1].content if messages else ""
+                status.empty()
+
+                if editing:
+                    render_plan(tasks_area, plan, "✏️ Updated your last plan")
+                elif plan:
+                    # Make the step times add up to the budget in the request
+                    result = settle_plan(user_input, session_id, plan)
+                    plan = result.tasks
+                    render_plan(tasks_area, plan, schedule_note(result))
+                    # The streaming path caches its own plans
+                    if one_call and new_conversation and plan:
+                        semantic_cache_add(user_input, plan)
+
+                if not plan:
                     st.info("No tasks were parsed. Here's the original breakdown:")
                     st.markdown(task_breakdown)
-                
-            except json.JSONDecodeError:
-                st.error("Failed to parse tasks. Here's the raw breakdown:")
-                st.markdown(task_breakdown)
+
+            except CircuitOpenError:
+                st.warning("The model is having trouble right now. Please try again in a minute.")
+            except DeadlineExceeded:
+                st.error("The model took too long to answer. Please try again.")
+                if task_breakdown:
+                    st.markdown(task_breakdown)
             except Exception as e:
                 st.error(f"An error occurred: {e}")
-    else:
-        st.warning("Please enter a task to break down.")
+        else:
+            st.warning("Please enter a task to break down.")
+
+planner()
 
 # Sidebar with info
 with st.sidebar:
@@ -205,7 +147,15 @@ with st.sidebar:
     - Start with smaller goals if unsure
     """)
     
+    cache = get_cache()
+    st.caption(
+        f"Cache hit rate: {cache.hit_rate():.0%} "
+        f"({cache.stats['memory_hits'] + cache.stats['disk_hits']} hits, "
+        f"{cache.stats['misses']} misses)"
+    )
+    st.caption(f"Duplicate requests served from calls in flight: {suppressed_calls()}")
+    
     if st.button("Clear History"):
-        st.session_state.store = {}
+        get_session_history(st.session_state.session_id).clear()
         st.success("Chat history cleared!")
         st.rerun()
\ No newline at end of file
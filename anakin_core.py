@@ -0,0 +1,1064 @@
+import os
+import json
+import asyncio
+import uuid
+import threading
+
+from metrics import PLAN_EDITS, SCHEDULES, install_llm_metrics, timed
+from plan_editor import SPLIT_TEMPLATE, apply_edit, classify_followup, parse_split, split_input
+from plan_library import lookup_plan
+from response_cache import get_cache, make_key, normalize_input, template_version
+from router import (
+    arun_cascade,
+    breakdown_problem,
+    helper_route,
+    local_breakdown,
+    local_plan,
+    plan_problem,
+    route_request,
+    run_cascade,
+)
+from scheduler import enforce_budget, step_count_range
+from semantic_cache import get_semantic_cache
+from single_flight import get_single_flight, session_guard
+from task_parser import (
+    BreakdownParseError,
+    BreakdownParser,
+    iter_task_dicts,
+    parse_breakdown,
+    record_parse,
+    render_tasks_markdown,
+    strip_code_fence,
+    tasks_to_json,
+    to_task_dict,
+)
+
+# --- Anakin core ---
+# Prompts, LLM clients and the planning pipeline shared by every entry point
+# (anakin.py, anakin_app.py, app.py, batch_planner.py). Importing this module
+# is cheap and has no side effects: .env is read, LangChain is imported and
+# clients are built only when a chain is first needed, and then reused by
+# the whole process.
+
+DEFAULT_MODEL = os.environ.get("ANAKIN_MODEL", "gemini-2.5-flash")
+# Cheaper tier for simple requests and side calls (router.py)
+FAST_MODEL = os.environ.get("ANAKIN_FAST_MODEL", "gemini-2.5-flash-lite")
+FAKE_MODEL = "fake-anakin"
+FAKE_FAST_MODEL = "fake-anakin-fast"
+
+BREAKDOWN_GUIDELINES = """
+You are Anakin, an AI assistant designed to help neurodivergent individuals who struggle with starting tasks and maintaining focus.
+Your purpose is to increase their productivity by breaking down any given learning or productivity-related task into clear, manageable, neuro-optimized microtasks.
+
+Guidelines:
+- Always respond with a neutral tone.
+- Only output a step-by-step list of microtasks relevant to the input task.
+- Each microtask should be concise, actionable, and include a relevant emoji to enhance clarity and engagement.
+- Adapt the number and granularity of microtasks based on the task's length and difficulty. Larger or more complex tasks should have more detailed microtasks.
+- Never provide commentary or advice outside of the microtask list, except when the task is unrealistic.
+- If the task is unrealistic (e.g., "Learn full stack web development in one day"), respond with a neutral message indicating it may not be achievable as stated and suggest revising it.
+- If the user does not specify an estimated time range for the task, ask them to provide how much time they expect to spend on it so you can optimize the microtasks more accurately.
+- If the user asks for or implies wanting to know how much time to allocate to each microtask, provide a time estimate for each microtask in the step-by-step list, with each time estimate adding up to the total estimated time.
+"""
+
+BREAKDOWN_FORMAT = """
+FORMATTING REQUIREMENTS:
+- Start with a brief header like "📋 Breaking down: [Task Name]" followed by a blank line
+- Present microtasks as a numbered list with clear spacing
+- Use this format for each step:
+  **Step [number]: [Action with emoji]**
+  Brief description if needed
+  ⏱️ **Time:** [X minutes] (if time estimates requested)
+  
+- Add helpful section breaks for complex tasks (e.g., "### 🎯 Phase 1: Setup")
+- End with an encouraging closing line like "✨ You've got this! Take it one step at a time."
+- Use markdown formatting to make the output visually appealing and easy to scan
+- If user specifies a time range, ensure the total estimated time for all microtasks falls within that range.
+- keep the total number of microtasks between 3 to 5 if time is between 1 to 2 hours, increase number of tasks to 5 to 12 if time is between 4-5 unless the task is very complex, And you can keep increase those numbers if times increase in the same manner. 
+"""
+
+BREAKDOWN_INPUT = """
+Chat history:
+{chat_history}
+
+Here is the user's task to break down:
+{input}
+"""
+
+BREAKDOWN_TEMPLATE = BREAKDOWN_GUIDELINES + BREAKDOWN_FORMAT + BREAKDOWN_INPUT
+
+# One-call mode: the model fills in a TaskPlan (task_plan.py) instead of
+# writing markdown, so no parsing step is needed.
+STRUCTURED_FORMAT = """
+OUTPUT REQUIREMENTS:
+- Answer with a TaskPlan, not with text. The markdown shown to the user is rendered from it.
+- header is the task name. Each step has a short actionable title without emoji, one relevant emoji in emoji, and an optional one-sentence description.
+- Group steps into phases (e.g. "🎯 Phase 1: Setup") only for complex tasks, otherwise use a single phase without a name.
+- If time estimates are requested or the user specifies a time range, set minutes on every step and keep the total within that range; otherwise leave minutes empty on every step.
+- If the task is unrealistic or the time range is missing, return no phases and put the neutral message in message.
+- keep the total number of microtasks between 3 to 5 if time is between 1 to 2 hours, increase number of tasks to 5 to 12 if time is between 4-5 unless the task is very complex, And you can keep increase those numbers if times increase in the same manner.
+"""
+
+STRUCTURED_TEMPLATE = BREAKDOWN_GUIDELINES + STRUCTURED_FORMAT + BREAKDOWN_INPUT
+
+PARSER_TEMPLATE = """
+You are a task parser that converts formatted task lists into JSON format.
+Your input will be the output from another AI that creates task breakdowns with emojis, formatting, and time estimates.
+
+Your job is to:
+1. Extract only the tasks and their time estimates (for each task respectively)
+2. Return a clean JSON with two fields:
+   - Tasks (numbered as "Task 1", "Task 2", etc.)
+   - Time (numbered as "Time require T1", "Time required T2", etc. )
+
+Remove all formatting, emojis, and extra text. Just extract the core task descriptions and times.
+
+Example input:
+📋 Breaking down: Study for Math Exam
+
+**Step 1: 📚 Review Chapter Notes**
+Organize and read through class notes
+⏱️ **Time:** 30 minutes
+
+**Step 2: 🎯 Practice Problems**
+Work through end-of-chapter exercises
+⏱️ **Time:** 45 minutes
+
+✨ You've got this! Take it one step at a time.
+
+Expected output:
+{{
+    "Task 1": "Review Chapter Notes",
+    "Time required T1": "20 minutes"
+    "Task 2": "Practice Problems",
+    "Time required T2": "75 minutes"
+}}
+
+Here is the task breakdown to parse:
+{input}
+"""
+
+def use_fake_llm() -> bool:
+    # ANAKIN_FAKE_LLM=1 swaps Gemini for the local stand-in in fake_llm.py
+    return bool(os.environ.get("ANAKIN_FAKE_LLM"))
+
+def use_structured_output() -> bool:
+    # ANAKIN_STRUCTURED_OUTPUT=1 plans with one structured call by default
+    return bool(os.environ.get("ANAKIN_STRUCTURED_OUTPUT"))
+
+def model_name(model=None) -> str:
+    """The model to use when none is given explicitly."""
+    if model:
+        return model
+    return FAKE_MODEL if use_fake_llm() else DEFAULT_MODEL
+
+def tier_model(tier: str) -> str:
+    """The model behind a router tier: "fast" or "strong" (the default model)."""
+    if tier == "fast":
+        return FAKE_FAST_MODEL if use_fake_llm() else FAST_MODEL
+    return model_name()
+
+# --- Lazily built, process-wide clients and chains ---
+_registry = {}
+_registry_lock = threading.RLock()
+_env_loaded = False
+
+def load_env():
+    global _env_loaded
+    if _env_loaded:
+        return
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+    except ImportError:
+        print("Env variables not found")
+    _env_loaded = True
+
+def _registered(key, build):
+    with _registry_lock:
+        if key not in _registry:
+            _registry[key] = build()
+        return _registry[key]
+
+def reset_registry():
+    """Forget every client and chain (tests, benchmarks, config changes)."""
+    with _registry_lock:
+        _registry.clear()
+
+def get_llm(model=None, **config):
+    """
+    Chat model client for model and config, built on first use and shared
+    afterwards, so every caller reuses the same HTTP connections.
+    """
+    model = model_name(model)
+
+    def build():
+        install_llm_metrics()
+        if model.startswith("fake"):
+            from fake_llm import FakeChatModel
+            return FakeChatModel.from_env(model, **config)
+        load_env()
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        # Retries are left to the resilience layer (get_resilient_llm)
+        return ChatGoogleGenerativeAI(model=model, **{"max_retries": 1, **config})
+
+    return _registered(("llm", model, tuple(sorted(config.items()))), build)
+
+def get_deadline_llm(model, policy):
+    """get_llm(model) with the client's timeout at the policy's deadline, so no attempt outlives it."""
+    config = {} if policy.deadline is None else {"timeout": policy.deadline}
+    return get_llm(model, **config)
+
+def get_resilient_llm(model=None):
+    """
+    get_llm(model) behind deadlines, retries, hedging and a circuit
+    breaker (resilience.py). Every chain calls its model through this.
+    """
+    model = model_name(model)
+
+    def build():
+        from resilience import ResiliencePolicy, resilient
+        policy = ResiliencePolicy.from_env()
+        return resilient(get_deadline_llm(model, policy), model, policy=policy)
+
+    return _registered(("resilient_llm", model), build)
+
+def get_breakdown_prompt():
+    def build():
+        from langchain_core.prompts import PromptTemplate
+        return PromptTemplate.from_template(BREAKDOWN_TEMPLATE)
+    return _registered(("prompt", "breakdown"), build)
+
+def get_breakdown_chain(model=None):
+    """Breakdown chain without memory: the caller passes chat_history as messages."""
+    model = model_name(model)
+
+    def build():
+        from langchain_core.runnables import RunnablePassthrough
+
+        # History arrives as message objects, render it as plain text for the template
+        return (
+            RunnablePassthrough.assign(chat_history=lambda x: history_text(x["chat_history"]))
+            | get_breakdown_prompt()
+            | get_resilient_llm(model)
+        )
+
+    return _registered(("breakdown_chain", model), build)
+
+def get_chatbot(model=None):
+    """Breakdown chain with per-session memory."""
+    model = model_name(model)
+
+    def build():
+        from langchain_core.runnables.history import RunnableWithMessageHistory
+
+        return RunnableWithMessageHistory(
+            get_breakdown_chain(model),
+            get_session_history,
+            input_messages_key="input",
+            history_messages_key="chat_history",
+        )
+
+    return _registered(("chatbot", model), build)
+
+def get_parse_chain(model=None):
+    """Second model that turns a breakdown into JSON, used as a fallback."""
+    model = model_name(model)
+
+    def build():
+        from langchain_core.prompts import PromptTemplate
+        return PromptTemplate.from_template(PARSER_TEMPLATE) | get_resilient_llm(model)
+
+    return _registered(("parse_chain", model), build)
+
+def history_text(messages) -> str:
+    from chat_memory import format_history
+    with timed("prompt_format"):
+        return format_history(messages)
+
+def get_structured_chain(model=None):
+    """Breakdown model that answers with a TaskPlan in a single call."""
+    model = model_name(model)
+
+    def build():
+        from langchain_core.prompts import PromptTemplate
+        from resilience import ResiliencePolicy, resilient
+        from task_plan import TaskPlan
+        policy = ResiliencePolicy.from_env()
+        llm = get_deadline_llm(model, policy).with_structured_output(TaskPlan)
+        prompt = PromptTemplate.from_template(STRUCTURED_TEMPLATE)
+        return prompt | resilient(llm, model, f"{model}:structured", policy=policy)
+
+    return _registered(("structured", model), build)
+
+def get_split_chain(model=None):
+    """Model that splits one step of a plan (plan_editor.py)."""
+    model = model_name(model)
+
+    def build():
+        from langchain_core.prompts import PromptTemplate
+        return PromptTemplate.from_template(SPLIT_TEMPLATE) | get_resilient_llm(model)
+
+    return _registered(("split_chain", model), build)
+
+# --- Memory per session, kept in the shared session backend ---
+# (SQLite by default, ANAKIN_SESSION_BACKEND=memory for process memory)
+def get_session_history(session_id: str):
+    from session_store import get_stored_history
+    return get_stored_history(session_id)
+
+def session_messages(session_id):
+    # A SQLite read with the default backend, async code runs it with asyncio.to_thread
+    return get_session_history(session_id).messages
+
+def semantic_namespace() -> str:
+    return f"{template_version(BREAKDOWN_TEMPLATE)}:{model_name()}"
+
+def breakdown_cache_key(user_input, session_id="user1"):
+    history = get_session_history(session_id)
+    return make_key("breakdown", user_input, BREAKDOWN_TEMPLATE, model_name(), history.messages)
+
+def record_turn(user_input, session_id, answer):
+    history = get_session_history(session_id)
+    history.add_user_message(user_input)
+    history.add_ai_message(answer)
+
+def use_cached_breakdown(user_input, session_id, key):
+    """
+    Return the cached breakdown for key, recording the turn in the
+    session history as if the model had answered. None on a miss.
+    """
+    cached = get_cache().get(key)
+    if cached is not None:
+        record_turn(user_input, session_id, cached)
+    return cached
+
+# --- One call per identical request, one generation per session (single_flight.py) ---
+def coalesced(stage, key, session_id, generate, record):
+    """
+    Run generate() while holding the session, once for all concurrent
+    calls with key. A duplicate from another session gets the answer
+    added to its own history with record(answer).
+    """
+    def run():
+        with session_guard.hold(session_id):
+            return generate(), session_id
+
+    (answer, leader_session), shared = get_single_flight(stage).do(key, run)
+    if shared and leader_session != session_id:
+        record(answer)
+    return answer
+
+async def acoalesced(stage, key, session_id, generate, record):
+    async def run():
+        async with session_guard.ahold(session_id):
+            return await generate(), session_id
+
+    (answer, leader_session), shared = await get_single_flight(stage).ado(key, run)
+    if shared and leader_session != session_id:
+        await asyncio.to_thread(record, answer)
+    return answer
+
+# --- Model tiers (router.py) ---
+def routed_answer(user_input, session_id):
+    """
+    Answer user_input from the tier the router picks, escalating answers
+    that don't parse. The session history is read, not written.
+    """
+    messages = get_session_history(session_id).messages
+    route = route_request(user_input, len(messages))
+
+    def call(tier):
+        if tier == "local":
+            return local_breakdown(user_input)
+        chain = get_breakdown_chain(tier_model(tier))
+        return chain.invoke({"input": user_input, "chat_history": messages}).content
+
+    return run_cascade(route, call, lambda answer: breakdown_problem(answer, user_input))
+
+def routed_breakdown(user_input, session_id):
+    """routed_answer, with the turn added to the session history."""
+    answer = routed_answer(user_input, session_id)
+    record_turn(user_input, session_id, answer)
+    return answer
+
+async def arouted_answer(user_input, session_id):
+    messages = await asyncio.to_thread(session_messages, session_id)
+    route = route_request(user_input, len(messages))
+
+    async def call(tier):
+        if tier == "local":
+            return local_breakdown(user_input)
+        chain = get_breakdown_chain(tier_model(tier))
+        return (await chain.ainvoke({"input": user_input, "chat_history": messages})).content
+
+    return await arun_cascade(route, call, lambda answer: breakdown_problem(answer, user_input))
+
+async def arouted_breakdown(user_input, session_id):
+    answer = await arouted_answer(user_input, session_id)
+    await asyncio.to_thread(record_turn, user_input, session_id, answer)
+    return answer
+
+def run_chatbot(user_input, session_id="user1", use_cache=True):
+    # use_cache=False always asks the model for a fresh plan
+    key = breakdown_cache_key(user_input, session_id)
+    if use_cache:
+        cached = use_cached_breakdown(user_input, session_id, key)
+        if cached is not None:
+            return cached
+
+    def generate():
+        # The history may have grown while waiting for the session
+        fresh_key = breakdown_cache_key(user_input, session_id)
+        answer = routed_breakdown(user_input, session_id)
+        get_cache().set(fresh_key, answer)
+        return answer
+
+    return coalesced(
+        "breakdown", key, session_id, generate,
+        lambda answer: record_turn(user_input, session_id, answer),
+    )
+
+async def arun_chatbot(user_input, session_id="user1", use_cache=True):
+    key = await asyncio.to_thread(breakdown_cache_key, user_input, session_id)
+    if use_cache:
+        cached = await asyncio.to_thread(use_cached_breakdown, user_input, session_id, key)
+        if cached is not None:
+            return cached
+
+    async def generate():
+        fresh_key = await asyncio.to_thread(breakdown_cache_key, user_input, session_id)
+        answer = await arouted_breakdown(user_input, session_id)
+        await asyncio.to_thread(get_cache().set, fresh_key, answer)
+        return answer
+
+    return await acoalesced(
+        "breakdown", key, session_id, generate,
+        lambda answer: record_turn(user_input, session_id, answer),
+    )
+
+def plan_cache_key(user_input, session_id="user1"):
+    history = get_session_history(session_id)
+    return make_key("plan", user_input, STRUCTURED_TEMPLATE, model_name(), history.messages)
+
+def structured_input(user_input, session_id):
+    history = get_session_history(session_id)
+    return {"input": user_input, "chat_history": history_text(history.messages)}
+
+def checked_plan(plan):
+    # with_structured_output gives None when the model makes no tool call
+    if plan is None:
+        raise ValueError("The model answered without a TaskPlan")
+    return plan
+
+def routed_plan(user_input, session_id):
+    """TaskPlan for user_input from the routed tier, escalated when it doesn't validate."""
+    variables = structured_input(user_input, session_id)
+    route = route_request(user_input, len(get_session_history(session_id).messages), "plan")
+
+    def call(tier):
+        if tier == "local":
+            return local_plan(user_input)
+        return checked_plan(get_structured_chain(tier_model(tier)).invoke(variables))
+
+    return run_cascade(route, call, lambda plan: plan_problem(plan, user_input), "plan")
+
+async def arouted_plan(user_input, session_id):
+    variables = await asyncio.to_thread(structured_input, user_input, session_id)
+    route = route_request(user_input, len(await asyncio.to_thread(session_messages, session_id)), "plan")
+
+    async def call(tier):
+        if tier == "local":
+            return local_plan(user_input)
+        return checked_plan(await get_structured_chain(tier_model(tier)).ainvoke(variables))
+
+    return await arun_cascade(route, call, lambda plan: plan_problem(plan, user_input), "plan")
+
+def record_plan(user_input, session_id, key, plan):
+    """Store the plan and add the turn to the session, as markdown."""
+    get_cache().set(key, plan.model_dump_json(exclude_none=True))
+    history = get_session_history(session_id)
+    history.add_user_message(user_input)
+    history.add_ai_message(plan.to_markdown())
+    return plan
+
+def cached_plan(user_input, session_id, key):
+    from task_plan import TaskPlan
+    cached = get_cache().get(key)
+    if cached is None:
+        return None
+    return record_plan(user_input, session_id, key, TaskPlan.model_validate_json(cached))
+
+def get_task_plan(user_input, session_id="user1", use_cache=True):
+    """
+    Plan user_input with a single structured call and return a TaskPlan.
+    Memory and caching work as in run_chatbot; the session history gets
+    the plan rendered as markdown.
+    """
+    key = plan_cache_key(user_input, session_id)
+    if use_cache:
+        plan = cached_plan(user_input, session_id, key)
+        if plan is not None:
+            return plan
+
+    def generate():
+        fresh_key = plan_cache_key(user_input, session_id)
+        plan = routed_plan(user_input, session_id)
+        return record_plan(user_input, session_id, fresh_key, plan)
+
+    return coalesced(
+        "plan", key, session_id, generate,
+        lambda plan: record_plan(user_input, session_id, key, plan),
+    )
+
+async def aget_task_plan(user_input, session_id="user1", use_cache=True):
+    key = await asyncio.to_thread(plan_cache_key, user_input, session_id)
+    if use_cache:
+        plan = await asyncio.to_thread(cached_plan, user_input, session_id, key)
+        if plan is not None:
+            return plan
+
+    async def generate():
+        fresh_key = await asyncio.to_thread(plan_cache_key, user_input, session_id)
+        plan = await arouted_plan(user_input, session_id)
+        return await asyncio.to_thread(record_plan, user_input, session_id, fresh_key, plan)
+
+    return await acoalesced(
+        "plan", key, session_id, generate,
+        lambda plan: record_plan(user_input, session_id, key, plan),
+    )
+
+def parse_with_model(task_breakdown, use_cache=True):
+    key = make_key("parse", task_breakdown, PARSER_TEMPLATE, model_name(), normalize=False)
+    if use_cache:
+        cached = get_cache().get(key)
+        if cached is not None:
+            return cached
+
+    def generate():
+        def call(tier):
+            return get_parse_chain(tier_model(tier)).invoke({"input": task_breakdown}).content
+
+        answer = run_cascade(helper_route("parse"), call, parse_problem, "parse")
+        get_cache().set(key, answer)
+        return answer
+
+    return get_single_flight("parse").do(key, generate)[0]
+
+async def aparse_with_model(task_breakdown, use_cache=True):
+    key = make_key("parse", task_breakdown, PARSER_TEMPLATE, model_name(), normalize=False)
+    if use_cache:
+        cached = await asyncio.to_thread(get_cache().get, key)
+        if cached is not None:
+            return cached
+
+    async def generate():
+        async def call(tier):
+            return (await get_parse_chain(tier_model(tier)).ainvoke({"input": task_breakdown})).content
+
+        answer = await arun_cascade(helper_route("parse"), call, parse_problem, "parse")
+        await asyncio.to_thread(get_cache().set, key, answer)
+        return answer
+
+    return (await get_single_flight("parse").ado(key, generate))[0]
+
+def parse_tasks_to_json(task_breakdown, use_cache=True):
+    """
+    Takes the formatted task breakdown from the first model
+    and returns a clean JSON. The breakdown is parsed locally; the second
+    model is only used when the text doesn't follow the expected format.
+    """
+    try:
+        with timed("parse"):
+            tasks = parse_breakdown(task_breakdown)
+    except BreakdownParseError:
+        record_parse("fallback")
+        return parse_with_model(task_breakdown, use_cache)
+    record_parse("local")
+    return tasks_to_json(tasks)
+
+async def aparse_tasks_to_json(task_breakdown, use_cache=True):
+    try:
+        with timed("parse"):
+            tasks = parse_breakdown(task_breakdown)
+    except BreakdownParseError:
+        record_parse("fallback")
+        return await aparse_with_model(task_breakdown, use_cache)
+    record_parse("local")
+    return tasks_to_json(tasks)
+
+def semantic_cache_lookup(user_input, session_id):
+    """
+    Serve a near-duplicate plan from the semantic cache as a task dict, or
+    None. Plans are only reused at the start of a conversation, later turns
+    depend on what was said before.
+    """
+    history = get_session_history(session_id)
+    if history.messages:
+        return None
+    match = get_semantic_cache(semantic_namespace()).lookup(user_input)
+    if match is None:
+        return None
+    tasks, _ = match
+    history.add_user_message(user_input)
+    history.add_ai_message(render_tasks_markdown(tasks))
+    return tasks
+
+def library_version() -> str:
+    """Stamped on the plan library (plan_library.py), plans from other prompts are stale."""
+    templates = BREAKDOWN_TEMPLATE + STRUCTURED_TEMPLATE + PARSER_TEMPLATE
+    return f"{template_version(templates)}:{model_name()}"
+
+def precomputed_plan(user_input, session_id):
+    """
+    Serve a plan from the precomputed library as a task dict, or None.
+    Like the semantic cache, only at the start of a conversation.
+    """
+    history = get_session_history(session_id)
+    if history.messages:
+        return None
+    tasks = lookup_plan(user_input, library_version())
+    if tasks is None:
+        return None
+    history.add_user_message(user_input)
+    history.add_ai_message(render_tasks_markdown(tasks))
+    history.set_plan(tasks)
+    return tasks
+
+def semantic_cache_add(user_input, tasks):
+    """Remember a plan (task dict or JSON string) for near-duplicate requests."""
+    if isinstance(tasks, str):
+        try:
+            tasks = json.loads(strip_code_fence(tasks))
+        except ValueError:
+            return
+    if tasks:
+        get_semantic_cache(semantic_namespace()).add(user_input, tasks)
+
+# --- Follow-ups that edit the last plan (plan_editor.py) ---
+def find_plan_edit(user_input, session_id):
+    """(history, plan, edit) when user_input edits the session's last plan, else None."""
+    history = get_session_history(session_id)
+    tasks = history.current_plan()
+    if not tasks:
+        return None
+    edit = classify_followup(user_input, sum(1 for _ in iter_task_dicts(tasks)))
+    if edit is None:
+        return None
+    return history, tasks, edit
+
+def split_problem(answer):
+    # Fewer than two pieces: apply_split would fall back to equal parts
+    return None if len(parse_split(answer)) >= 2 else "unparseable"
+
+def split_cache_key(variables):
+    text = json.dumps(variables, sort_keys=True, ensure_ascii=False)
+    return make_key("split", text, SPLIT_TEMPLATE, model_name(), normalize=False)
+
+def record_edit(user_input, history, tasks, edit, answer=None):
+    """Apply the edit and add the turn to the session. None if it can't be applied."""
+    with timed("plan_edit", kind=edit.kind):
+        edited = apply_edit(tasks, edit, user_input, answer)
+    if edited is None:
+        return None
+    history.add_user_message(user_input)
+    history.add_ai_message(render_tasks_markdown(edited))
+    history.set_plan(edited)
+    PLAN_EDITS.inc(kind=edit.kind)
+    return edited
+
+def split_step(tasks, edit, goal, use_cache=True):
+    """The split model's answer for the step edit splits."""
+    variables = split_input(tasks, edit, goal)
+    key = split_cache_key(variables)
+    answer = get_cache().get(key) if use_cache else None
+    if answer is None:
+        def call(tier):
+            return get_split_chain(tier_model(tier)).invoke(variables).content
+
+        answer = run_cascade(helper_route("split"), call, split_problem, "split")
+        get_cache().set(key, answer)
+    return answer
+
+async def asplit_step(tasks, edit, goal, use_cache=True):
+    variables = split_input(tasks, edit, goal)
+    key = split_cache_key(variables)
+    answer = await asyncio.to_thread(get_cache().get, key) if use_cache else None
+    if answer is None:
+        async def call(tier):
+            return (await get_split_chain(tier_model(tier)).ainvoke(variables)).content
+
+        answer = await arun_cascade(helper_route("split"), call, split_problem, "split")
+        await asyncio.to_thread(get_cache().set, key, answer)
+    return answer
+
+def edit_key(user_input, session_id, tasks):
+    # A repeated "drop step 3" on the same plan must not drop two steps
+    return session_id, normalize_input(user_input), tasks_to_json(tasks)
+
+def edit_plan(user_input, session_id="user1", use_cache=True):
+    """
+    Apply a follow-up that edits the session's last plan ("drop step 3",
+    "move step 4 to the top", "make it 2 hours instead", "split step 2")
+    and return the new task dict, or None when user_input needs a new plan
+    from the model. Only a split calls the model, with just that step.
+    """
+    found = find_plan_edit(user_input, session_id)
+    if found is None:
+        return None
+
+    def run():
+        with session_guard.hold(session_id):
+            # The plan may have changed while waiting for the session
+            found = find_plan_edit(user_input, session_id)
+            if found is None:
+                return None
+            history, tasks, edit = found
+            answer = None
+            if edit.kind == "split":
+                answer = split_step(tasks, edit, history.state.goal, use_cache)
+            return record_edit(user_input, history, tasks, edit, answer)
+
+    return get_single_flight("edit").do(edit_key(user_input, session_id, found[1]), run)[0]
+
+async def aedit_plan(user_input, session_id="user1", use_cache=True):
+    found = await asyncio.to_thread(find_plan_edit, user_input, session_id)
+    if found is None:
+        return None
+
+    async def run():
+        async with session_guard.ahold(session_id):
+            found = await asyncio.to_thread(find_plan_edit, user_input, session_id)
+            if found is None:
+                return None
+            history, tasks, edit = found
+            answer = None
+            if edit.kind == "split":
+                answer = await asplit_step(tasks, edit, history.state.goal, use_cache)
+            return await asyncio.to_thread(record_edit, user_input, history, tasks, edit, answer)
+
+    return (await get_single_flight("edit").ado(edit_key(user_input, session_id, found[1]), run))[0]
+
+def load_tasks(json_tasks):
+    """The task dict in a JSON answer, or None if it isn't one."""
+    try:
+        tasks = json.loads(strip_code_fence(json_tasks))
+    except ValueError:
+        return None
+    return tasks if isinstance(tasks, dict) else None
+
+def parse_problem(json_tasks):
+    """Router check for the parser model's answer (router.run_cascade)."""
+    return None if load_tasks(json_tasks) is not None else "invalid_json"
+
+def schedule_tasks(user_input, tasks):
+    """Fit the plan to the time budget in user_input (scheduler.py)."""
+    with timed("schedule"):
+        result = enforce_budget(tasks, user_input)
+    if not result.ok:
+        SCHEDULES.inc(outcome="unfixable")
+    else:
+        SCHEDULES.inc(outcome="adjusted" if result.changes else "unchanged")
+    return result
+
+def needs_regeneration(result) -> bool:
+    # Only a plan with a budget that couldn't be fixed locally goes back to the model
+    return not result.ok and result.budget is not None
+
+def regeneration_input(user_input, result):
+    total = result.budget[1]
+    low, high = step_count_range(total)
+    return (
+        f"{user_input}\n\nPlease answer with {low} to {high} steps "
+        f"whose times add up to {total} minutes."
+    )
+
+def plan_tasks(user_input, session_id, use_cache, structured):
+    """One plan as a task dict (None if the answer isn't one) and its JSON."""
+    if structured:
+        tasks = get_task_plan(user_input, session_id, use_cache).to_task_dict()
+        return tasks, tasks_to_json(tasks)
+    # First get the formatted task breakdown
+    task_breakdown = run_chatbot(user_input, session_id, use_cache)
+    # Then parse it to JSON
+    json_tasks = parse_tasks_to_json(task_breakdown, use_cache)
+    return load_tasks(json_tasks), json_tasks
+
+async def aplan_tasks(user_input, session_id, use_cache, structured):
+    if structured:
+        tasks = (await aget_task_plan(user_input, session_id, use_cache)).to_task_dict()
+        return tasks, tasks_to_json(tasks)
+    task_breakdown = await arun_chatbot(user_input, session_id, use_cache)
+    json_tasks = await aparse_tasks_to_json(task_breakdown, use_cache)
+    return load_tasks(json_tasks), json_tasks
+
+def replan_tasks(retry_input, session_id, structured):
+    """
+    plan_tasks for the regeneration prompt, uncached and without adding a
+    turn to the session history: the user's turn is the original request.
+    """
+    if structured:
+        tasks = routed_plan(retry_input, session_id).to_task_dict()
+        return tasks, tasks_to_json(tasks)
+    json_tasks = parse_tasks_to_json(routed_answer(retry_input, session_id), use_cache=False)
+    return load_tasks(json_tasks), json_tasks
+
+async def areplan_tasks(retry_input, session_id, structured):
+    if structured:
+        tasks = (await arouted_plan(retry_input, session_id)).to_task_dict()
+        return tasks, tasks_to_json(tasks)
+    json_tasks = await aparse_tasks_to_json(await arouted_answer(retry_input, session_id), use_cache=False)
+    return load_tasks(json_tasks), json_tasks
+
+# Example of using both models in sequence
+def get_parsed_tasks(user_input, session_id="user1", use_cache=True, structured=None):
+    """
+    Plan user_input and return the tasks as JSON, with step times fitted
+    to the request's time budget. New conversations are served from the
+    precomputed plan library or the semantic cache when they can be.
+    Follow-ups that edit the last plan ("drop step 3") are applied locally
+    (edit_plan). structured=True asks for a TaskPlan in one call instead
+    of a markdown breakdown (default: ANAKIN_STRUCTURED_OUTPUT).
+    """
+    new_conversation = not get_session_history(session_id).messages
+    if use_cache and new_conversation:
+        cached = precomputed_plan(user_input, session_id) or semantic_cache_lookup(user_input, session_id)
+        if cached is not None:
+            return tasks_to_json(cached)
+    if not new_conversation:
+        edited = edit_plan(user_input, session_id, use_cache)
+        if edited is not None:
+            return tasks_to_json(edited)
+
+    if structured is None:
+        structured = use_structured_output()
+    tasks, json_tasks = plan_tasks(user_input, session_id, use_cache, structured)
+    if tasks is None:
+        return json_tasks
+    result = schedule_tasks(user_input, tasks)
+    if needs_regeneration(result):
+        retry_input = regeneration_input(user_input, result)
+        tasks, json_tasks = replan_tasks(retry_input, session_id, structured)
+        if tasks is None:
+            return json_tasks
+        result = schedule_tasks(user_input, tasks)
+    get_session_history(session_id).set_plan(result.tasks)
+    json_tasks = tasks_to_json(result.tasks)
+    if new_conversation:
+        semantic_cache_add(user_input, json_tasks)
+    return json_tasks
+
+async def aget_parsed_tasks(user_input, session_id="user1", use_cache=True, structured=None):
+    """
+    Async version of get_parsed_tasks, built on ainvoke. Session and cache
+    reads and writes run with asyncio.to_thread.
+    """
+    new_conversation = not await asyncio.to_thread(session_messages, session_id)
+    if use_cache and new_conversation:
+        cached = await asyncio.to_thread(
+            lambda: precomputed_plan(user_input, session_id) or semantic_cache_lookup(user_input, session_id)
+        )
+        if cached is not None:
+            return tasks_to_json(cached)
+    if not new_conversation:
+        edited = await aedit_plan(user_input, session_id, use_cache)
+        if edited is not None:
+            return tasks_to_json(edited)
+
+    if structured is None:
+        structured = use_structured_output()
+    tasks, json_tasks = await aplan_tasks(user_input, session_id, use_cache, structured)
+    if tasks is None:
+        return json_tasks
+    result = schedule_tasks(user_input, tasks)
+    if needs_regeneration(result):
+        retry_input = regeneration_input(user_input, result)
+        tasks, json_tasks = await areplan_tasks(retry_input, session_id, structured)
+        if tasks is None:
+            return json_tasks
+        result = schedule_tasks(user_input, tasks)
+    await asyncio.to_thread(get_session_history(session_id).set_plan, result.tasks)
+    json_tasks = tasks_to_json(result.tasks)
+    if new_conversation:
+        await asyncio.to_thread(semantic_cache_add, user_input, json_tasks)
+    return json_tasks
+
+async def batch_parsed_tasks(
+    user_inputs,
+    session_ids=None,
+    max_concurrency=None,
+    requests_per_minute=None,
+    tokens_per_minute=None,
+    use_cache=True,
+):
+    """
+    Plan many inputs concurrently. Returns one result per input, in input
+    order: the JSON string, or the exception raised for that input.
+    Each input gets its own session unless session_ids is given.
+    """
+    from batch_planner import DEFAULT_CONCURRENCY, RateLimiter, plan_as_completed
+
+    if session_ids is None:
+        session_ids = [f"batch-{uuid.uuid4().hex}" for _ in user_inputs]
+    results = [None] * len(user_inputs)
+
+    async def plan(item):
+        user_input, session_id = item
+        return await aget_parsed_tasks(user_input, session_id, use_cache)
+
+    async for result in plan_as_completed(
+        list(zip(user_inputs, session_ids)),
+        plan,
+        max_concurrency=max_concurrency or DEFAULT_CONCURRENCY,
+        limiter=RateLimiter(requests_per_minute, tokens_per_minute),
+    ):
+        results[result.index] = result.error if result.error is not None else result.value
+    return results
+
+def stream_breakdown(user_input, session_id="user1", use_cache=True):
+    """
+    Yield the breakdown text chunk by chunk. A cached breakdown comes
+    back as a single chunk; a streamed one is cached once it completes.
+    A duplicate of a request that is still streaming gets its whole
+    answer as one chunk when it's done. The stream comes from the routed
+    tier but is never escalated, its text has already been shown; a
+    breakdown that doesn't parse still goes to the parser model.
+    """
+    if use_cache:
+        cached = precomputed_plan(user_input, session_id) or semantic_cache_lookup(user_input, session_id)
+        if cached is not None:
+            yield render_tasks_markdown(cached)
+            return
+    key = breakdown_cache_key(user_input, session_id)
+    if use_cache:
+        cached = use_cached_breakdown(user_input, session_id, key)
+        if cached is not None:
+            yield cached
+            return
+
+    flight = get_single_flight("breakdown")
+    leader, future = flight.claim(key)
+    if not leader:
+        # The same request is already being answered, share its answer
+        try:
+            answer, leader_session = future.result()
+        except asyncio.CancelledError:
+            # That stream was closed early, answer this one in full
+            answer, leader_session = run_chatbot(user_input, session_id, use_cache), session_id
+        if leader_session != session_id:
+            record_turn(user_input, session_id, answer)
+        yield answer
+        return
+
+    chunks = []
+    try:
+        with session_guard.hold(session_id):
+            fresh_key = breakdown_cache_key(user_input, session_id)
+            route = route_request(user_input, len(get_session_history(session_id).messages))
+            if route.tier == "local":
+                chunks.append(local_breakdown(user_input))
+                record_turn(user_input, session_id, chunks[0])
+                yield chunks[0]
+            else:
+                for chunk in get_chatbot(tier_model(route.tier)).stream(
+                    {"input": user_input},
+                    config={"configurable": {"session_id": session_id}},
+                ):
+                    chunks.append(chunk.content)
+                    yield chunk.content
+    except GeneratorExit:
+        flight.abandon(key, future)
+        raise
+    except BaseException as error:
+        flight.finish(key, future, error=error)
+        raise
+    answer = "".join(chunks)
+    get_cache().set(fresh_key, answer)
+    flight.finish(key, future, (answer, session_id))
+
+def stream_parsed_tasks(user_input, session_id="user1", use_cache=True, structured=False):
+    """
+    Streaming version of get_parsed_tasks.
+    Yields one dict per task ({"Task N": ..., "Time required TN": ...})
+    as soon as its step block has been streamed by the model.
+    structured=True plans with one structured call instead, its tasks all
+    come when it's done (None: ANAKIN_STRUCTURED_OUTPUT).
+    """
+    new_conversation = not get_session_history(session_id).messages
+    if not new_conversation:
+        edited = edit_plan(user_input, session_id, use_cache)
+        if edited is not None:
+            for _, task in iter_task_dicts(edited):
+                yield task
+            return
+    if structured is None:
+        structured = use_structured_output()
+    if structured:
+        tasks = None
+        if use_cache and new_conversation:
+            tasks = precomputed_plan(user_input, session_id) or semantic_cache_lookup(user_input, session_id)
+        if tasks is None:
+            tasks = get_task_plan(user_input, session_id, use_cache).to_task_dict()
+            if new_conversation:
+                semantic_cache_add(user_input, tasks)
+        for _, task in iter_task_dicts(tasks):
+            yield task
+        return
+    parser = BreakdownParser()
+    chunks = []
+    plan = {}
+    for chunk in stream_breakdown(user_input, session_id, use_cache):
+        chunks.append(chunk)
+        if parser is None:
+            continue
+        try:
+            steps = parser.feed(chunk)
+        except BreakdownParseError:
+            parser = None
+            continue
+        for step in steps:
+            plan.update(to_task_dict([step]))
+            yield to_task_dict([step])
+
+    try:
+        if parser is None:
+            raise BreakdownParseError("Breakdown format not recognised")
+        for step in parser.close():
+            plan.update(to_task_dict([step]))
+            yield to_task_dict([step])
+        record_parse("local")
+    except BreakdownParseError:
+        # The breakdown didn't follow the format, let the parser model handle
+        # it and only emit the tasks that haven't been streamed yet.
+        record_parse("fallback")
+        response = parse_with_model("".join(chunks), use_cache)
+        tasks = load_tasks(response)
+        if tasks is None:
+            # Not a plan either, keep what was streamed and leave it uncached
+            return
+        for number, task in iter_task_dicts(tasks):
+            if f"Task {number}" not in plan:
+                yield task
+        plan = tasks
+
+    if new_conversation:
+        semantic_cache_add(user_input, plan)
+
+def settle_plan(user_input, session_id, tasks, structured=False):
+    """
+    Fit streamed tasks to the time budget like get_parsed_tasks does: a
+    plan that can't be fixed locally is asked for again, once, the way
+    stream_parsed_tasks planned it. The result becomes the session's plan;
+    returns the ScheduleResult.
+    """
+    result = schedule_tasks(user_input, tasks)
+    if needs_regeneration(result):
+        if structured is None:
+            structured = use_structured_output()
+        retry_input = regeneration_input(user_input, result)
+        retried, _ = replan_tasks(retry_input, session_id, structured)
+        if retried is not None:
+            result = schedule_tasks(user_input, retried)
+    if result.tasks:
+        get_session_history(session_id).set_plan(result.tasks)
+    return result
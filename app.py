@@ -1,12 +1,18 @@
 import os
+import uuid
 import streamlit as st
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.prompts import PromptTemplate
-from langchain_community.chat_message_histories import ChatMessageHistory
-from dotenv import load_dotenv
+from asyncio import CancelledError
+from contextlib import closing
+
+from anakin_core import breakdown_cache_key, load_env, stream_breakdown
+from chat_view import PAGE_SIZE, ConversationView, messages_markdown
+from metrics import setup_from_env, timed
+from resilience import CircuitOpenError, DeadlineExceeded
+from single_flight import get_single_flight, session_guard
+from task_parser import BreakdownParseError, BreakdownParser
 
 # Load environment variables from .env if available
-load_dotenv()
+load_env()
 
 # Sidebar inputs for API keys and project name
 if "LANGSMITH_API_KEY" not in os.environ:
@@ -23,58 +29,12 @@ if "GOOGLE_API_KEY" not in os.environ:
     if google_key:
         os.environ['GOOGLE_API_KEY'] = google_key
 
-# Enable Langsmith tracing
-os.environ['LANGSMITH_TRACING'] = 'true'
+# Langsmith tracing only when a key is available, local metrics cover the rest
+if os.environ.get('LANGSMITH_API_KEY'):
+    os.environ.setdefault('LANGSMITH_TRACING', 'true')
 
-# Initialize Google LLM only if API key is available
-if os.environ.get('GOOGLE_API_KEY'):
-    llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash-exp")
-else:
-    llm = None
-
-# Define prompt template with improved formatting instructions
-template = """
-You are Anakin, an AI assistant designed to help neurodivergent individuals who struggle with starting tasks and maintaining focus.
-Your purpose is to increase their productivity by breaking down any given learning or productivity-related task into clear, manageable, neuro-optimized microtasks.
-
-Guidelines:
-- Always respond with a neutral tone.
-- Only output a step-by-step list of microtasks relevant to the input task.
-- Each microtask should be concise, actionable, and include a relevant emoji to enhance clarity and engagement.
-- Adapt the number and granularity of microtasks based on the task's length and difficulty. Larger or more complex tasks should have more detailed microtasks.
-- Never provide commentary or advice outside of the microtask list, except when the task is unrealistic.
-- If the task is unrealistic (e.g., "Learn full stack web development in one day"), respond with a neutral message indicating it may not be achievable as stated and suggest revising it.
-- If the user does not specify an estimated time range for the task, ask them to provide how much time they expect to spend on it so you can optimize the microtasks more accurately.
-- If the user asks for or implies wanting to know how much time to allocate to each microtask, provide a time estimate for each microtask in the step-by-step list, with each time estimate adding up to the total estimated time.
-
-FORMATTING REQUIREMENTS:
-- Start with a brief header like "📋 Breaking down: [Task Name]" followed by a blank line
-- Present microtasks as a numbered list with clear spacing
-- Use this format for each step:
-  **Step [number]: [Action with emoji]**
-  Brief description if needed
-  ⏱️ **Time:** [X minutes] (if time estimates requested)
-  
-- Add helpful section breaks for complex tasks (e.g., "### 🎯 Phase 1: Setup")
-- End with an encouraging closing line like "✨ You've got this! Take it one step at a time."
-- Use markdown formatting to make the output visually appealing and easy to scan
-
-Chat history:
-{chat_history}
-
-Here is the user's task to break down:
-{input}
-"""
-
-prompt = PromptTemplate(template=template, input_variables=["input", "chat_history"])
-
-# Simple memory per session
-store = {}
-
-def get_session_history(session_id: str) -> ChatMessageHistory:
-    if session_id not in store:
-        store[session_id] = ChatMessageHistory()
-    return store[session_id]
+# Prometheus endpoint / JSON logs if ANAKIN_METRICS_PORT / ANAKIN_METRICS_LOG are set
+setup_from_env()
 
 # Streamlit app config
 st.set_page_config(page_title="Study Checkpoint Chatbot", page_icon="💡")
@@ -90,54 +50,122 @@ st.markdown(
 
 # Session state
 if "session_id" not in st.session_state:
-    st.session_state.session_id = "user1"
+    # Keep the id in the URL so a page refresh resumes the same session
+    st.session_state.session_id = st.query_params.get("sid") or uuid.uuid4().hex
+    st.query_params["sid"] = st.session_state.session_id
 if "conversation" not in st.session_state:
     st.session_state.conversation = []
+if "view" not in st.session_state:
+    # Pre-rendered pages of the conversation, see chat_view.py
+    st.session_state.view = ConversationView()
 
 st.title("Study Checkpoint Chatbot")
 st.subheader("This is Anakin, what are we doing today?")
 
-# Check if API key is set
-if not os.environ.get('GOOGLE_API_KEY'):
-    st.warning("⚠️ Please enter your Google API Key in the sidebar to start chatting.")
-else:
+def show_conversation(conversation):
+    """Earlier messages as pre-rendered pages; the oldest ones only on request."""
+    view = st.session_state.view
+    view.sync(conversation)
+    with timed("render"):
+        if len(view.pages) > 1:
+            earlier = len(view.pages) - 1
+            if st.toggle(f"Show earlier messages ({earlier * view.page_size})"):
+                page = st.number_input("Page", min_value=1, max_value=earlier, value=earlier)
+                st.markdown(view.pages[page - 1])
+        if view.pages:
+            st.markdown(view.pages[-1])
+        tail = view.tail(conversation)
+        if tail:
+            st.markdown(tail)
+
+@st.fragment
+def chat():
+    """
+    The messages sent since the last full run and the form. Sending a
+    message reruns only this fragment, not the whole conversation.
+    """
+    conversation = st.session_state.conversation
+    live = st.empty()
+
+    def show_new(reply=None):
+        new = conversation[st.session_state.shown:]
+        if reply is not None:
+            new = new + [{"role": "assistant", "content": reply}]
+        with timed("render"):
+            if new:
+                live.markdown(messages_markdown(new))
+
+    show_new()
     # Chat input with custom placeholder
     with st.form(key="chat_form", clear_on_submit=True):
         user_input = st.text_input("Your Task", value="", key="user_input", placeholder="So what are we doing today?")
+        fresh_plan = st.checkbox("Fresh plan (skip cached answers)")
         submit_button = st.form_submit_button(label="Send")
 
-    if submit_button and user_input:
-        st.session_state.conversation.append({"role": "user", "content": user_input})
-        
-        # Get chat history
-        history = get_session_history(st.session_state.session_id)
-        chat_history_text = "\n".join([m.content for m in history.messages]) if history.messages else ""
-        
-        # Build prompt with chat history
-        prompt_text = prompt.format(input=user_input, chat_history=chat_history_text)
-        
-        # Generate response
-        try:
-            response = llm.invoke(prompt_text)
-            bot_reply = response.content
-            
-            # Update session history
-            history.add_user_message(user_input)
-            history.add_ai_message(bot_reply)
-            
-            st.session_state.conversation.append({"role": "assistant", "content": bot_reply})
-        except Exception as e:
-            st.error(f"Error generating response: {str(e)}")
-            bot_reply = "Sorry, I encountered an error. Please try again."
-            st.session_state.conversation.append({"role": "assistant", "content": bot_reply})
-        
+    if not (submit_button and user_input):
+        return
+    conversation.append({"role": "user", "content": user_input})
+    show_new()
+
+    session_id = st.session_state.session_id
+    try:
+        # A double submit waits for the reply that is already streaming
+        key = (session_id, breakdown_cache_key(user_input, session_id))
+        flight = get_single_flight("chat")
+        leader, future = flight.claim(key)
+        if not leader:
+            try:
+                bot_reply = future.result()
+            except CancelledError:
+                leader = True  # that run was stopped, answer here
+        if leader:
+            try:
+                # One turn at a time per session, from reading the history to recording the reply
+                with session_guard.hold(session_id):
+                    # Stream the reply and re-render whenever a step block is complete
+                    parser = BreakdownParser()
+                    bot_reply = ""
+                    # closing(): a rerun that stops this script releases the session right away
+                    with closing(stream_breakdown(user_input, session_id, not fresh_plan)) as chunks:
+                        for chunk in chunks:
+                            bot_reply += chunk
+                            if parser is not None:
+                                try:
+                                    if not parser.feed(chunk):
+                                        continue
+                                except BreakdownParseError:
+                                    parser = None
+                            show_new(bot_reply)
+            except Exception as error:
+                flight.finish(key, future, error=error)
+                raise
+            except BaseException:
+                # Streamlit stopped this run for a rerun
+                flight.abandon(key, future)
+                raise
+            flight.finish(key, future, bot_reply)
+
+        conversation.append({"role": "assistant", "content": bot_reply})
+    except (CircuitOpenError, DeadlineExceeded) as e:
+        st.error(f"The model is unavailable right now: {e}")
+        bot_reply = "Sorry, the model didn't answer in time. Please try again in a minute."
+        conversation.append({"role": "assistant", "content": bot_reply})
+    except Exception as e:
+        st.error(f"Error generating response: {str(e)}")
+        bot_reply = "Sorry, I encountered an error. Please try again."
+        conversation.append({"role": "assistant", "content": bot_reply})
+
+    if len(conversation) - st.session_state.shown > PAGE_SIZE:
+        # Move the new messages into the pre-rendered pages
         st.rerun()
+    show_new()
 
-# Display conversation with better formatting
-for msg in st.session_state.conversation:
-    if msg["role"] == "user":
-        st.markdown(f"**🧑 You:** {msg['content']}")
-    else:
-        st.markdown("**🤖 Anakin:**")
-        st.markdown(msg['content'])
-        st.markdown("---")  # Add separator between responses
\ No newline at end of file
+# Check if API key is set
+if not os.environ.get('GOOGLE_API_KEY'):
+    st.warning("⚠️ Please enter your Google API Key in the sidebar to start chatting.")
+    show_conversation(st.session_state.conversation)
+else:
+    # Everything up to here is drawn by this full run, newer messages by chat()
+    st.session_state.shown = len(st.session_state.conversation)
+    show_conversation(st.session_state.conversation)
+    chat()
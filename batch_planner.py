@@ -0,0 +1,217 @@
+"""
+Plan a whole catalog of requests concurrently.
+
+    python batch_planner.py requests.jsonl -o plans.jsonl --concurrency 16 --rpm 300
+    python batch_planner.py requests.jsonl --fake --fake-latency 0.5   # offline throughput run
+    python batch_planner.py requests.jsonl --structured   # one call per plan (TaskPlan)
+
+Every input line is a JSON object with an "input" field (and optionally
+"id" and "session_id"). Results are written as JSON lines in completion
+order; a failing request produces an error line and doesn't stop the run.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import asyncio
+import argparse
+from dataclasses import dataclass
+
+DEFAULT_CONCURRENCY = 8
+# One plan is a ~700 token prompt plus a few hundred tokens of breakdown
+ESTIMATED_TOKENS_PER_PLAN = 1500
+
+
+class TokenBucket:
+    """Async token bucket refilled continuously at rate_per_minute."""
+
+    def __init__(self, rate_per_minute: float, capacity: float = None):
+        self.rate = rate_per_minute / 60
+        self.capacity = capacity or rate_per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, amount: float = 1):
+        amount = min(amount, self.capacity)
+        # Waiters queue on the lock, so requests are served in order
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute limits; None disables one."""
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+
+    async def acquire(self, tokens: float = ESTIMATED_TOKENS_PER_PLAN):
+        if self.requests is not None:
+            await self.requests.acquire(1)
+        if self.tokens is not None:
+            await self.tokens.acquire(tokens)
+
+
+@dataclass
+class BatchResult:
+    index: int
+    item: object
+    value: object = None
+    error: BaseException = None
+    seconds: float = 0.0
+
+
+async def plan_as_completed(
+    items,
+    plan,
+    max_concurrency=DEFAULT_CONCURRENCY,
+    limiter=None,
+    cost=lambda item: ESTIMATED_TOKENS_PER_PLAN,
+):
+    """
+    Run the coroutine function plan over items with at most max_concurrency
+    in flight, yielding a BatchResult per item as soon as it finishes.
+    Items are pulled lazily, so a large input file is never held in memory.
+    An exception from one item, including one from cost or the limiter, is
+    captured in its result; an exception from items itself is raised.
+    """
+    limiter = limiter or RateLimiter()
+    source = iter(enumerate(items))
+    results = asyncio.Queue()
+
+    async def worker():
+        try:
+            for index, item in source:
+                start = time.perf_counter()
+                try:
+                    await limiter.acquire(cost(item))
+                    start = time.perf_counter()
+                    result = BatchResult(index, item, value=await plan(item))
+                except Exception as error:
+                    result = BatchResult(index, item, error=error)
+                result.seconds = time.perf_counter() - start
+                await results.put(result)
+        finally:
+            # Always, or the consumer waits for this worker forever
+            results.put_nowait(None)
+
+    workers = [asyncio.ensure_future(worker()) for _ in range(max_concurrency)]
+    try:
+        running = len(workers)
+        while running:
+            result = await results.get()
+            if result is None:
+                running -= 1
+            else:
+                yield result
+        for task in workers:
+            if task.exception() is not None:
+                raise task.exception()
+    finally:
+        for task in workers:
+            task.cancel()
+
+
+def read_requests(path):
+    """(line number, line) for every non-blank line; parse_request reads one."""
+    with open(path, encoding="utf-8") as lines:
+        for number, line in enumerate(lines, 1):
+            if line.strip():
+                yield number, line
+
+
+def parse_request(number, line):
+    """The request on a line, its id defaulting to the line number."""
+    request = json.loads(line)
+    if not isinstance(request, dict) or not isinstance(request.get("input"), str):
+        raise ValueError(f"line {number}: expected an object with an \"input\" string")
+    request.setdefault("id", number)
+    return request
+
+
+def describe_request(number, line):
+    """id and input for the output line, as much of it as the line has."""
+    try:
+        request = parse_request(number, line)
+    except ValueError:
+        return {"id": number}
+    return {"id": request["id"], "input": request["input"]}
+
+
+async def run_cli(args, out):
+    from anakin_core import aget_parsed_tasks
+    from task_parser import strip_code_fence
+
+    async def plan(numbered_line):
+        request = parse_request(*numbered_line)
+        session_id = request.get("session_id") or f"batch-{uuid.uuid4().hex}"
+        json_tasks = await aget_parsed_tasks(
+            request["input"], session_id, use_cache=not args.no_cache, structured=args.structured or None
+        )
+        return json.loads(strip_code_fence(json_tasks))
+
+    limiter = RateLimiter(args.rpm, args.tpm)
+    start = time.perf_counter()
+    done = failed = 0
+    async for result in plan_as_completed(
+        read_requests(args.requests),
+        plan,
+        max_concurrency=args.concurrency,
+        limiter=limiter,
+        cost=lambda numbered_line: ESTIMATED_TOKENS_PER_PLAN + len(numbered_line[1]) // 4,
+    ):
+        line = {**describe_request(*result.item), "seconds": round(result.seconds, 3)}
+        if result.error is None:
+            line.update(ok=True, tasks=result.value)
+        else:
+            line.update(ok=False, error=f"{type(result.error).__name__}: {result.error}")
+            failed += 1
+        done += 1
+        out.write(json.dumps(line, ensure_ascii=False) + "\n")
+        out.flush()
+
+    elapsed = time.perf_counter() - start
+    print(
+        f"{done} requests ({failed} failed) in {elapsed:.2f}s, "
+        f"{done / elapsed if elapsed else 0:.1f} plans/s",
+        file=sys.stderr,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Plan a JSONL file of requests concurrently.")
+    parser.add_argument("requests", nargs="?", default="requests.jsonl")
+    parser.add_argument("-o", "--output", help="write results here instead of stdout")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--rpm", type=float, help="max requests per minute")
+    parser.add_argument("--tpm", type=float, help="max (estimated) tokens per minute")
+    parser.add_argument("--no-cache", action="store_true", help="always ask the model")
+    parser.add_argument("--structured", action="store_true", help="plan with one structured call")
+    parser.add_argument("--fake", action="store_true", help="use the local fake model")
+    parser.add_argument("--fake-latency", type=float, default=0.5, help="fake model latency (s)")
+    args = parser.parse_args()
+
+    if args.fake:
+        os.environ["ANAKIN_FAKE_LLM"] = "1"
+        os.environ["ANAKIN_FAKE_LATENCY"] = str(args.fake_latency)
+        os.environ.setdefault("ANAKIN_SESSION_BACKEND", "memory")
+
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        asyncio.run(run_cli(args, out))
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
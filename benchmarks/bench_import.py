@@ -0,0 +1,74 @@
+"""
+Measure cold-start and per-rerun overhead of the Anakin entry points.
+
+    python benchmarks/bench_import.py [--repeat 10]
+
+- import: wall time of a fresh interpreter importing each module, minus an
+  empty interpreter start (median of --repeat runs).
+- first_chain: building the chat client and chains on first use (fake model).
+- rerun_chain: fetching them again, which is all a Streamlit rerun pays.
+Prints one JSON object.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = ["task_parser", "anakin_core", "anakin"]
+
+
+def interpreter_seconds(code: str, repeat: int) -> float:
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, check=True)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def chain_timings(repeat: int) -> dict:
+    os.environ["ANAKIN_FAKE_LLM"] = "1"
+    sys.path.insert(0, ROOT)
+    import anakin_core
+
+    start = time.perf_counter()
+    anakin_core.get_chatbot()
+    anakin_core.get_parse_chain()
+    first = time.perf_counter() - start
+
+    reruns = []
+    for _ in range(repeat * 100):
+        start = time.perf_counter()
+        anakin_core.get_chatbot()
+        anakin_core.get_parse_chain()
+        reruns.append(time.perf_counter() - start)
+    return {
+        "first_chain_ms": round(first * 1000, 2),
+        "rerun_chain_us": round(statistics.median(reruns) * 1e6, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold start benchmark")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    baseline = interpreter_seconds("pass", args.repeat)
+    report = {"interpreter_ms": round(baseline * 1000, 1)}
+    for module in MODULES:
+        seconds = interpreter_seconds(f"import {module}", args.repeat)
+        report[f"import_{module}_ms"] = round((seconds - baseline) * 1000, 1)
+    try:
+        report.update(chain_timings(args.repeat))
+    except ImportError as error:
+        report["chain_error"] = f"LangChain not installed: {error}"
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Offline benchmark of the planning pipeline, for comparing prompt and
+pipeline changes before they roll out.
+
+    python benchmarks/bench_pipeline.py [--requests 200] [--session-turns 200]
+        [--recordings recorded.jsonl] [--inputs inputs.jsonl]
+        [--latency 0.05 --latency-sigma 0.3 --seconds-per-token 0.002 --rate-sigma 0.2]
+        [--seed 0] [-o report.json]
+
+Runs against the fake model (fake_llm.py), which replays breakdowns from
+--recordings (see record_responses.py) and generates the rest. Caches are
+off. Reports, as one JSON object:
+- stages: p50/p95/p99 latency of run_chatbot, parse_tasks_to_json and
+  get_parsed_tasks, each on fresh sessions.
+- parse: how many breakdowns the local parser handled, how many needed the
+  parser model, and how many produced a usable task dict.
+- tokens: LLM calls and prompt/completion tokens per request per stage.
+- session: memory and prompt size across one long conversation.
+"""
+import json
+import time
+import uuid
+import argparse
+import tracemalloc
+
+from common import SAMPLE_INPUTS, latency_summary, usage_counter, use_fake_model
+
+
+def read_inputs(path):
+    if not path:
+        return SAMPLE_INPUTS
+    with open(path, encoding="utf-8") as lines:
+        return [json.loads(line)["input"] for line in lines if line.strip()]
+
+
+def bench_stages(core, counter, inputs, requests) -> dict:
+    from task_parser import parse_stats, strip_code_fence
+
+    timings = {"run_chatbot": [], "parse_tasks_to_json": [], "get_parsed_tasks": []}
+    before = dict(parse_stats)
+    usable = 0
+    for number in range(requests):
+        user_input = inputs[number % len(inputs)]
+
+        counter.stage = "run_chatbot"
+        start = time.perf_counter()
+        breakdown = core.run_chatbot(user_input, f"bench-{uuid.uuid4().hex}", use_cache=False)
+        timings["run_chatbot"].append(time.perf_counter() - start)
+
+        counter.stage = "parse_tasks_to_json"
+        start = time.perf_counter()
+        json_tasks = core.parse_tasks_to_json(breakdown, use_cache=False)
+        timings["parse_tasks_to_json"].append(time.perf_counter() - start)
+        try:
+            usable += "Task 1" in json.loads(strip_code_fence(json_tasks))
+        except ValueError:
+            pass
+
+        counter.stage = "get_parsed_tasks"
+        start = time.perf_counter()
+        core.get_parsed_tasks(user_input, f"bench-{uuid.uuid4().hex}", use_cache=False)
+        timings["get_parsed_tasks"].append(time.perf_counter() - start)
+
+    local = parse_stats["local"] - before.get("local", 0)
+    fallback = parse_stats["fallback"] - before.get("fallback", 0)
+    return {
+        "stages": {stage: latency_summary(seconds) for stage, seconds in timings.items()},
+        "parse": {
+            "local": local,
+            "fallback": fallback,
+            "local_rate": round(local / (local + fallback), 4) if local + fallback else None,
+            "success_rate": round(usable / requests, 4),
+        },
+        "tokens": {stage: counter.summary(stage, requests) for stage in timings},
+    }
+
+
+def bench_session(core, counter, inputs, turns) -> dict:
+    """One conversation of many turns: memory growth and prompt size."""
+    session_id = f"bench-long-{uuid.uuid4().hex}"
+    counter.stage = "session"
+    prompt_tokens = []
+    memory = []
+    tracemalloc.start()
+    try:
+        for turn in range(turns):
+            before = counter.tokens["session"]["input_tokens"]
+            core.get_parsed_tasks(inputs[turn % len(inputs)], session_id, use_cache=False)
+            prompt_tokens.append(counter.tokens["session"]["input_tokens"] - before)
+            memory.append(tracemalloc.get_traced_memory()[0])
+    finally:
+        tracemalloc.stop()
+
+    # Growth over the second half, after the history budget has filled up
+    half = turns // 2
+    steady = (memory[-1] - memory[half]) / max(1, turns - 1 - half)
+    return {
+        "turns": turns,
+        "traced_kb_after_first_turn": round(memory[0] / 1024, 1),
+        "traced_kb_at_end": round(memory[-1] / 1024, 1),
+        "steady_growth_bytes_per_turn": round(steady, 1),
+        "prompt_tokens_first_turn": prompt_tokens[0],
+        "prompt_tokens_max": max(prompt_tokens),
+        "prompt_tokens_last_turn": prompt_tokens[-1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline pipeline benchmark")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--session-turns", type=int, default=200)
+    parser.add_argument("--inputs", help="JSONL file with an \"input\" field per line")
+    parser.add_argument("--recordings", help="JSONL file of recorded breakdowns to replay")
+    parser.add_argument("--latency", type=float, default=0.0, help="median time to first token (s)")
+    parser.add_argument("--latency-sigma", type=float, default=0.0, help="log-normal spread of latency")
+    parser.add_argument("--seconds-per-token", type=float, default=0.0)
+    parser.add_argument("--rate-sigma", type=float, default=0.0, help="log-normal spread of token rate")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", help="write the report here as well as to stdout")
+    args = parser.parse_args()
+
+    use_fake_model(
+        latency=args.latency,
+        latency_sigma=args.latency_sigma,
+        seconds_per_token=args.seconds_per_token,
+        rate_sigma=args.rate_sigma,
+        seed=args.seed,
+        recordings=args.recordings,
+    )
+    import anakin_core
+
+    inputs = read_inputs(args.inputs)
+    counter = usage_counter()
+    report = {"config": vars(args)}
+    report.update(bench_stages(anakin_core, counter, inputs, args.requests))
+    if args.session_turns:
+        report["session"] = bench_session(anakin_core, counter, inputs, args.session_turns)
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as out:
+            out.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
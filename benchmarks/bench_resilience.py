@@ -0,0 +1,119 @@
+"""
+Exercise the resilience layer against the fake model with injected
+failures and stalls.
+
+    python benchmarks/bench_resilience.py [--requests 200] [--error-rate 0.05]
+        [--stall-rate 0.03] [--stall-seconds 1.0] [--deadline 0.6]
+
+Policies compared on the same seeded failure pattern:
+- none: a single attempt, no deadline (the behaviour before the wrapper).
+- retry: deadline plus jittered exponential backoff.
+- retry_hedge: as retry, plus a hedged request after the running p95.
+The outage section sends calls to a backend that always fails and reports
+how many reached it before the circuit breaker opened.
+Prints one JSON object.
+"""
+import json
+import time
+import argparse
+from collections import Counter
+
+from common import latency_summary, use_fake_model
+
+PROMPT = "Here is the user's task to break down:\nStudy SQL joins in 2 hours"
+
+
+def run_policy(name, policy, args):
+    from fake_llm import FakeChatModel
+    from resilience import resilient
+
+    model = FakeChatModel(
+        latency=args.latency,
+        latency_sigma=0.3,
+        error_rate=args.error_rate,
+        stall_rate=args.stall_rate,
+        stall_seconds=args.stall_seconds,
+        seed=args.seed,
+        timeout=policy.deadline,  # as get_resilient_llm sets it
+    )
+    llm = resilient(model, f"bench-{name}", policy=policy)
+    timings = []
+    outcomes = Counter()
+    for _ in range(args.requests):
+        start = time.perf_counter()
+        try:
+            llm.invoke(PROMPT)
+            outcomes["ok"] += 1
+        except Exception as error:
+            outcomes[type(error).__name__] += 1
+        timings.append(time.perf_counter() - start)
+    return {
+        "success_rate": round(outcomes["ok"] / args.requests, 4),
+        "outcomes": dict(outcomes),
+        "latency": latency_summary(timings),
+    }
+
+
+def run_outage(args):
+    from fake_llm import FakeChatModel
+    from resilience import ResiliencePolicy, resilient
+
+    reached = Counter()
+
+    class CountingModel(FakeChatModel):
+        def _generate(self, *a, **kw):
+            reached["calls"] += 1
+            return super()._generate(*a, **kw)
+
+    policy = ResiliencePolicy(deadline=args.deadline, max_attempts=1, failure_threshold=5, reset_timeout=60)
+    llm = resilient(CountingModel(error_rate=1.0), "bench-outage", policy=policy)
+    timings = []
+    outcomes = Counter()
+    for _ in range(50):
+        start = time.perf_counter()
+        try:
+            llm.invoke(PROMPT)
+        except Exception as error:
+            outcomes[type(error).__name__] += 1
+        timings.append(time.perf_counter() - start)
+    return {
+        "calls": 50,
+        "reached_backend": reached["calls"],
+        "outcomes": dict(outcomes),
+        "latency": latency_summary(timings),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resilience layer benchmark")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    parser.add_argument("--stall-rate", type=float, default=0.03)
+    parser.add_argument("--stall-seconds", type=float, default=1.0)
+    parser.add_argument("--deadline", type=float, default=0.6)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    use_fake_model()
+    from resilience import ResiliencePolicy
+
+    never_open = 10**9
+    policies = {
+        "none": ResiliencePolicy(deadline=None, max_attempts=1, failure_threshold=never_open),
+        "retry": ResiliencePolicy(
+            deadline=args.deadline, base_delay=0.02, max_delay=0.2, failure_threshold=never_open
+        ),
+        "retry_hedge": ResiliencePolicy(
+            deadline=args.deadline, base_delay=0.02, max_delay=0.2, hedge=True, failure_threshold=never_open
+        ),
+    }
+    report = {"config": vars(args)}
+    for name, policy in policies.items():
+        report[name] = run_policy(name, policy, args)
+    report["outage"] = run_outage(args)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
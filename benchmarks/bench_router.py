@@ -0,0 +1,74 @@
+"""
+Routed planning (router.py) against sending everything to the strong tier.
+
+    python benchmarks/bench_router.py [--requests 50] [--fast-latency 0.15]
+        [--strong-latency 0.4] [--malformed-rate 0.1] [--local]
+
+Both tiers are fake models: the fast one answers sooner and, for
+--malformed-rate of requests, ignores the breakdown format so the answer
+is escalated to the strong tier. --local lets the router use its template
+planner. The inputs mix the sample requests with a few broad ones that
+should go straight to the strong tier. Caches are off. Prints one JSON
+object with the tier mix, escalation rate, LLM calls and latency per mode.
+"""
+import os
+import json
+import time
+import uuid
+import argparse
+
+from common import SAMPLE_INPUTS, latency_summary, usage_counter, use_fake_model
+
+BROAD_INPUTS = [
+    "Learn full stack web development in 3 months",
+    "Master data structures, algorithms and system design in 6 weeks",
+]
+
+
+def run_mode(counter, name, routed, requests):
+    import anakin_core
+    import router
+
+    os.environ["ANAKIN_ROUTER"] = "1" if routed else "0"
+    router.route_stats.clear()
+    counter.stage = name
+    inputs = SAMPLE_INPUTS + BROAD_INPUTS
+    timings = []
+    for number in range(requests):
+        start = time.perf_counter()
+        anakin_core.get_parsed_tasks(inputs[number % len(inputs)], f"bench-{uuid.uuid4().hex}", use_cache=False)
+        timings.append(time.perf_counter() - start)
+    tiers = {tier: router.route_stats[tier] for tier in router.TIERS}
+    return {
+        **counter.summary(name, requests),
+        "tiers": tiers,
+        "escalation_rate": round(router.escalation_rate(), 3),
+        "latency": latency_summary(timings),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Model cascade benchmark")
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--fast-latency", type=float, default=0.15, help="fast tier time to first token (s)")
+    parser.add_argument("--strong-latency", type=float, default=0.4, help="strong tier time to first token (s)")
+    parser.add_argument("--seconds-per-token", type=float, default=0.002)
+    parser.add_argument("--malformed-rate", type=float, default=0.1, help="fast tier answers that fail validation")
+    parser.add_argument("--local", action="store_true", help="allow the local template planner")
+    args = parser.parse_args()
+
+    use_fake_model(latency=args.strong_latency, seconds_per_token=args.seconds_per_token, seed=0)
+    os.environ["ANAKIN_FAKE_FAST_LATENCY"] = str(args.fast_latency)
+    os.environ["ANAKIN_FAKE_FAST_MALFORMED_RATE"] = str(args.malformed_rate)
+    if args.local:
+        os.environ["ANAKIN_ROUTER_LOCAL"] = "1"
+
+    counter = usage_counter()
+    report = {"config": vars(args)}
+    for name, routed in [("strong_only", False), ("routed", True)]:
+        report[name] = run_mode(counter, name, routed, args.requests)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
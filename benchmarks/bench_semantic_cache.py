@@ -0,0 +1,109 @@
+"""
+Benchmark the semantic plan cache at 10k and 100k cached plans.
+
+    python benchmarks/bench_semantic_cache.py [--sizes 10000 100000] [--queries 2000]
+
+Plans are synthetic (topic, duration) requests. Half of the queries are
+paraphrases of a cached request (different filler words, number words,
+a nearby duration), the other half ask for topics that were never cached.
+Reports hit rate, how many hits came back for the right plan, and lookup
+latency percentiles.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from semantic_cache import SemanticCache  # noqa: E402
+
+SUBJECTS = [
+    "python", "javascript", "calculus", "algebra", "biology", "chemistry",
+    "physics", "history", "economics", "statistics", "sql", "react", "docker",
+    "spanish", "french", "geometry", "philosophy", "accounting", "marketing",
+    "rust", "java", "kotlin", "linux", "networking", "oop", "recursion",
+]
+ASPECTS = [
+    "basics", "exam", "interview", "project", "revision", "chapter",
+    "homework", "assignment", "fundamentals", "practice", "essay", "lab",
+]
+OPENERS = ["I want to study", "help me learn", "I have to prepare", "break down", "plan my", ""]
+NUMBER_WORDS = {1: "one", 2: "two", 3: "three", 4: "four", 5: "five", 6: "six"}
+
+
+def make_topic(rng, index):
+    # a unique code keeps 100k topics distinct while staying realistic
+    return f"{rng.choice(SUBJECTS)} {rng.choice(ASPECTS)} unit{index}"
+
+
+def make_request(rng, topic, hours, paraphrase=False):
+    if paraphrase and hours in NUMBER_WORDS and rng.random() < 0.5:
+        duration = f"{NUMBER_WORDS[hours]} hours"
+    elif paraphrase and rng.random() < 0.5:
+        duration = f"{hours}h"
+    else:
+        duration = f"{hours} hours"
+    return f"{rng.choice(OPENERS)} {topic} in next {duration}".strip()
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def run(size, n_queries, seed=0):
+    rng = random.Random(seed)
+    cache = SemanticCache(max_entries=size)
+    plan = {"Task 1": "Warm up", "Time required T1": "30 minutes",
+            "Task 2": "Practice", "Time required T2": "90 minutes"}
+
+    cached = []
+    start = time.perf_counter()
+    for index in range(size):
+        topic, hours = make_topic(rng, index), rng.randint(1, 6)
+        cache.add(make_request(rng, topic, hours), {**plan, "Task 1": topic})
+        cached.append((topic, hours))
+    build_seconds = time.perf_counter() - start
+
+    latencies, expected_hits, hits, correct = [], 0, 0, 0
+    for query in range(n_queries):
+        if query % 2 == 0:
+            topic, hours = rng.choice(cached)
+            expected_hits += 1
+        else:
+            topic, hours = make_topic(rng, size + query), rng.randint(1, 6)
+        text = make_request(rng, topic, hours, paraphrase=True)
+        start = time.perf_counter()
+        result = cache.lookup(text)
+        latencies.append((time.perf_counter() - start) * 1e6)
+        if result is not None:
+            hits += 1
+            correct += result[0]["Task 1"] == topic
+
+    return {
+        "cached_plans": size,
+        "build_seconds": round(build_seconds, 2),
+        "hit_rate": round(hits / n_queries, 3),
+        "recall_on_repeats": round(correct / expected_hits, 3),
+        "precision": round(correct / hits, 3) if hits else None,
+        "lookup_us_p50": round(percentile(latencies, 50), 1),
+        "lookup_us_p95": round(percentile(latencies, 95), 1),
+        "lookup_us_mean": round(statistics.mean(latencies), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+    for size in args.sizes:
+        result = run(size, args.queries)
+        print("  ".join(f"{key}={value}" for key, value in result.items()))
+
+
+if __name__ == "__main__":
+    main()
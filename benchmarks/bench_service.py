@@ -0,0 +1,146 @@
+"""
+Load-test the planning service (service.py) against the fake model.
+
+    python benchmarks/bench_service.py [--requests 200] [--concurrency 32]
+        [--endpoint plan|stream|batch] [--latency 0.2] [--seconds-per-token 0.002]
+        [--service-concurrency 16] [--service-queue 64] [--duplicates]
+    python benchmarks/bench_service.py --url http://127.0.0.1:8000 ...
+
+Without --url the app runs in this process behind httpx's ASGI transport
+(no sockets, the fake model configured from the flags). With --url the
+requests go to a running server, which should be started with
+ANAKIN_FAKE_LLM=1 and the matching ANAKIN_FAKE_* settings. The in-process
+transport delivers a streamed response at once, so time to first step is
+only meaningful with --url.
+
+Every request is a new session with a distinct input, unless --duplicates
+sends the sample inputs as they are (then identical concurrent requests
+are coalesced). Prints one JSON object: requests/sec, status counts and
+latency percentiles.
+"""
+import os
+import json
+import time
+import asyncio
+import argparse
+from collections import Counter
+
+from common import SAMPLE_INPUTS, latency_summary, use_fake_model
+
+BATCH_SIZE = 10
+
+
+def make_inputs(args):
+    inputs = []
+    for number in range(args.requests):
+        text = SAMPLE_INPUTS[number % len(SAMPLE_INPUTS)]
+        inputs.append(text if args.duplicates else f"{text} (request {number})")
+    return inputs
+
+
+async def send_plan(client, text, args):
+    response = await client.post("/v1/plan", json={"input": text, "fresh": not args.cached})
+    return response.status_code, None
+
+
+async def send_stream(client, text, args):
+    start = time.perf_counter()
+    first_step = None
+    async with client.stream("POST", "/v1/plan/stream", json={"input": text, "fresh": not args.cached}) as response:
+        async for line in response.aiter_lines():
+            if first_step is None and line == "event: step":
+                first_step = time.perf_counter() - start
+            if line == "event: error":
+                return 502, first_step
+    return response.status_code, first_step
+
+
+async def send_batch(client, texts, args):
+    body = {"requests": [{"input": text, "fresh": not args.cached} for text in texts]}
+    response = await client.post("/v1/plans/batch", json=body)
+    return response.status_code, None
+
+
+async def run(args, client):
+    inputs = make_inputs(args)
+    if args.endpoint == "batch":
+        jobs = [inputs[i:i + BATCH_SIZE] for i in range(0, len(inputs), BATCH_SIZE)]
+        send = send_batch
+    else:
+        jobs = inputs
+        send = send_stream if args.endpoint == "stream" else send_plan
+
+    timings, first_steps, statuses = [], [], Counter()
+    pending = iter(jobs)
+
+    async def user():
+        for job in pending:
+            start = time.perf_counter()
+            try:
+                status, first_step = await send(client, job, args)
+            except Exception as error:
+                status, first_step = type(error).__name__, None
+            statuses[str(status)] += 1
+            if status == 200:
+                timings.append(time.perf_counter() - start)
+                if first_step is not None:
+                    first_steps.append(first_step)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+    plans = len(timings) * (BATCH_SIZE if args.endpoint == "batch" else 1)
+    report = {
+        "config": vars(args),
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(sum(statuses.values()) / elapsed, 2),
+        "plans_per_second": round(plans / elapsed, 2),
+        "statuses": dict(statuses),
+        "latency": latency_summary(timings),
+    }
+    if first_steps:
+        report["time_to_first_step"] = latency_summary(first_steps)
+    return report
+
+
+async def main_async(args):
+    import httpx
+
+    timeout = httpx.Timeout(args.timeout)
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, timeout=timeout) as client:
+            return await run(args, client)
+
+    use_fake_model(latency=args.latency, seconds_per_token=args.seconds_per_token, seed=0)
+    os.environ["ANAKIN_SERVICE_CONCURRENCY"] = str(args.service_concurrency)
+    os.environ["ANAKIN_SERVICE_QUEUE"] = str(args.service_queue)
+    from service import PlanningService
+    from single_flight import suppressed_calls
+
+    app = PlanningService(args.service_concurrency, args.service_queue)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://service", timeout=timeout) as client:
+        report = await run(args, client)
+    report["coalesced_calls"] = suppressed_calls()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Planning service load test")
+    parser.add_argument("--url", help="test a running server instead of an in-process app")
+    parser.add_argument("--endpoint", choices=("plan", "stream", "batch"), default="plan")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32, help="concurrent clients")
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--seconds-per-token", type=float, default=0.002)
+    parser.add_argument("--service-concurrency", type=int, default=16)
+    parser.add_argument("--service-queue", type=int, default=64)
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--cached", action="store_true", help="allow cached answers")
+    parser.add_argument("--duplicates", action="store_true", help="repeat the sample inputs verbatim")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(main_async(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Compare the planning paths on the fake model.
+
+    python benchmarks/bench_structured.py [--requests 50] [--latency 0.4] [--seconds-per-token 0.004]
+
+- two_call: breakdown model, then the parser model (the original design).
+- local_parse: breakdown model, parsed locally (parser model as fallback).
+- structured: one call that returns a TaskPlan.
+Caches are off, so every request reaches the model. Prints one JSON object
+with LLM calls, tokens per request and end-to-end latency per path.
+"""
+import json
+import time
+import uuid
+import argparse
+
+from common import SAMPLE_INPUTS, latency_summary, usage_counter, use_fake_model
+
+
+def run_path(counter, name, plan, requests):
+    counter.stage = name
+    timings = []
+    for number in range(requests):
+        start = time.perf_counter()
+        plan(SAMPLE_INPUTS[number % len(SAMPLE_INPUTS)], f"bench-{uuid.uuid4().hex}")
+        timings.append(time.perf_counter() - start)
+    return {**counter.summary(name, requests), "latency": latency_summary(timings)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Two-call vs one-call planning benchmark")
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.4, help="fake time to first token (s)")
+    parser.add_argument("--seconds-per-token", type=float, default=0.004)
+    args = parser.parse_args()
+
+    use_fake_model(latency=args.latency, seconds_per_token=args.seconds_per_token)
+    import anakin_core
+
+    def two_call(user_input, session_id):
+        breakdown = anakin_core.run_chatbot(user_input, session_id, use_cache=False)
+        anakin_core.parse_with_model(breakdown, use_cache=False)
+
+    def local_parse(user_input, session_id):
+        anakin_core.get_parsed_tasks(user_input, session_id, use_cache=False, structured=False)
+
+    def structured(user_input, session_id):
+        anakin_core.get_parsed_tasks(user_input, session_id, use_cache=False, structured=True)
+
+    counter = usage_counter()
+    report = {"requests": args.requests, "latency_s": args.latency, "seconds_per_token": args.seconds_per_token}
+    for name, plan in [("two_call", two_call), ("local_parse", local_parse), ("structured", structured)]:
+        report[name] = run_path(counter, name, plan, args.requests)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
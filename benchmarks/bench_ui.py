@@ -0,0 +1,79 @@
+"""
+Rerun time of the chat page (app.py) as the conversation grows.
+
+    python benchmarks/bench_ui.py [--sizes 10 100 1000] [--reruns 5]
+
+Runs app.py under Streamlit's AppTest with a conversation of N messages
+in session state and times full reruns, with the number of markdown
+elements drawn. "baseline" reruns a script that draws the conversation
+the way app.py used to: every message on every rerun, with one
+st.markdown call per line. The model is never called. Prints one JSON
+object.
+"""
+import os
+import json
+import time
+import argparse
+
+from common import ROOT, SAMPLE_INPUTS, latency_summary, use_fake_model
+
+
+def baseline_script():
+    import streamlit as st
+
+    for msg in st.session_state.conversation:
+        if msg["role"] == "user":
+            st.markdown(f"**🧑 You:** {msg['content']}")
+        else:
+            st.markdown("**🤖 Anakin:**")
+            st.markdown(msg["content"])
+
+
+def make_conversation(size):
+    from fake_llm import fake_breakdown
+
+    conversation = []
+    for number in range(size // 2):
+        text = SAMPLE_INPUTS[number % len(SAMPLE_INPUTS)]
+        conversation.append({"role": "user", "content": text})
+        conversation.append({"role": "assistant", "content": fake_breakdown(text)})
+    return conversation
+
+
+def time_reruns(app, conversation, reruns):
+    app.session_state["session_id"] = "bench-ui"
+    app.session_state["conversation"] = conversation
+    app.run()  # first run builds the pre-rendered pages
+    timings = []
+    for _ in range(reruns):
+        start = time.perf_counter()
+        app.run()
+        timings.append(time.perf_counter() - start)
+    return {"rerun": latency_summary(timings), "markdown_elements": len(app.markdown)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Streamlit rerun benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--reruns", type=int, default=5)
+    args = parser.parse_args()
+
+    use_fake_model()
+    # app.py only draws the chat with a key; no request is made
+    os.environ.setdefault("GOOGLE_API_KEY", "bench-ui")
+    from streamlit.testing.v1 import AppTest
+
+    report = {"config": vars(args)}
+    for size in args.sizes:
+        conversation = make_conversation(size)
+        report[str(size)] = {
+            "baseline": time_reruns(AppTest.from_function(baseline_script, default_timeout=60), conversation, args.reruns),
+            "paged": time_reruns(
+                AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=60), conversation, args.reruns
+            ),
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
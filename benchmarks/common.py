@@ -0,0 +1,84 @@
+"""Helpers shared by the benchmark scripts."""
+import os
+import sys
+import statistics
+from collections import Counter, defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TOKEN_FIELDS = ("input_tokens", "output_tokens", "total_tokens")
+SAMPLE_INPUTS = [
+    "I want to study oops in next 4 hours",
+    "Prepare slides for Monday's meeting in 90 minutes",
+    "Learn the basics of SQL joins in 2 hours",
+    "Clean and organize my desk in 30 minutes",
+    "Write the first draft of my essay in three hours",
+]
+
+
+def use_fake_model(**options):
+    """
+    Point anakin_core at the fake model (options become ANAKIN_FAKE_*
+    variables) with in-memory sessions, and make the project importable.
+    """
+    os.environ["ANAKIN_FAKE_LLM"] = "1"
+    os.environ["ANAKIN_SESSION_BACKEND"] = "memory"
+    for name, value in options.items():
+        if value is not None:
+            os.environ[f"ANAKIN_FAKE_{name.upper()}"] = str(value)
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def latency_summary(seconds) -> dict:
+    """count, mean and p50/p95/p99 in milliseconds."""
+    if not seconds:
+        return {"count": 0}
+    return {
+        "count": len(seconds),
+        "mean_ms": round(statistics.mean(seconds) * 1000, 2),
+        "p50_ms": round(percentile(seconds, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(seconds, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(seconds, 0.99) * 1000, 2),
+    }
+
+
+def usage_counter():
+    """
+    Callback handler that sees every LLM call made in this context and
+    adds its calls and token usage to the current stage.
+    """
+    from contextvars import ContextVar
+    from langchain_core.callbacks import BaseCallbackHandler
+    from langchain_core.tracers.context import register_configure_hook
+
+    class UsageCounter(BaseCallbackHandler):
+        def __init__(self):
+            self.stage = "total"
+            self.calls = Counter()
+            self.tokens = defaultdict(Counter)
+
+        def on_llm_end(self, response, **kwargs):
+            self.calls[self.stage] += 1
+            for generations in response.generations:
+                for generation in generations:
+                    usage = getattr(generation, "message", None)
+                    self.tokens[self.stage].update(getattr(usage, "usage_metadata", None) or {})
+
+        def summary(self, stage, requests) -> dict:
+            return {
+                "llm_calls_per_request": round(self.calls[stage] / requests, 2),
+                "tokens_per_request": {
+                    field: round(self.tokens[stage][field] / requests, 1) for field in TOKEN_FIELDS
+                },
+            }
+
+    counter = UsageCounter()
+    variable = ContextVar("bench_usage_counter", default=None)
+    register_configure_hook(variable, inheritable=True)
+    variable.set(counter)
+    return counter
@@ -0,0 +1,48 @@
+"""
+Record real breakdowns for replay by the fake model.
+
+    python benchmarks/record_responses.py inputs.jsonl -o recorded.jsonl
+
+Every input line is a JSON object with an "input" field. Each input is
+sent once to the configured model (ANAKIN_MODEL, default Gemini) in a new
+session, and {"input", "breakdown", "model", "template"} is written per
+line. Replay with ANAKIN_FAKE_RECORDINGS=recorded.jsonl or
+bench_pipeline.py --recordings recorded.jsonl.
+"""
+import os
+import sys
+import json
+import uuid
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import anakin_core  # noqa: E402
+from response_cache import template_version  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record breakdowns from the real model")
+    parser.add_argument("inputs")
+    parser.add_argument("-o", "--output", default="recorded.jsonl")
+    args = parser.parse_args()
+
+    os.environ.setdefault("ANAKIN_SESSION_BACKEND", "memory")
+    with open(args.inputs, encoding="utf-8") as lines, open(args.output, "w", encoding="utf-8") as out:
+        for line in lines:
+            if not line.strip():
+                continue
+            user_input = json.loads(line)["input"]
+            breakdown = anakin_core.run_chatbot(user_input, f"record-{uuid.uuid4().hex}", use_cache=False)
+            record = {
+                "input": user_input,
+                "breakdown": breakdown,
+                "model": anakin_core.model_name(),
+                "template": template_version(anakin_core.BREAKDOWN_TEMPLATE),
+            }
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            print(f"recorded: {user_input}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+import re
+from collections import deque
+from dataclasses import dataclass, field
+
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import AIMessage, BaseMessage, SystemMessage, message_chunk_to_message
+
+from task_parser import BreakdownParseError, BreakdownParser, extract_duration, iter_task_dicts, to_task_dict
+
+# --- Token-budgeted chat memory ---
+# Only the last few turns are sent verbatim. Everything the assistant needs
+# from older turns (the goal, the time budget, the current plan and which
+# steps are done) lives in a small TaskState that is updated one message at
+# a time, so it never has to be recomputed from the whole conversation.
+
+DEFAULT_RECENT_TURNS = 3
+DEFAULT_MAX_TOKENS = 600
+
+COMPLETED_RE = re.compile(
+    r"\b(?:done with|finished|completed|did|ticked off)\s+(?:the\s+)?steps?\s+([\d,\s&and]+)"
+    r"|\bsteps?\s+([\d,\s&and]+?)\s+(?:is|are)?\s*(?:done|finished|complete|completed)\b",
+    re.IGNORECASE,
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English text)."""
+    return len(text) // 4 + 1
+
+
+@dataclass
+class TaskState:
+    """Structured summary of the turns that are no longer sent verbatim."""
+
+    goal: str = None
+    time_budget: int = None  # minutes
+    steps: list = field(default_factory=list)  # [(title, time), ...]
+    completed: list = field(default_factory=list)  # step numbers
+    plan: dict = None  # the last plan shown, as a task dict (plan_editor.py)
+
+    def update(self, message: BaseMessage):
+        """Fold one message into the state."""
+        text = message.content if isinstance(message.content, str) else str(message.content)
+        if message.type == "human":
+            self._update_from_user(text)
+        elif message.type == "ai":
+            self._update_from_plan(text)
+
+    def _update_from_user(self, text: str):
+        duration = extract_duration(text)
+        if duration is not None:
+            self.time_budget = duration[1]
+        for match in COMPLETED_RE.finditer(text):
+            numbers = match.group(1) or match.group(2)
+            for number in re.findall(r"\d+", numbers):
+                if int(number) not in self.completed:
+                    self.completed.append(int(number))
+        self.completed.sort()
+        if self.goal is None:
+            self.goal = text.strip()[:120]
+
+    def _update_from_plan(self, text: str):
+        parser = BreakdownParser()
+        try:
+            parser.feed(text)
+            parser.close()
+        except BreakdownParseError:
+            return
+        if parser.header and parser.header != self.goal:
+            self.goal = parser.header
+            self.completed = []
+        self.steps = [(step.title, step.time) for step in parser.steps]
+        self.plan = to_task_dict(parser.steps)
+
+    def set_plan(self, tasks: dict):
+        """Replace the current plan, e.g. after it was scheduled or edited."""
+        self.plan = dict(tasks)
+        self.steps = [
+            (task[f"Task {number}"], task.get(f"Time required T{number}"))
+            for number, task in iter_task_dicts(tasks)
+        ]
+
+    def summary(self, max_tokens: int = None) -> str:
+        lines = ["Task state so far:"]
+        if self.goal:
+            lines.append(f"- Goal: {self.goal}")
+        if self.time_budget is not None:
+            lines.append(f"- Time budget: {self.time_budget} minutes")
+        if self.completed:
+            lines.append(f"- Completed steps: {', '.join(map(str, self.completed))}")
+        if self.steps:
+            lines.append("- Current plan:")
+            for number, (title, time) in enumerate(self.steps, 1):
+                lines.append(f"  {number}. {title}" + (f" ({time})" if time else ""))
+        text = "\n".join(lines)
+        if max_tokens is not None and estimate_tokens(text) > max_tokens:
+            text = text[: max_tokens * 4 - 4].rsplit("\n", 1)[0] + "\n  ..."
+        return text
+
+    def to_dict(self) -> dict:
+        return {
+            "goal": self.goal,
+            "time_budget": self.time_budget,
+            "steps": [list(step) for step in self.steps],
+            "completed": list(self.completed),
+            "plan": self.plan,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "TaskState":
+        return cls(
+            goal=data.get("goal"),
+            time_budget=data.get("time_budget"),
+            steps=[tuple(step) for step in data.get("steps", [])],
+            completed=list(data.get("completed", [])),
+            plan=data.get("plan"),
+        )
+
+
+class BudgetedChatHistory(BaseChatMessageHistory):
+    """
+    Chat history for RunnableWithMessageHistory that keeps the last
+    recent_turns turns verbatim and replaces everything older with the
+    TaskState summary. messages never exceeds max_tokens (estimated).
+    """
+
+    def __init__(self, recent_turns=DEFAULT_RECENT_TURNS, max_tokens=DEFAULT_MAX_TOKENS):
+        self.recent_turns = recent_turns
+        self.max_tokens = max_tokens
+        self.state = TaskState()
+        self.recent = deque(maxlen=2 * recent_turns)
+        self.folded = 0  # messages that dropped out of the verbatim window
+
+    def add_message(self, message: BaseMessage) -> None:
+        # Streamed replies arrive as a merged AIMessageChunk
+        message = message_chunk_to_message(message)
+        self.state.update(message)
+        if len(self.recent) == self.recent.maxlen:
+            self.folded += 1
+        self.recent.append(message)
+
+    def current_plan(self):
+        """The last plan of the conversation as a task dict, or None."""
+        return self.state.plan
+
+    def set_plan(self, tasks: dict) -> None:
+        self.state.set_plan(tasks)
+
+    @property
+    def messages(self) -> list:
+        budget = self.max_tokens
+        summary = None
+        if self.folded:
+            summary = self.state.summary(budget // 2)
+            budget -= estimate_tokens(summary)
+
+        kept = []
+        for message in reversed(self.recent):
+            cost = estimate_tokens(str(message.content))
+            if cost > budget:
+                break
+            kept.append(message)
+            budget -= cost
+        kept.reverse()
+
+        if summary is None and len(kept) < len(self.recent):
+            # Recent turns alone overflow the budget, summarize instead
+            summary = self.state.summary(self.max_tokens // 2)
+            budget = self.max_tokens - estimate_tokens(summary)
+            while kept and sum(estimate_tokens(str(m.content)) for m in kept) > budget:
+                kept.pop(0)
+        if summary is not None:
+            return [SystemMessage(content=summary)] + kept
+        return kept
+
+    def clear(self) -> None:
+        self.state = TaskState()
+        self.recent.clear()
+        self.folded = 0
+
+
+def format_history(messages) -> str:
+    """Plain-text chat history for string prompt templates."""
+    lines = []
+    for message in messages:
+        if isinstance(message, SystemMessage):
+            lines.append(message.content)
+        elif isinstance(message, AIMessage):
+            lines.append(f"Anakin: {message.content}")
+        else:
+            lines.append(f"User: {message.content}")
+    return "\n".join(lines)
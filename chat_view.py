@@ -0,0 +1,67 @@
+from task_parser import iter_task_dicts
+
+# --- Pre-rendered blocks for the Streamlit pages ---
+# Streamlit reruns the whole script on every interaction, and every
+# st.markdown call is an element to diff and send. Plans are therefore
+# rendered as one markdown block, and a conversation is cut into pages of
+# PAGE_SIZE messages whose markdown is built once, when the page fills up,
+# and reused on every rerun afterwards. Only the newest messages (the
+# unfinished page) are rendered again. No Streamlit import here.
+
+PAGE_SIZE = 20
+
+
+def plan_markdown(tasks: dict, note: str = None) -> str:
+    """A whole plan as one markdown block, phase headings included."""
+    lines = []
+    phase = None
+    for number, task in iter_task_dicts(tasks):
+        if task.get(f"Phase T{number}", phase) != phase:
+            phase = task[f"Phase T{number}"]
+            lines += [f"#### {phase}", ""]
+        lines.append(f"**Task {number}:** {task[f'Task {number}']}  ")
+        lines.append(f"**Time required:** {task.get(f'Time required T{number}', 'N/A')}")
+        lines.append("")
+    if note:
+        lines.append(f"*{note}*")
+    return "\n".join(lines)
+
+
+def message_markdown(message: dict) -> str:
+    """One {"role", "content"} conversation message."""
+    if message["role"] == "user":
+        return f"**🧑 You:** {message['content']}"
+    return f"**🤖 Anakin:**\n\n{message['content']}"
+
+
+def messages_markdown(messages) -> str:
+    return "\n\n---\n\n".join(message_markdown(message) for message in messages)
+
+
+class ConversationView:
+    """
+    A conversation as full pages of pre-rendered markdown plus the
+    messages after the last full page. Keep one per browser session
+    (st.session_state) and sync() it with the conversation every rerun;
+    only messages added since the last sync are looked at.
+    """
+
+    def __init__(self, page_size=PAGE_SIZE):
+        self.page_size = page_size
+        self.pages = []  # markdown of every full page, oldest first
+
+    @property
+    def paged(self) -> int:
+        """Messages covered by the full pages."""
+        return len(self.pages) * self.page_size
+
+    def sync(self, conversation: list):
+        if len(conversation) < self.paged:
+            self.pages.clear()  # the conversation was reset
+        while len(conversation) - self.paged >= self.page_size:
+            start = self.paged
+            self.pages.append(messages_markdown(conversation[start:start + self.page_size]))
+
+    def tail(self, conversation: list) -> str:
+        """Markdown of the messages after the last full page."""
+        return messages_markdown(conversation[self.paged:])
@@ -0,0 +1,282 @@
+import os
+import re
+import json
+import time
+import random
+import asyncio
+from typing import Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableLambda
+from pydantic import Field, PrivateAttr
+
+from response_cache import normalize_input
+
+from task_plan import PlanPhase, PlanStep, TaskPlan
+from task_parser import (
+    BreakdownParseError,
+    extract_duration,
+    parse_breakdown,
+    parse_duration,
+    render_tasks_markdown,
+    tasks_to_json,
+)
+
+# --- Local stand-in for Gemini ---
+# Answers the prompts the project uses without touching the network:
+# breakdown prompts get a well-formed plan sized to the requested time,
+# parser prompts get the JSON for the breakdown they contain, split
+# prompts get equal pieces of the step, and
+# with_structured_output() returns the same plan as a TaskPlan.
+# Breakdowns recorded from the real model (see load_recordings) are
+# replayed instead of the generated plan for the inputs they cover.
+# Each router tier can get its own fake ("fake-anakin-fast" reads
+# ANAKIN_FAKE_FAST_* before ANAKIN_FAKE_*), e.g. a fast tier that answers
+# some requests in prose to exercise escalation.
+
+STEP_TITLES = [
+    "📚 Skim the material",
+    "🎯 Set a goal for the session",
+    "✍️ Take notes on the key ideas",
+    "🧩 Work through examples",
+    "💻 Practice on your own",
+    "🔁 Review what was hard",
+    "🧠 Quiz yourself",
+    "☕ Take a short break",
+    "📝 Summarize in your own words",
+    "✅ Wrap up and plan next steps",
+]
+
+
+def fake_steps(user_input: str) -> list:
+    """(title, minutes) for 3-10 steps, depending on the budget."""
+    duration = extract_duration(user_input)
+    total = duration[1] if duration else 60
+    count = min(len(STEP_TITLES), max(3, total // 30))
+    minutes = [total // count] * count
+    minutes[-1] += total - sum(minutes)
+    return list(zip(STEP_TITLES, minutes))
+
+
+def fake_breakdown(user_input: str) -> str:
+    """A plan in the breakdown format."""
+    tasks = {}
+    for number, (title, time_needed) in enumerate(fake_steps(user_input), 1):
+        tasks[f"Task {number}"] = title
+        tasks[f"Time required T{number}"] = f"{time_needed} minutes"
+    return render_tasks_markdown(tasks, user_input.strip()[:60])
+
+
+def fake_plan(user_input: str) -> TaskPlan:
+    steps = []
+    for title, time_needed in fake_steps(user_input):
+        emoji, title = title.split(" ", 1)
+        steps.append(PlanStep(emoji=emoji, title=title, minutes=time_needed))
+    return TaskPlan(header=user_input.strip()[:60], phases=[PlanPhase(steps=steps)])
+
+
+def fake_split(prompt: str) -> str:
+    """Pieces of the step in a SPLIT_TEMPLATE prompt, one line each."""
+    parts = int(re.search(r"into (\d+) smaller steps", prompt).group(1))
+    step = prompt.split("cover the same work:", 1)[1].strip().splitlines()[0]
+    title = re.sub(r"\s*\([^()]*\)$", "", step)
+    duration = parse_duration(step[len(title):].strip(" ()"))
+    minutes = max(1, (duration[1] if duration else 30) // parts)
+    return "\n".join(f"- 🔹 {title}: part {i} ({minutes} minutes)" for i in range(1, parts + 1))
+
+
+def fake_malformed(user_input: str) -> str:
+    """A breakdown answer that ignores the format, as a weak model might give."""
+    return f"Sure! To {user_input.strip()[:60]}, start with the basics, then practice, then review."
+
+
+def fake_parse(prompt: str) -> str:
+    breakdown = prompt.rsplit("Here is the task breakdown to parse:", 1)[-1]
+    try:
+        return tasks_to_json(parse_breakdown(breakdown))
+    except BreakdownParseError:
+        return "{}"
+
+
+def load_recordings(path: str) -> dict:
+    """
+    Read recorded breakdowns, one JSON object per line with "input" and
+    "breakdown" fields, keyed by normalized input.
+    """
+    recordings = {}
+    with open(path, encoding="utf-8") as lines:
+        for line in lines:
+            if line.strip():
+                record = json.loads(line)
+                recordings[normalize_input(record["input"])] = record["breakdown"]
+    return recordings
+
+
+class FakeServiceError(ConnectionError):
+    """Injected backend failure, looks like an HTTP 503."""
+
+    status_code = 503
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Deterministic chat model for local runs and benchmarks.
+    latency is the median time to first token in seconds, seconds_per_token
+    the median generation time per output token (about four characters).
+    latency_sigma and rate_sigma spread them log-normally per call, drawn
+    from a generator seeded with seed. For resilience tests, error_rate of
+    calls fail with FakeServiceError and stall_rate of calls wait
+    stall_seconds before their first token. Like an HTTP client, a call
+    that has waited timeout seconds gives up with TimeoutError. For router
+    tests, malformed_rate of breakdown answers ignore the format.
+    """
+
+    latency: float = 0.0
+    seconds_per_token: float = 0.0
+    latency_sigma: float = 0.0
+    rate_sigma: float = 0.0
+    error_rate: float = 0.0
+    stall_rate: float = 0.0
+    stall_seconds: float = 30.0
+    timeout: Optional[float] = None
+    malformed_rate: float = 0.0
+    seed: Optional[int] = None
+    recordings: dict = Field(default_factory=dict)
+    model: str = "fake-anakin"
+    structured: bool = False
+    _random: random.Random = PrivateAttr(default=None)
+
+    def model_post_init(self, context) -> None:
+        self._random = random.Random(self.seed)
+
+    @classmethod
+    def from_env(cls, model: str = "fake-anakin", **config) -> "FakeChatModel":
+        """
+        Build from ANAKIN_FAKE_* variables: LATENCY, SECONDS_PER_TOKEN,
+        LATENCY_SIGMA, RATE_SIGMA, ERROR_RATE, STALL_RATE, STALL_SECONDS,
+        MALFORMED_RATE, SEED and RECORDINGS (a JSONL file). A model named
+        "fake-anakin-<tier>" reads ANAKIN_FAKE_<TIER>_* first.
+        """
+        options = {}
+        fields = (
+            "latency", "seconds_per_token", "latency_sigma", "rate_sigma",
+            "error_rate", "stall_rate", "stall_seconds", "malformed_rate",
+        )
+        prefixes = ["ANAKIN_FAKE_"]
+        if model.startswith("fake-anakin-"):
+            prefixes.append(f"ANAKIN_FAKE_{model[len('fake-anakin-'):].upper()}_")
+        for field in fields:
+            for prefix in prefixes:
+                value = os.environ.get(f"{prefix}{field.upper()}")
+                if value:
+                    options[field] = float(value)
+        if os.environ.get("ANAKIN_FAKE_SEED"):
+            options["seed"] = int(os.environ["ANAKIN_FAKE_SEED"])
+        if os.environ.get("ANAKIN_FAKE_RECORDINGS"):
+            options["recordings"] = load_recordings(os.environ["ANAKIN_FAKE_RECORDINGS"])
+        return cls(model=model, **{**options, **config})
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-anakin"
+
+    def _respond(self, messages) -> str:
+        prompt = "\n".join(str(message.content) for message in messages)
+        if "task parser" in prompt:
+            return fake_parse(prompt)
+        if "Split this step" in prompt:
+            return fake_split(prompt)
+        user_input = prompt.rsplit("Here is the user's task to break down:", 1)[-1]
+        if self.malformed_rate and self._random.random() < self.malformed_rate:
+            return fake_malformed(user_input)
+        if self.structured:
+            return fake_plan(user_input).model_dump_json(exclude_none=True)
+        recorded = self.recordings.get(normalize_input(user_input))
+        if recorded is not None:
+            return recorded
+        return fake_breakdown(user_input)
+
+    def with_structured_output(self, schema, **kwargs):
+        """Answer with schema (a TaskPlan) parsed from the model's JSON."""
+        model = self.model_copy(update={"structured": True})
+        model._random = self._random
+        return model | RunnableLambda(lambda message: schema.model_validate_json(message.content))
+
+    def _tokens(self, text: str):
+        words = text.split(" ")
+        return [word + " " for word in words[:-1]] + words[-1:]
+
+    def _maybe_fail(self):
+        if self.error_rate and self._random.random() < self.error_rate:
+            raise FakeServiceError("fake backend unavailable")
+
+    def _first_token_delay(self) -> float:
+        if self.stall_rate and self._random.random() < self.stall_rate:
+            return self.stall_seconds
+        return self.latency * self._random.lognormvariate(0, self.latency_sigma)
+
+    def _token_delay(self) -> float:
+        return self.seconds_per_token * self._random.lognormvariate(0, self.rate_sigma)
+
+    def _delay(self, text: str) -> float:
+        return self._first_token_delay() + self._token_delay() * (len(text) // 4)
+
+    def _wait(self, seconds: float):
+        if self.timeout is not None and seconds > self.timeout:
+            time.sleep(self.timeout)
+            raise TimeoutError(f"no answer within {self.timeout}s")
+        time.sleep(seconds)
+
+    async def _await(self, seconds: float):
+        if self.timeout is not None and seconds > self.timeout:
+            await asyncio.sleep(self.timeout)
+            raise TimeoutError(f"no answer within {self.timeout}s")
+        await asyncio.sleep(seconds)
+
+    def _message(self, messages, text: str) -> AIMessage:
+        return AIMessage(
+            content=text,
+            usage_metadata=self._usage(messages, text),
+            response_metadata={"model_name": self.model},
+        )
+
+    def _usage(self, messages, text: str) -> dict:
+        prompt_tokens = sum(len(str(message.content)) // 4 for message in messages)
+        completion_tokens = len(text) // 4
+        return {
+            "input_tokens": prompt_tokens,
+            "output_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        self._maybe_fail()
+        text = self._respond(messages)
+        self._wait(self._delay(text))
+        return ChatResult(generations=[ChatGeneration(message=self._message(messages, text))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        self._maybe_fail()
+        text = self._respond(messages)
+        await self._await(self._delay(text))
+        return ChatResult(generations=[ChatGeneration(message=self._message(messages, text))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        self._maybe_fail()
+        text = self._respond(messages)
+        self._wait(self._first_token_delay())
+        token_delay = self._token_delay()
+        for token in self._tokens(text):
+            time.sleep(token_delay * len(token) / 4)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        self._maybe_fail()
+        text = self._respond(messages)
+        await self._await(self._first_token_delay())
+        token_delay = self._token_delay()
+        for token in self._tokens(text):
+            await asyncio.sleep(token_delay * len(token) / 4)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
@@ -0,0 +1,357 @@
+import os
+import sys
+import json
+import time
+import random
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+
+# --- In-process metrics, no remote service needed ---
+# Counters and histograms for the hot path: stage latencies (prompt
+# formatting, history loading, parsing, rendering), every LLM call with
+# its tokens, history length, cache lookups, retries and parse fallbacks.
+# Exported as Prometheus text (render_prometheus / start_metrics_server)
+# and as JSON log lines on the "anakin.metrics" logger.
+#
+# ANAKIN_METRICS_SAMPLE (0..1, default 1) is the fraction of stage timings
+# and LLM calls that are measured and logged; counters are always exact.
+# ANAKIN_METRICS_PORT serves /metrics, ANAKIN_METRICS_LOG=1 prints the JSON
+# lines to stderr (see setup_from_env).
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+
+logger = logging.getLogger("anakin.metrics")
+sample_rate = float(os.environ.get("ANAKIN_METRICS_SAMPLE", 1.0))
+
+
+def set_sample_rate(rate: float):
+    global sample_rate
+    sample_rate = rate
+
+
+def sampled() -> bool:
+    return sample_rate >= 1 or random.random() < sample_rate
+
+
+def label_text(labelnames, values) -> str:
+    if not labelnames:
+        return ""
+    pairs = []
+    for name, value in zip(labelnames, values):
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(labels.get(name, "") for name in self.labelnames), 0)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{label_text(self.labelnames, key)} {value}")
+        return lines
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus layout."""
+
+    def __init__(self, name: str, help: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def count(self, **labels) -> int:
+        series = self._series.get(tuple(labels.get(name, "") for name in self.labelnames))
+        return sum(series[:-1]) if series else 0
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + ("+Inf",), series[:-1]):
+                    cumulative += count
+                    labels = label_text(self.labelnames + ("le",), key + (bound,))
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = label_text(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {series[-1]:.6f}")
+                lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help: str, labelnames=()) -> Counter:
+        return self._register(Counter(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def render_prometheus(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        for metric in list(self._metrics.values()):
+            metric.reset()
+
+
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.histogram(
+    "anakin_stage_seconds", "Latency of pipeline stages (sampled)", ("stage",)
+)
+LLM_SECONDS = registry.histogram("anakin_llm_seconds", "LLM call latency (sampled)", ("model",))
+LLM_CALLS = registry.counter("anakin_llm_calls_total", "LLM calls by outcome", ("model", "outcome"))
+LLM_TOKENS = registry.counter(
+    "anakin_llm_tokens_total", "Prompt and completion tokens", ("model", "kind")
+)
+PROMPT_TOKENS = registry.histogram(
+    "anakin_llm_prompt_tokens", "Prompt tokens per LLM call (sampled)", ("model",), SIZE_BUCKETS
+)
+HISTORY_MESSAGES = registry.histogram(
+    "anakin_history_messages", "Messages loaded per history read", (), SIZE_BUCKETS
+)
+CACHE_LOOKUPS = registry.counter(
+    "anakin_cache_lookups_total", "Cache lookups by cache and result", ("cache", "result")
+)
+PARSES = registry.counter(
+    "anakin_parse_total", "Breakdowns parsed locally or by the parser model", ("outcome",)
+)
+RETRIES = registry.counter("anakin_retries_total", "Retried calls", ("stage",))
+SCHEDULES = registry.counter(
+    "anakin_schedule_total", "Plans checked against the time budget", ("outcome",)
+)
+SINGLE_FLIGHT = registry.counter(
+    "anakin_single_flight_total",
+    "Calls that ran (leader) or reused an identical call in flight (follower)",
+    ("stage", "role"),
+)
+SESSION_WAITS = registry.counter(
+    "anakin_session_waits_total", "Generations that waited for another one in the same session"
+)
+SERVICE_REQUESTS = registry.counter(
+    "anakin_service_requests_total", "HTTP requests to the planning service", ("endpoint", "status")
+)
+PLAN_EDITS = registry.counter(
+    "anakin_plan_edits_total", "Follow-ups applied to the last plan without a new plan", ("kind",)
+)
+ROUTES = registry.counter(
+    "anakin_routes_total", "Requests by the model tier the router started them at", ("stage", "tier")
+)
+ESCALATIONS = registry.counter(
+    "anakin_escalations_total",
+    "Answers that failed validation and went to the next tier",
+    ("stage", "from_tier", "reason"),
+)
+
+
+def render_prometheus() -> str:
+    return registry.render_prometheus()
+
+
+def log_event(event: str, **fields):
+    """Emit one JSON line on the anakin.metrics logger."""
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps({"ts": round(time.time(), 3), "event": event, **fields}, default=str))
+
+
+@contextmanager
+def timed(stage: str, **fields):
+    """Time the block as a pipeline stage, for a sample_rate share of calls."""
+    if not sampled():
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        STAGE_SECONDS.observe(seconds, stage=stage)
+        log_event("stage", stage=stage, seconds=round(seconds, 6), **fields)
+
+
+def record_retry(stage: str):
+    RETRIES.inc(stage=stage)
+    log_event("retry", stage=stage)
+
+
+# --- LLM calls, seen through a LangChain callback handler ---
+_llm_handler = None
+_llm_handler_lock = threading.Lock()
+
+
+def install_llm_metrics():
+    """
+    Record every LangChain LLM call in the process (latency, tokens,
+    errors). Safe to call repeatedly; imports LangChain.
+    """
+    global _llm_handler
+    with _llm_handler_lock:
+        if _llm_handler is not None:
+            return _llm_handler
+        from contextvars import ContextVar
+        from langchain_core.callbacks import BaseCallbackHandler
+        from langchain_core.tracers.context import register_configure_hook
+
+        class LLMMetricsHandler(BaseCallbackHandler):
+            def __init__(self):
+                self._calls = {}  # run_id -> (start or None, model)
+
+            def _start(self, run_id, metadata):
+                model = (metadata or {}).get("ls_model_name", "unknown")
+                self._calls[run_id] = (time.perf_counter() if sampled() else None, model)
+
+            def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+                self._start(run_id, metadata)
+
+            def on_llm_start(self, serialized, prompts, *, run_id, metadata=None, **kwargs):
+                self._start(run_id, metadata)
+
+            def on_llm_end(self, response, *, run_id, **kwargs):
+                start, model = self._calls.pop(run_id, (None, "unknown"))
+                LLM_CALLS.inc(model=model, outcome="ok")
+                usage = {}
+                for generations in response.generations:
+                    for generation in generations:
+                        message = getattr(generation, "message", None)
+                        usage = getattr(message, "usage_metadata", None) or usage
+                prompt_tokens = usage.get("input_tokens", 0)
+                completion_tokens = usage.get("output_tokens", 0)
+                LLM_TOKENS.inc(prompt_tokens, model=model, kind="prompt")
+                LLM_TOKENS.inc(completion_tokens, model=model, kind="completion")
+                if start is not None:
+                    seconds = time.perf_counter() - start
+                    LLM_SECONDS.observe(seconds, model=model)
+                    PROMPT_TOKENS.observe(prompt_tokens, model=model)
+                    log_event(
+                        "llm_call",
+                        model=model,
+                        seconds=round(seconds, 6),
+                        prompt_tokens=prompt_tokens,
+                        completion_tokens=completion_tokens,
+                    )
+
+            def on_llm_error(self, error, *, run_id, **kwargs):
+                _, model = self._calls.pop(run_id, (None, "unknown"))
+                LLM_CALLS.inc(model=model, outcome="error")
+                log_event("llm_error", model=model, error=f"{type(error).__name__}: {error}")
+
+        _llm_handler = LLMMetricsHandler()
+        # A context variable whose default is the handler applies to every
+        # thread and task, including Streamlit's script threads.
+        register_configure_hook(ContextVar("anakin_llm_metrics", default=_llm_handler), inheritable=True)
+        return _llm_handler
+
+
+# --- Exports ---
+_server = None
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1"):
+    """Serve GET /metrics in Prometheus text format on a daemon thread (once)."""
+    global _server
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    with _llm_handler_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), MetricsHandler)
+            threading.Thread(target=_server.serve_forever, daemon=True).start()
+    return _server
+
+
+def configure_json_logs(stream=None):
+    """Print the JSON lines (and nothing else) to stream, default stderr."""
+    if any(getattr(handler, "anakin_json", False) for handler in logger.handlers):
+        return
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    handler.anakin_json = True
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+_setup_done = False
+
+
+def setup_from_env():
+    """
+    Start the exports configured by ANAKIN_METRICS_PORT and
+    ANAKIN_METRICS_LOG, once per process.
+    """
+    global _setup_done
+    if _setup_done:
+        return
+    _setup_done = True
+    if os.environ.get("ANAKIN_METRICS_LOG"):
+        configure_json_logs()
+    if os.environ.get("ANAKIN_METRICS_PORT"):
+        try:
+            start_metrics_server(int(os.environ["ANAKIN_METRICS_PORT"]))
+        except OSError as error:
+            # Another worker already serves this port
+            logger.warning("metrics server not started: %s", error)
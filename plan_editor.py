@@ -0,0 +1,251 @@
+import re
+from dataclasses import dataclass, field
+
+from scheduler import distribute, enforce_budget
+from task_parser import (
+    MARKDOWN_RE,
+    NUMBER_WORDS,
+    extract_duration,
+    format_minutes,
+    iter_task_dicts,
+    normalize_number_words,
+    parse_duration,
+    strip_emoji,
+)
+
+# --- Local edits of the last plan ---
+# Follow-ups such as "make it 2 hours instead", "drop step 3", "move step 4
+# to the top" or "split step 2 into smaller pieces" change the plan the
+# user already has. They are recognised here with a few patterns and
+# applied to the session's last plan (TaskState.plan) in place: steps are
+# removed, moved or rescaled and renumbered without a model call. Only a
+# split needs new step titles, and then the model gets just that step
+# (SPLIT_TEMPLATE), not the conversation. Anything that isn't clearly an
+# edit is planned by the model as before.
+
+SPLIT_TEMPLATE = """
+You are Anakin, an assistant that breaks tasks into small, concrete steps.
+The user is working on: {goal}
+
+Split this step of their plan into {parts} smaller steps that together cover the same work:
+{step}
+
+Answer with one line per step and nothing else, in this format:
+- <emoji> <step title> (<minutes> minutes)
+"""
+
+STEP_LIST = r"steps?\s+(\d+(?:\s*(?:,|and|&)\s*(?:step\s+)?\d+)*)"
+POLITE = r"(?:(?:ok(?:ay)?|actually|now|please|can you|could you|let's)[,\s]+)*"
+END = r"(?:\s+please)?[.!]*"
+
+DROP_RE = re.compile(
+    rf"^{POLITE}(?:drop|remove|delete|skip|cut|get rid of)\s+(?:the\s+)?{STEP_LIST}{END}$"
+)
+SWAP_RE = re.compile(rf"^{POLITE}swap\s+steps?\s+(\d+)\s*(?:and|with|&)\s*(?:step\s+)?(\d+){END}$")
+MOVE_RE = re.compile(
+    rf"^{POLITE}(?:move|put|do)\s+step\s+(\d+)\s+"
+    r"(?:(?P<first>to the (?:top|start|beginning)|first)"
+    r"|(?P<last>to the (?:end|bottom)|last)"
+    r"|(?P<where>before|after)\s+step\s+(?P<anchor>\d+)"
+    rf"|to (?:position|place|number)\s+(?P<position>\d+)){END}$"
+)
+PIECES = r"(?:smaller\s+|more\s+|tiny\s+)?(?:pieces|parts|steps|chunks|bits|ones)"
+# "into 3" needs no noun, "into smaller pieces" does
+SPLIT_RE = re.compile(
+    rf"^{POLITE}(?:split|break(?:\s+up|\s+down)?|divide|chunk)\s+step\s+(\d+)"
+    rf"(?:\s+(?:into|in)\s+(?:(?P<parts>\d+)(?:\s*{PIECES})?|{PIECES}))?{END}$"
+)
+
+# Words a "change the time budget" follow-up may contain besides the duration
+RESCALE_WORDS = {
+    "ok", "okay", "actually", "hmm", "now", "but", "please", "can", "could", "you",
+    "let's", "lets", "make", "change", "cut", "shorten", "stretch", "extend",
+    "squeeze", "fit", "do", "it", "this", "that", "the", "plan", "everything",
+    "whole", "thing", "to", "in", "into", "for", "down", "up", "within", "i",
+    "i've", "i'm", "we", "only", "have", "got", "just", "instead", "total",
+    "max", "tops", "about", "around", "an", "a", "and", "half", "of", "left",
+    "there's", "time", "need", "should", "take", "hour", "hours", "hr", "hrs",
+    "h", "minute", "minutes", "min", "mins", "m",
+}
+# Spelled-out step numbers: "drop step three", "split step 2 into four"
+STEP_NUMBER_WORD_RE = re.compile(
+    r"\b(steps?|and|&|,|with|position|place|number|into|in)\s+("
+    + "|".join(word for word in NUMBER_WORDS if word.isalpha() and len(word) > 2)
+    + r")\b"
+)
+TOKEN_RE = re.compile(r"\d+(?:\.\d+)?|[a-z']+")
+SPLIT_LINE_RE = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s*(.+?)\s*(?:\(([^()]*)\))?\s*$")
+
+
+@dataclass
+class PlanEdit:
+    kind: str  # "rescale", "drop", "move", "swap" or "split"
+    steps: list = field(default_factory=list)  # step numbers, 1-based
+    position: int = None  # "move": the step's new number
+    parts: int = None  # "split": number of pieces, None to pick by length
+
+
+def step_numbers(text: str) -> list:
+    return [int(number) for number in re.findall(r"\d+", text)]
+
+
+def is_rescale(text: str) -> bool:
+    """True for follow-ups that only set a new time budget ("make it 2 hours instead")."""
+    if extract_duration(text) is None:
+        return False
+    return all(token[0].isdigit() or token in RESCALE_WORDS for token in TOKEN_RE.findall(text))
+
+
+def classify_followup(user_input: str, step_count: int):
+    """
+    The edit user_input asks for on a plan of step_count steps, or None if
+    it isn't an edit this module can apply (or names steps the plan lacks).
+    """
+    text = normalize_number_words(user_input).strip()
+    text = STEP_NUMBER_WORD_RE.sub(lambda match: f"{match.group(1)} {NUMBER_WORDS[match.group(2)]}", text)
+    text = re.sub(r"\s+", " ", text)
+
+    def valid(*numbers):
+        return all(1 <= number <= step_count for number in numbers)
+
+    match = DROP_RE.match(text)
+    if match:
+        numbers = sorted(set(step_numbers(match.group(1))))
+        if valid(*numbers) and len(numbers) < step_count:
+            return PlanEdit("drop", numbers)
+        return None
+    match = SWAP_RE.match(text)
+    if match:
+        a, b = int(match.group(1)), int(match.group(2))
+        return PlanEdit("swap", [a, b]) if valid(a, b) and a != b else None
+    match = MOVE_RE.match(text)
+    if match:
+        number = int(match.group(1))
+        if match.group("first"):
+            position = 1
+        elif match.group("last"):
+            position = step_count
+        elif match.group("position"):
+            position = int(match.group("position"))
+        else:
+            anchor = int(match.group("anchor"))
+            if not valid(anchor) or anchor == number:
+                return None
+            # The step's number once it sits before/after the anchor
+            position = anchor if match.group("where") == "before" else anchor + 1
+            if number < anchor:
+                position -= 1
+        return PlanEdit("move", [number], position=position) if valid(number, position) else None
+    match = SPLIT_RE.match(text)
+    if match:
+        number = int(match.group(1))
+        parts = int(match.group("parts")) if match.group("parts") else None
+        if valid(number) and (parts is None or 2 <= parts <= 10):
+            return PlanEdit("split", [number], parts=parts)
+        return None
+    if is_rescale(text):
+        return PlanEdit("rescale")
+    return None
+
+
+def plan_steps(tasks: dict) -> list:
+    """The plan as a list of {"title", "time", "phase"} dicts."""
+    return [
+        {
+            "title": task[f"Task {number}"],
+            "time": task.get(f"Time required T{number}"),
+            "phase": task.get(f"Phase T{number}"),
+        }
+        for number, task in iter_task_dicts(tasks)
+    ]
+
+
+def steps_to_tasks(steps: list) -> dict:
+    """Renumber steps into a task dict."""
+    tasks = {}
+    for number, step in enumerate(steps, 1):
+        tasks[f"Task {number}"] = step["title"]
+        if step["time"]:
+            tasks[f"Time required T{number}"] = step["time"]
+        if step["phase"]:
+            tasks[f"Phase T{number}"] = step["phase"]
+    return tasks
+
+
+def step_minutes(step: dict):
+    duration = parse_duration(step["time"] or "")
+    return None if duration is None else round((duration[0] + duration[1]) / 2)
+
+
+def split_parts(step: dict, edit: PlanEdit) -> int:
+    if edit.parts:
+        return edit.parts
+    minutes = step_minutes(step)
+    return 3 if minutes is None else max(2, min(4, minutes // 15))
+
+
+def split_input(tasks: dict, edit: PlanEdit, goal: str = None) -> dict:
+    """Variables for SPLIT_TEMPLATE: the goal and the one step to split."""
+    step = plan_steps(tasks)[edit.steps[0] - 1]
+    text = step["title"] + (f" ({step['time']})" if step["time"] else "")
+    return {"goal": goal or "their plan", "step": text, "parts": split_parts(step, edit)}
+
+
+def parse_split(text: str) -> list:
+    """(title, minutes or None) for every step line of a split answer."""
+    parts = []
+    for line in text.splitlines():
+        match = SPLIT_LINE_RE.match(line)
+        if not match:
+            continue
+        title = strip_emoji(MARKDOWN_RE.sub("", match.group(1))).strip(" :-")
+        duration = parse_duration(match.group(2) or "")
+        if title:
+            parts.append((title, None if duration is None else (duration[0] + duration[1]) / 2))
+    return parts
+
+
+def apply_split(steps: list, edit: PlanEdit, answer: str):
+    index = edit.steps[0] - 1
+    step = steps[index]
+    parts = parse_split(answer or "")
+    if len(parts) < 2:
+        # Unusable answer, split the step into equal parts instead
+        count = split_parts(step, edit)
+        parts = [(f"{step['title']} (part {i} of {count})", None) for i in range(1, count + 1)]
+    minutes = step_minutes(step)
+    if minutes is not None and minutes >= len(parts):
+        # The pieces share the step's time, weighted by the model's estimates
+        weights = [part_minutes or 1 for _, part_minutes in parts]
+        if None in (part_minutes for _, part_minutes in parts):
+            weights = [1] * len(parts)
+        times = [format_minutes(value, value) for value in distribute(weights, minutes)]
+    else:
+        times = [None if value is None else format_minutes(round(value), round(value)) for _, value in parts]
+    steps[index:index + 1] = [
+        {"title": title, "time": time, "phase": step["phase"]}
+        for (title, _), time in zip(parts, times)
+    ]
+
+
+def apply_edit(tasks: dict, edit: PlanEdit, user_input: str, answer: str = None):
+    """
+    The edited plan as a new task dict, or None if the edit can't be done
+    locally. answer is the model's reply to SPLIT_TEMPLATE for a split.
+    """
+    if edit.kind == "rescale":
+        result = enforce_budget(tasks, user_input)
+        return result.tasks if result.ok and result.total is not None else None
+
+    steps = plan_steps(tasks)
+    if edit.kind == "drop":
+        steps = [step for number, step in enumerate(steps, 1) if number not in edit.steps]
+    elif edit.kind == "move":
+        step = steps.pop(edit.steps[0] - 1)
+        steps.insert(edit.position - 1, step)
+    elif edit.kind == "swap":
+        a, b = edit.steps[0] - 1, edit.steps[1] - 1
+        steps[a], steps[b] = steps[b], steps[a]
+    elif edit.kind == "split":
+        apply_split(steps, edit, answer)
+    return steps_to_tasks(steps)
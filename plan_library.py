@@ -0,0 +1,365 @@
+"""
+Build the precomputed plan library from a catalog of common requests.
+
+    python plan_library.py catalog.jsonl -o .anakin_plans.lib --concurrency 16 --rpm 300
+    python plan_library.py catalog.jsonl --fake   # offline build with the fake model
+
+Every catalog line is a JSON object with either an "input" field or a
+"topic" and an optional "duration" ("4 hours", "90 minutes"). Each request
+is planned through aget_parsed_tasks, plans that don't pass validate_plan
+are left out, and the rest are written to the library file in one go
+(replacing the old file atomically, so running processes keep reading
+theirs). The library is stamped with the prompt version it was built
+with; a process whose prompt differs ignores it.
+"""
+import os
+import sys
+import json
+import mmap
+import time
+import uuid
+import struct
+import asyncio
+import hashlib
+import argparse
+import threading
+
+from metrics import CACHE_LOOKUPS, log_event
+from scheduler import enforce_budget
+from semantic_cache import durations_compatible, extract_slots, rescale_tasks
+from task_parser import extract_duration, iter_task_dicts
+
+# --- Precomputed plans, served before the model is asked ---
+# Common requests (topic, duration) are planned offline and stored in one
+# compact, read-only file that is memory-mapped on first use:
+#
+#   header | version | prefix table | slots | data
+#
+# A request is reduced to its topic tokens and duration (extract_slots,
+# the same slots the semantic cache uses), so "I want to study oops in
+# next 4 hours" and "study OOP for 4h" share a key. Slots are sorted by
+# the 64-bit hash of the topic; the prefix table holds, for every value of
+# the hash's top prefix_bits bits, where its slots start, so a lookup is a
+# table read and a short binary search over the mapped file. A slot points
+# at the plan's data: the topic key (to rule out hash collisions) and the
+# task dict as compact JSON. Plans for the same topic with another
+# duration are served rescaled when the durations are within max_ratio.
+# The stored version is the caller's prompt version plus KEY_VERSION, which
+# changes whenever the way requests are reduced to keys does.
+
+DEFAULT_LIBRARY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".anakin_plans.lib")
+MAGIC = b"ANKPLIB1"
+HEADER = struct.Struct("<8sBxHI")  # magic, prefix bits, version length, slot count
+PREFIX = struct.Struct("<I")
+SLOT = struct.Struct("<QQII")  # topic hash, data offset, minutes (0: no budget), data length
+MAX_PREFIX_BITS = 16
+# 2: numbers other than the duration are part of the topic key
+KEY_VERSION = 2
+DEFAULT_CONCURRENCY = 8
+
+
+def library_path():
+    """ANAKIN_PLAN_LIBRARY, None when it's set to "" or "off"."""
+    path = os.environ.get("ANAKIN_PLAN_LIBRARY", DEFAULT_LIBRARY_PATH)
+    return None if path.lower() in ("", "0", "off") else path
+
+
+def library_stamp(version: str) -> str:
+    """The version written to and expected in a library file."""
+    return f"{version}:keys{KEY_VERSION}"
+
+
+def topic_key(tokens) -> str:
+    return " ".join(sorted(tokens))
+
+
+def topic_hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def budget_minutes(duration) -> int:
+    return 0 if duration is None else duration[1]
+
+
+def aligned(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+def prefix_bits_for(count: int) -> int:
+    return max(1, min(MAX_PREFIX_BITS, count.bit_length()))
+
+
+def write_library(path: str, version: str, plans) -> int:
+    """
+    Write (request text, task dict) pairs to a library file; a later plan
+    for the same topic and budget replaces an earlier one. Returns the
+    number of plans written.
+    """
+    entries = {}
+    for text, tasks in plans:
+        tokens, duration = extract_slots(text)
+        if tokens and tasks:
+            key = topic_key(tokens)
+            entries[(topic_hash(key), budget_minutes(duration))] = (key, tasks)
+
+    bits = prefix_bits_for(len(entries))
+    version_bytes = library_stamp(version).encode("utf-8")
+    prefix_start = aligned(HEADER.size + len(version_bytes))
+    slots_start = aligned(prefix_start + PREFIX.size * ((1 << bits) + 1))
+
+    slots, data, counts = [], bytearray(), [0] * (1 << bits)
+    for (hash_value, minutes), (key, tasks) in sorted(entries.items()):
+        record = (key + "\n" + json.dumps(tasks, ensure_ascii=False, separators=(",", ":"))).encode("utf-8")
+        slots.append(SLOT.pack(hash_value, len(data), minutes, len(record)))
+        data += record
+        counts[hash_value >> (64 - bits)] += 1
+
+    prefix, start = [], 0
+    for count in counts:
+        prefix.append(PREFIX.pack(start))
+        start += count
+    prefix.append(PREFIX.pack(start))
+
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as out:
+        out.write(HEADER.pack(MAGIC, bits, len(version_bytes), len(entries)))
+        out.write(version_bytes)
+        out.write(b"\0" * (prefix_start - HEADER.size - len(version_bytes)))
+        out.write(b"".join(prefix))
+        out.write(b"\0" * (slots_start - prefix_start - PREFIX.size * len(prefix)))
+        out.write(b"".join(slots))
+        out.write(data)
+    os.replace(temporary, path)
+    return len(entries)
+
+
+class PlanLibrary:
+    """
+    Read-only view of a library file. lookup() returns (tasks, exact) for
+    the stored plan matching a request's topic, exact if its budget
+    matched too, or None.
+    """
+
+    def __init__(self, path: str, max_ratio: float = 1.25):
+        self.path = path
+        self.max_ratio = max_ratio
+        with open(path, "rb") as source:
+            self._map = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.prefix_bits, version_length, self.count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a plan library")
+        self.version = self._map[HEADER.size:HEADER.size + version_length].decode("utf-8")
+        self._prefix_start = aligned(HEADER.size + version_length)
+        self._slots_start = aligned(self._prefix_start + PREFIX.size * ((1 << self.prefix_bits) + 1))
+        self._data_start = self._slots_start + SLOT.size * self.count
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        self._map.close()
+
+    def _slot(self, index: int):
+        return SLOT.unpack_from(self._map, self._slots_start + SLOT.size * index)
+
+    def _candidates(self, hash_value: int) -> list:
+        """(minutes, data offset, length) of every slot with hash_value."""
+        prefix = hash_value >> (64 - self.prefix_bits)
+        low = PREFIX.unpack_from(self._map, self._prefix_start + PREFIX.size * prefix)[0]
+        high = PREFIX.unpack_from(self._map, self._prefix_start + PREFIX.size * (prefix + 1))[0]
+        while low < high:
+            middle = (low + high) // 2
+            if self._slot(middle)[0] < hash_value:
+                low = middle + 1
+            else:
+                high = middle
+        found = []
+        while low < self.count:
+            slot_hash, offset, minutes, length = self._slot(low)
+            if slot_hash != hash_value:
+                break
+            found.append((minutes, offset, length))
+            low += 1
+        return found
+
+    def _read(self, key: str, offset: int, length: int):
+        start = self._data_start + offset
+        stored_key, _, body = self._map[start:start + length].decode("utf-8").partition("\n")
+        return json.loads(body) if stored_key == key else None
+
+    def lookup(self, text: str):
+        tokens, duration = extract_slots(text)
+        if not tokens:
+            return None
+        key = topic_key(tokens)
+        minutes = budget_minutes(duration)
+        best = None
+        for slot_minutes, offset, length in self._candidates(topic_hash(key)):
+            if slot_minutes == minutes:
+                best = (0, slot_minutes, offset, length)
+                break
+            if not slot_minutes or duration is None:
+                continue
+            if durations_compatible((slot_minutes, slot_minutes), duration, self.max_ratio):
+                distance = abs(slot_minutes - minutes)
+                if best is None or distance < best[0]:
+                    best = (distance, slot_minutes, offset, length)
+        if best is None:
+            return None
+        _, slot_minutes, offset, length = best
+        tasks = self._read(key, offset, length)
+        if tasks is None:
+            return None
+        if slot_minutes != minutes:
+            return rescale_tasks(tasks, round(sum(duration) / 2)), False
+        return tasks, True
+
+
+_library = None
+_library_opened = False
+_library_lock = threading.Lock()
+
+
+def get_plan_library(version: str):
+    """
+    The library at library_path(), opened on first use, or None if there
+    is none or it was built with another prompt version (then it's stale
+    and ignored until a new one is built and the process restarts).
+    """
+    global _library, _library_opened
+    if not _library_opened:
+        with _library_lock:
+            if not _library_opened:
+                _library = open_library(library_path(), version)
+                _library_opened = True
+    return _library
+
+
+def open_library(path, version):
+    if path is None or not os.path.exists(path):
+        return None
+    try:
+        library = PlanLibrary(path)
+    except (OSError, ValueError, struct.error) as error:
+        log_event("plan_library", status="unreadable", path=path, error=str(error))
+        return None
+    if library.version != library_stamp(version):
+        log_event(
+            "plan_library", status="stale", path=path, version=library.version, expected=library_stamp(version)
+        )
+        library.close()
+        return None
+    log_event("plan_library", status="loaded", path=path, version=version, plans=len(library))
+    return library
+
+
+def reset_plan_library():
+    """Forget the opened library, the next lookup opens the file again."""
+    global _library, _library_opened
+    with _library_lock:
+        _library, _library_opened = None, False
+
+
+def lookup_plan(text: str, version: str):
+    """Task dict for text from the library, or None on a miss."""
+    library = get_plan_library(version)
+    if library is None:
+        return None
+    match = library.lookup(text)
+    CACHE_LOOKUPS.inc(cache="library", result="miss" if match is None else "hit")
+    return None if match is None else match[0]
+
+
+def validate_plan(text: str, tasks):
+    """Why a generated plan shouldn't go into the library, or None if it's fine."""
+    if not isinstance(tasks, dict) or not any(True for _ in iter_task_dicts(tasks)):
+        return "no steps"
+    if extract_duration(text) is None:
+        return None
+    result = enforce_budget(tasks, text)
+    if not result.ok or result.changes:
+        return "doesn't fit the time budget"
+    return None
+
+
+def request_text(entry: dict) -> str:
+    if entry.get("input"):
+        return entry["input"]
+    if entry.get("duration"):
+        return f"{entry['topic']} in {entry['duration']}"
+    return entry["topic"]
+
+
+def read_catalog(path):
+    with open(path, encoding="utf-8") as lines:
+        for line in lines:
+            if line.strip():
+                yield line
+
+
+async def build(args):
+    from anakin_core import aget_parsed_tasks, library_version
+    from batch_planner import ESTIMATED_TOKENS_PER_PLAN, RateLimiter, plan_as_completed
+    from task_parser import strip_code_fence
+
+    async def plan(line):
+        text = request_text(json.loads(line))
+        json_tasks = await aget_parsed_tasks(
+            text, f"warmup-{uuid.uuid4().hex}", use_cache=args.cached, structured=args.structured or None
+        )
+        return text, json.loads(strip_code_fence(json_tasks))
+
+    start = time.perf_counter()
+    plans, rejected = [], 0
+    async for result in plan_as_completed(
+        read_catalog(args.catalog),
+        plan,
+        max_concurrency=args.concurrency,
+        limiter=RateLimiter(args.rpm, args.tpm),
+        cost=lambda line: ESTIMATED_TOKENS_PER_PLAN + len(line) // 4,
+    ):
+        if result.error is not None:
+            rejected += 1
+            print(f"skipped {result.item.strip()!r}: {type(result.error).__name__}: {result.error}", file=sys.stderr)
+            continue
+        text, tasks = result.value
+        problem = validate_plan(text, tasks)
+        if problem:
+            rejected += 1
+            print(f"skipped {text!r}: {problem}", file=sys.stderr)
+        else:
+            plans.append((text, tasks))
+
+    version = library_version()
+    written = write_library(args.output, version, plans)
+    print(
+        f"{written} plans ({rejected} rejected) written to {args.output} "
+        f"({os.path.getsize(args.output)} bytes, version {version}) in {time.perf_counter() - start:.2f}s",
+        file=sys.stderr,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the precomputed plan library from a catalog.")
+    parser.add_argument("catalog", help="JSONL file of {\"topic\", \"duration\"} or {\"input\"} objects")
+    parser.add_argument("-o", "--output", default=DEFAULT_LIBRARY_PATH)
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--rpm", type=float, help="max requests per minute")
+    parser.add_argument("--tpm", type=float, help="max (estimated) tokens per minute")
+    parser.add_argument("--cached", action="store_true", help="reuse cached answers instead of fresh plans")
+    parser.add_argument("--structured", action="store_true", help="plan with one structured call")
+    parser.add_argument("--fake", action="store_true", help="use the local fake model")
+    parser.add_argument("--fake-latency", type=float, default=0.5, help="fake model latency (s)")
+    args = parser.parse_args()
+
+    if args.fake:
+        os.environ["ANAKIN_FAKE_LLM"] = "1"
+        os.environ["ANAKIN_FAKE_LATENCY"] = str(args.fake_latency)
+    os.environ.setdefault("ANAKIN_SESSION_BACKEND", "memory")
+    # Plans come from the model, not from the library being replaced
+    os.environ["ANAKIN_PLAN_LIBRARY"] = "off"
+    asyncio.run(build(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,512 @@
+import os
+import time
+import random
+import asyncio
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+
+from langchain_core.runnables import Runnable
+
+from metrics import log_event, record_retry, registry
+
+# --- Resilient LLM invocation ---
+# Every chain reaches its model through a ResilientRunnable, which gives
+# each call:
+# - a deadline, shared by all attempts of the call
+# - retries with jittered exponential backoff on retryable errors
+#   (timeouts, connection errors, 429 and 5xx)
+# - optionally, a hedged second request once the first has been running
+#   for longer than the p95 of recent calls
+# - a circuit breaker per model that fails fast after repeated failures
+#   and lets a single probe through once it has cooled down
+# Streams are retried only until their first chunk arrives.
+# Attempts run in the caller's thread: the deadline is checked before every
+# attempt and each attempt is bounded by the client's own timeout, which
+# get_resilient_llm sets to the deadline. Only hedged calls use threads
+# (HedgePool), so the caller can stop waiting for the slower attempt.
+
+HEDGES = registry.counter("anakin_llm_hedges_total", "Hedged second requests", ("name", "winner"))
+CIRCUIT_OPENED = registry.counter("anakin_circuit_opened_total", "Times a circuit breaker opened", ("name",))
+FAST_FAILURES = registry.counter(
+    "anakin_circuit_rejected_total", "Calls rejected by an open circuit breaker", ("name",)
+)
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+# Raised by the Google client libraries, matched by name to avoid importing them
+RETRYABLE_NAMES = {
+    "ResourceExhausted",
+    "ServiceUnavailable",
+    "DeadlineExceeded",
+    "InternalServerError",
+    "TooManyRequests",
+    "GatewayTimeout",
+    "BadGateway",
+    "Aborted",
+}
+
+
+class DeadlineExceeded(TimeoutError):
+    """The call didn't finish within its deadline."""
+
+
+class CircuitOpenError(RuntimeError):
+    """The backend failed repeatedly, calls are rejected until it cools down."""
+
+
+def is_retryable(error: BaseException) -> bool:
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    if type(error).__name__ in RETRYABLE_NAMES:
+        return True
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    return status in RETRYABLE_STATUS
+
+
+def env_float(name: str, default):
+    value = os.environ.get(name)
+    return float(value) if value else default
+
+
+@dataclass
+class ResiliencePolicy:
+    deadline: float = 60.0  # seconds per call, None for no deadline
+    max_attempts: int = 3
+    base_delay: float = 0.5
+    max_delay: float = 8.0
+    hedge: bool = False
+    hedge_quantile: float = 0.95
+    hedge_min_samples: int = 20
+    hedge_workers: int = 8  # threads for hedged attempts, shared by every caller
+    failure_threshold: int = 5  # consecutive failures that open the circuit
+    reset_timeout: float = 30.0  # seconds before an open circuit lets a probe through
+
+    @classmethod
+    def from_env(cls) -> "ResiliencePolicy":
+        """ANAKIN_LLM_DEADLINE, ANAKIN_LLM_MAX_ATTEMPTS, ANAKIN_LLM_HEDGE(_WORKERS), ANAKIN_LLM_BREAKER_*."""
+        policy = cls()
+        deadline = os.environ.get("ANAKIN_LLM_DEADLINE")
+        if deadline:
+            policy.deadline = float(deadline) or None
+        policy.max_attempts = int(env_float("ANAKIN_LLM_MAX_ATTEMPTS", policy.max_attempts))
+        policy.hedge = bool(os.environ.get("ANAKIN_LLM_HEDGE"))
+        policy.hedge_workers = int(env_float("ANAKIN_LLM_HEDGE_WORKERS", policy.hedge_workers))
+        policy.failure_threshold = int(env_float("ANAKIN_LLM_BREAKER_THRESHOLD", policy.failure_threshold))
+        policy.reset_timeout = env_float("ANAKIN_LLM_BREAKER_RESET", policy.reset_timeout)
+        return policy
+
+    def backoff(self, attempt: int) -> float:
+        """Full jitter: uniform in [0, min(max_delay, base_delay * 2^(attempt-1))]."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+
+class LatencyTracker:
+    """Latencies of the last window successful calls."""
+
+    def __init__(self, window=200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def quantile(self, fraction: float, min_samples: int = 1):
+        with self._lock:
+            if len(self._samples) < max(1, min_samples):
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class CircuitBreaker:
+    """closed -> open after failure_threshold failures in a row -> half-open probe."""
+
+    def __init__(self, name: str, failure_threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go through now."""
+        with self._lock:
+            if self.state == "closed":
+                return
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half-open"
+                self._probing = False
+            if self.state == "half-open" and not self._probing:
+                self._probing = True
+                return
+        FAST_FAILURES.inc(name=self.name)
+        raise CircuitOpenError(f"{self.name} is failing, retry in a few seconds")
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._probing = False
+
+    def release_probe(self):
+        """The call was stopped before it said anything about the backend: let another probe through."""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half-open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    CIRCUIT_OPENED.inc(name=self.name)
+                    log_event("circuit_open", name=self.name, failures=self.failures)
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self._probing = False
+
+
+class HedgePool:
+    """
+    Threads for hedged attempts. The attempt that loses, or misses the
+    deadline, is abandoned: it keeps its worker until the client gives up
+    on it (its timeout). At most workers attempts hold a thread; when all
+    are taken, submit returns None and the call goes without a hedge
+    instead of queueing behind abandoned attempts.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="anakin-hedge")
+        self._slots = threading.BoundedSemaphore(workers)
+
+    def submit(self, fn):
+        if not self._slots.acquire(blocking=False):
+            return None
+        future = self._executor.submit(contextvars.copy_context().run, fn)
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+
+class ResilientCaller:
+    def __init__(self, name: str, policy: ResiliencePolicy, breaker: CircuitBreaker):
+        self.name = name
+        self.policy = policy
+        self.breaker = breaker
+        self.latency = LatencyTracker()
+
+    def _deadline(self):
+        return None if self.policy.deadline is None else time.monotonic() + self.policy.deadline
+
+    def _hedge_delay(self):
+        if not self.policy.hedge:
+            return None
+        return self.latency.quantile(self.policy.hedge_quantile, self.policy.hedge_min_samples)
+
+    def _retry_delay(self, error, attempt, deadline):
+        """Seconds to wait before the next attempt, or None to give up."""
+        if not is_retryable(error) or attempt >= self.policy.max_attempts:
+            return None
+        delay = self.policy.backoff(attempt)
+        if deadline is not None and time.monotonic() + delay >= deadline:
+            return None
+        record_retry(self.name)
+        return delay
+
+    def _check_deadline(self, error, deadline):
+        """A retryable failure past the deadline (the client's timeout) is a DeadlineExceeded."""
+        if isinstance(error, DeadlineExceeded) or not is_retryable(error):
+            return
+        if deadline is not None and time.monotonic() >= deadline:
+            raise DeadlineExceeded(f"{self.name}: no answer within {self.policy.deadline}s") from error
+
+    def _finish(self, error=None, seconds=None):
+        if error is None:
+            self.breaker.record_success()
+            if seconds is not None:
+                self.latency.add(seconds)
+        elif is_retryable(error):
+            self.breaker.record_failure()
+        else:
+            # The backend answered, it just refused this request
+            self.breaker.record_success()
+
+    # --- sync ---
+    def call(self, fn):
+        """Call fn() under the policy and return its result."""
+        deadline = self._deadline()
+        attempt = 0
+        while True:
+            attempt += 1
+            self.breaker.before_call()
+            start = time.monotonic()
+            try:
+                result = self._attempt(fn, deadline)
+            except Exception as error:
+                self._finish(error)
+                delay = self._retry_delay(error, attempt, deadline)
+                if delay is None:
+                    self._check_deadline(error, deadline)
+                    raise
+                time.sleep(delay)
+                continue
+            except BaseException:
+                self.breaker.release_probe()
+                raise
+            self._finish(seconds=time.monotonic() - start)
+            return result
+
+    def _attempt(self, fn, deadline):
+        remaining = None if deadline is None else deadline - time.monotonic()
+        if remaining is not None and remaining <= 0:
+            raise DeadlineExceeded(f"{self.name}: deadline exceeded")
+        hedge_delay = self._hedge_delay()
+        if hedge_delay is None or (remaining is not None and hedge_delay >= remaining):
+            return fn()
+        pool = get_hedge_pool(self.policy.hedge_workers)
+        first = pool.submit(fn)
+        if first is None:
+            return fn()
+
+        futures = {first}
+        hedged = False
+        done, _ = wait(futures, timeout=hedge_delay)
+        if not done:
+            hedge = pool.submit(fn)
+            if hedge is not None:
+                futures.add(hedge)
+                hedged = True
+
+        error = None
+        while futures:
+            timeout = None if deadline is None else max(0, deadline - time.monotonic())
+            done, futures = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                raise DeadlineExceeded(f"{self.name}: no answer within {self.policy.deadline}s")
+            for future in done:
+                if future.exception() is None:
+                    if hedged:
+                        HEDGES.inc(name=self.name, winner="first" if future is first else "hedge")
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def stream(self, make_stream):
+        """Iterate make_stream(), retrying until the first chunk arrives."""
+        deadline = self._deadline()
+        attempt = 0
+        while True:
+            attempt += 1
+            self.breaker.before_call()
+            start = time.monotonic()
+            try:
+                iterator = iter(make_stream())
+                first = self._first_chunk(iterator, deadline)
+            except StopIteration:
+                self._finish(seconds=time.monotonic() - start)
+                return
+            except Exception as error:
+                self._finish(error)
+                delay = self._retry_delay(error, attempt, deadline)
+                if delay is None:
+                    self._check_deadline(error, deadline)
+                    raise
+                time.sleep(delay)
+                continue
+            except BaseException:
+                self.breaker.release_probe()
+                raise
+            break
+        try:
+            yield first
+            yield from iterator
+        except Exception as error:
+            self._finish(error)
+            raise
+        except BaseException:
+            # Closed early (GeneratorExit): a half-open breaker must not wait on it forever
+            self.breaker.release_probe()
+            raise
+        self._finish(seconds=time.monotonic() - start)
+
+    def _first_chunk(self, iterator, deadline):
+        if deadline is not None and deadline <= time.monotonic():
+            raise DeadlineExceeded(f"{self.name}: deadline exceeded")
+        return next(iterator)
+
+    # --- async ---
+    async def acall(self, make_coroutine):
+        """Await make_coroutine() under the policy and return its result."""
+        deadline = self._deadline()
+        attempt = 0
+        while True:
+            attempt += 1
+            self.breaker.before_call()
+            start = time.monotonic()
+            try:
+                result = await self._aattempt(make_coroutine, deadline)
+            except Exception as error:
+                self._finish(error)
+                delay = self._retry_delay(error, attempt, deadline)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                # Cancelled (asyncio.CancelledError)
+                self.breaker.release_probe()
+                raise
+            self._finish(seconds=time.monotonic() - start)
+            return result
+
+    async def _aattempt(self, make_coroutine, deadline):
+        remaining = None if deadline is None else deadline - time.monotonic()
+        if remaining is not None and remaining <= 0:
+            raise DeadlineExceeded(f"{self.name}: deadline exceeded")
+        hedge_delay = self._hedge_delay()
+        if hedge_delay is None or (remaining is not None and hedge_delay >= remaining):
+            try:
+                return await asyncio.wait_for(make_coroutine(), remaining)
+            except asyncio.TimeoutError:
+                raise DeadlineExceeded(f"{self.name}: no answer within {self.policy.deadline}s") from None
+
+        first = asyncio.ensure_future(make_coroutine())
+        tasks = {first}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+            hedged = not done
+            if hedged:
+                tasks.add(asyncio.ensure_future(make_coroutine()))
+            error = None
+            while tasks:
+                timeout = None if deadline is None else max(0, deadline - time.monotonic())
+                done, tasks = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    raise DeadlineExceeded(f"{self.name}: no answer within {self.policy.deadline}s")
+                for task in done:
+                    if task.exception() is None:
+                        if hedged:
+                            HEDGES.inc(name=self.name, winner="first" if task is first else "hedge")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def astream(self, make_stream):
+        deadline = self._deadline()
+        attempt = 0
+        while True:
+            attempt += 1
+            self.breaker.before_call()
+            start = time.monotonic()
+            try:
+                iterator = make_stream().__aiter__()
+                remaining = None if deadline is None else max(0, deadline - time.monotonic())
+                first = await asyncio.wait_for(iterator.__anext__(), remaining)
+            except StopAsyncIteration:
+                self._finish(seconds=time.monotonic() - start)
+                return
+            except asyncio.TimeoutError:
+                error = DeadlineExceeded(f"{self.name}: no first chunk within {self.policy.deadline}s")
+                self._finish(error)
+                delay = self._retry_delay(error, attempt, deadline)
+                if delay is None:
+                    raise error from None
+                await asyncio.sleep(delay)
+                continue
+            except Exception as error:
+                self._finish(error)
+                delay = self._retry_delay(error, attempt, deadline)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                self.breaker.release_probe()
+                raise
+            break
+        try:
+            yield first
+            async for chunk in iterator:
+                yield chunk
+        except Exception as error:
+            self._finish(error)
+            raise
+        except BaseException:
+            # Closed early or cancelled
+            self.breaker.release_probe()
+            raise
+        self._finish(seconds=time.monotonic() - start)
+
+
+class ResilientRunnable(Runnable):
+    """Wraps a runnable (a chat model) so every call goes through a ResilientCaller."""
+
+    def __init__(self, runnable, caller: ResilientCaller):
+        self.runnable = runnable
+        self.caller = caller
+
+    @property
+    def InputType(self):
+        return self.runnable.InputType
+
+    @property
+    def OutputType(self):
+        return self.runnable.OutputType
+
+    def invoke(self, input, config=None, **kwargs):
+        return self.caller.call(lambda: self.runnable.invoke(input, config, **kwargs))
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        return await self.caller.acall(lambda: self.runnable.ainvoke(input, config, **kwargs))
+
+    def stream(self, input, config=None, **kwargs):
+        yield from self.caller.stream(lambda: self.runnable.stream(input, config, **kwargs))
+
+    async def astream(self, input, config=None, **kwargs):
+        async for chunk in self.caller.astream(lambda: self.runnable.astream(input, config, **kwargs)):
+            yield chunk
+
+
+# --- One breaker per backend, one caller per wrapped runnable ---
+_breakers = {}
+_hedge_pool = None
+_lock = threading.Lock()
+
+
+def get_hedge_pool(workers: int) -> HedgePool:
+    """The HedgePool, sized by the first hedging policy that needs it."""
+    global _hedge_pool
+    with _lock:
+        if _hedge_pool is None:
+            _hedge_pool = HedgePool(workers)
+        return _hedge_pool
+
+
+def get_breaker(backend: str, policy: ResiliencePolicy) -> CircuitBreaker:
+    with _lock:
+        if backend not in _breakers:
+            _breakers[backend] = CircuitBreaker(backend, policy.failure_threshold, policy.reset_timeout)
+        return _breakers[backend]
+
+
+def reset_breakers():
+    with _lock:
+        _breakers.clear()
+
+
+def resilient(runnable, backend: str, name: str = None, policy: ResiliencePolicy = None) -> ResilientRunnable:
+    """
+    Wrap runnable with the policy (default: ResiliencePolicy.from_env()).
+    Wrappers for the same backend share its circuit breaker.
+    """
+    policy = policy or ResiliencePolicy.from_env()
+    caller = ResilientCaller(name or backend, policy, get_breaker(backend, policy))
+    return ResilientRunnable(runnable, caller)
@@ -0,0 +1,200 @@
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import Counter, OrderedDict
+
+from metrics import CACHE_LOOKUPS
+
+# --- Response cache shared by anakin.py, anakin_app.py and app.py ---
+# Two tiers: a small in-process LRU in front of a SQLite file, so cached
+# plans survive Streamlit restarts and are visible to every entry point.
+# Keys cover everything that changes the model's answer: the normalized
+# input, the prompt template version, the model name and the chat history.
+
+DEFAULT_CACHE_PATH = os.environ.get(
+    "ANAKIN_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".anakin_cache.sqlite"),
+)
+DEFAULT_TTL = 7 * 24 * 60 * 60  # one week
+
+
+def normalize_input(text: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation."""
+    text = re.sub(r"\s+", " ", text.strip().lower())
+    return text.rstrip(" .!?")
+
+
+def template_version(template: str) -> str:
+    """Short digest of a prompt template, changes whenever the prompt does."""
+    return hashlib.sha256(template.encode("utf-8")).hexdigest()[:12]
+
+
+def history_digest(messages) -> str:
+    """Digest of the chat history (message objects or plain strings)."""
+    digest = hashlib.sha256()
+    for message in messages:
+        role = getattr(message, "type", "text")
+        content = getattr(message, "content", message)
+        digest.update(f"{role}\x00{content}\x01".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def make_key(kind: str, text: str, template: str, model: str, history=(), normalize=True) -> str:
+    """
+    Build a cache key.
+    kind separates the cached stages ("breakdown", "parse", ...); pass
+    normalize=False when the text's casing matters to the answer.
+    """
+    parts = [
+        kind,
+        normalize_input(text) if normalize else text,
+        template_version(template),
+        model,
+        history_digest(history),
+    ]
+    return hashlib.sha256("\x00".join(parts).encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    LRU memory tier backed by a SQLite tier with TTL and size-based eviction.
+    Safe to share between threads; SQLite's own locking (WAL mode) makes
+    the disk tier safe to share between processes.
+    """
+
+    def __init__(
+        self,
+        path=DEFAULT_CACHE_PATH,
+        max_memory_entries=256,
+        max_disk_entries=10_000,
+        ttl=DEFAULT_TTL,
+    ):
+        self.path = path
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl = ttl
+        self.stats = Counter()
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " created REAL NOT NULL,"
+                " accessed REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)"
+            )
+            self._db.commit()
+
+    def _expired(self, created: float, now: float) -> bool:
+        return self.ttl is not None and now - created > self.ttl
+
+    def get(self, key: str):
+        """Return the cached value for key, or None."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created = entry
+                if not self._expired(created, now):
+                    self._memory.move_to_end(key)
+                    self.stats["memory_hits"] += 1
+                    CACHE_LOOKUPS.inc(cache="response", result="memory")
+                    return value
+                del self._memory[key]
+                self.stats["memory_evictions"] += 1
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, created FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    value, created = row
+                    if not self._expired(created, now):
+                        self._db.execute(
+                            "UPDATE responses SET accessed = ? WHERE key = ?", (now, key)
+                        )
+                        self._db.commit()
+                        self._remember(key, value, created)
+                        self.stats["disk_hits"] += 1
+                        CACHE_LOOKUPS.inc(cache="response", result="disk")
+                        return value
+                    self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._db.commit()
+                    self.stats["disk_evictions"] += 1
+
+            self.stats["misses"] += 1
+            CACHE_LOOKUPS.inc(cache="response", result="miss")
+            return None
+
+    def set(self, key: str, value: str):
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+            if self._db is None:
+                return
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created, accessed)"
+                " VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            (count,) = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()
+            if count > self.max_disk_entries:
+                # Drop expired rows first, then the least recently used ones
+                cursor = self._db.execute(
+                    "DELETE FROM responses WHERE created < ?",
+                    (now - self.ttl if self.ttl is not None else 0,),
+                )
+                removed = cursor.rowcount
+                overflow = count - removed - self.max_disk_entries
+                if overflow > 0:
+                    cursor = self._db.execute(
+                        "DELETE FROM responses WHERE key IN ("
+                        " SELECT key FROM responses ORDER BY accessed LIMIT ?)",
+                        (overflow,),
+                    )
+                    removed += cursor.rowcount
+                self.stats["disk_evictions"] += removed
+            self._db.commit()
+
+    def _remember(self, key, value, created):
+        # caller holds the lock
+        self._memory[key] = (value, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+            self.stats["memory_evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+
+    def hit_rate(self) -> float:
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        total = hits + self.stats["misses"]
+        return hits / total if total else 0.0
+
+
+_shared_cache = None
+_shared_lock = threading.Lock()
+
+
+def get_cache() -> ResponseCache:
+    """Process-wide cache instance, opened on first use."""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = ResponseCache()
+        return _shared_cache
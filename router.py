@@ -0,0 +1,305 @@
+import os
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+
+from metrics import ESCALATIONS, ROUTES, log_event
+from scheduler import MAX_BUDGET_MINUTES, distribute, step_count_range
+from task_parser import (
+    BreakdownParseError,
+    extract_duration,
+    normalize_number_words,
+    parse_breakdown,
+    render_tasks_markdown,
+)
+
+# --- Model cascade ---
+# "Read one chapter in 30 minutes" doesn't need the model that plans
+# "learn full stack in 3 months". Every request is scored locally (time
+# budget, topic breadth, conversation depth, length) and starts at the
+# cheapest tier that should handle it:
+# - "local": a template plan for a short, single-activity request, no model
+#   call (only with ANAKIN_ROUTER_LOCAL=1)
+# - "fast": a cheaper, faster model (ANAKIN_FAST_MODEL)
+# - "strong": the default model (ANAKIN_MODEL)
+# An answer that fails structural validation (breakdown_problem,
+# plan_problem) goes to the next tier; valid answers are never escalated.
+# Decisions are logged as "route" and "escalation" events and counted in
+# ROUTES / ESCALATIONS. ANAKIN_ROUTER=0 sends everything to the strong tier.
+# Which model backs a tier is up to the caller (anakin_core.tier_model).
+
+TIERS = ("local", "fast", "strong")
+# Requests scoring up to this go to the fast tier
+FAST_MAX_SCORE = int(os.environ.get("ANAKIN_ROUTER_FAST_MAX", 2))
+
+BROAD_RE = re.compile(
+    r"\b(full[\s-]?stack|everything|from scratch|master(?:y|ing)?|career|curriculum|"
+    r"roadmap|bootcamp|end[\s-]to[\s-]end|all of|syllabus)\b"
+)
+TOPIC_SEPARATOR_RE = re.compile(r"\s*(?:,|;|&|\+|/|\band\b|\bthen\b|\bplus\b)\s*")
+DURATION_WORDS_RE = re.compile(r"\b(?:in|within|for|over)?\s*(?:the\s+)?(?:next\s+)?\d.*$")
+
+
+@dataclass
+class LocalTemplate:
+    pattern: re.Pattern
+    steps: list  # (emoji title, weight)
+
+
+# Short requests with one obvious shape, planned without a model
+LOCAL_TEMPLATES = [
+    LocalTemplate(
+        re.compile(r"\b(read|chapter|article|paper|pages?)\b"),
+        [
+            ("📖 Skim the headings and summary", 1),
+            ("📚 Read through the material", 6),
+            ("✍️ Note the key points", 2),
+            ("🔁 Review your notes", 1),
+        ],
+    ),
+    LocalTemplate(
+        re.compile(r"\b(write|essay|report|draft|blog post|email)\b"),
+        [
+            ("🎯 Outline the main points", 2),
+            ("✍️ Write the first draft", 5),
+            ("🔍 Revise and edit", 2),
+            ("✅ Proofread and finish", 1),
+        ],
+    ),
+    LocalTemplate(
+        re.compile(r"\b(solve|exercises?|problems?|homework|worksheet|practice)\b"),
+        [
+            ("🎯 Review the concepts you need", 2),
+            ("🧩 Work through the problems", 5),
+            ("🔍 Check your answers", 2),
+            ("🔁 Redo the ones you missed", 1),
+        ],
+    ),
+    LocalTemplate(
+        re.compile(r"\b(revise|review|flashcards?|go over)\b"),
+        [
+            ("📋 List the topics to cover", 1),
+            ("🔁 Go through your notes", 4),
+            ("🧠 Quiz yourself", 3),
+            ("📝 Revisit the weak spots", 2),
+        ],
+    ),
+    LocalTemplate(
+        re.compile(r"\b(clean|tidy|organi[sz]e|declutter)\b"),
+        [
+            ("🗑️ Clear away the rubbish", 2),
+            ("📦 Put things back where they belong", 4),
+            ("🧽 Wipe down the surfaces", 2),
+            ("✅ Set up for next time", 1),
+        ],
+    ),
+]
+# Longest budget, in minutes, the local templates are used for
+LOCAL_MAX_MINUTES = 120
+
+# Per-process counts behind escalation_rate(), like task_parser.parse_stats
+route_stats = Counter()
+
+
+def routing_enabled() -> bool:
+    return os.environ.get("ANAKIN_ROUTER", "1").lower() not in ("0", "false", "off", "no")
+
+
+def local_planner_enabled() -> bool:
+    return bool(os.environ.get("ANAKIN_ROUTER_LOCAL"))
+
+
+@dataclass
+class Route:
+    tier: str  # the tier the request starts at, one of TIERS
+    score: int
+    factors: dict = field(default_factory=dict)  # points per factor
+
+
+def topics(user_input: str) -> list:
+    """The separate things a request asks for, duration left out."""
+    text = DURATION_WORDS_RE.sub("", normalize_number_words(user_input.lower())).strip()
+    return [part for part in TOPIC_SEPARATOR_RE.split(text) if part.strip()]
+
+
+def score_request(user_input: str, history_length: int = 0) -> dict:
+    """
+    Complexity points per factor: the time budget (missing or long budgets
+    need more planning), topic breadth, how deep into a conversation the
+    request is (follow-ups depend on context) and its length.
+    """
+    text = user_input.lower()
+    duration = extract_duration(text)
+    if duration is None:
+        duration_points = 1
+    elif duration[1] <= 60:
+        duration_points = 0
+    elif duration[1] <= 4 * 60:
+        duration_points = 1
+    elif duration[1] <= MAX_BUDGET_MINUTES:
+        duration_points = 2
+    else:
+        duration_points = 3  # days to months: a curriculum, not a session
+    breadth_points = min(2, len(topics(user_input)) - 1) + (2 if BROAD_RE.search(text) else 0)
+    history_points = 0 if history_length == 0 else 1 if history_length <= 4 else 2
+    return {
+        "duration": duration_points,
+        "breadth": max(0, breadth_points),
+        "history": history_points,
+        "length": 1 if len(text.split()) > 30 else 0,
+    }
+
+
+def local_template(user_input: str):
+    """The LocalTemplate for user_input, if it's simple enough for one."""
+    duration = extract_duration(user_input)
+    if duration is None or duration[1] > LOCAL_MAX_MINUTES:
+        return None
+    text = user_input.lower()
+    for template in LOCAL_TEMPLATES:
+        if template.pattern.search(text):
+            return template
+    return None
+
+
+def record_route(route: Route, stage: str) -> Route:
+    ROUTES.inc(stage=stage, tier=route.tier)
+    route_stats[route.tier] += 1
+    log_event("route", stage=stage, tier=route.tier, score=route.score, **route.factors)
+    return route
+
+
+def route_request(user_input: str, history_length: int = 0, stage: str = "breakdown") -> Route:
+    """Pick the tier user_input starts at, and log the decision."""
+    factors = score_request(user_input, history_length)
+    score = sum(factors.values())
+    if not routing_enabled():
+        tier = "strong"
+    elif score == 0 and local_planner_enabled() and local_template(user_input) is not None:
+        tier = "local"
+    elif score <= FAST_MAX_SCORE:
+        tier = "fast"
+    else:
+        tier = "strong"
+    return record_route(Route(tier, score, factors), stage)
+
+
+def helper_route(stage: str) -> Route:
+    """Route for small side calls (parser fallback, step splits): the fast tier, unscored."""
+    return record_route(Route("fast" if routing_enabled() else "strong", 0), stage)
+
+
+def local_steps(user_input: str) -> list:
+    """(emoji title, minutes) of the local template plan for user_input."""
+    template = local_template(user_input)
+    total = extract_duration(user_input)[1]
+    steps = list(template.steps)
+    high = step_count_range(total)[1]
+    while len(steps) > high:
+        # Drop the least important step until the count fits the budget
+        steps.remove(min(steps, key=lambda step: step[1]))
+    minutes = distribute([weight for _, weight in steps], total)
+    return [(title, step_minutes) for (title, _), step_minutes in zip(steps, minutes)]
+
+
+def task_name(user_input: str) -> str:
+    return user_input.strip().rstrip(".!")[:60]
+
+
+def local_breakdown(user_input: str) -> str:
+    """The local template plan in the breakdown format."""
+    tasks = {}
+    for number, (title, minutes) in enumerate(local_steps(user_input), 1):
+        tasks[f"Task {number}"] = title
+        tasks[f"Time required T{number}"] = f"{minutes} minutes"
+    return render_tasks_markdown(tasks, task_name(user_input))
+
+
+def local_plan(user_input: str):
+    """The local template plan as a TaskPlan."""
+    # task_plan imports pydantic, which anakin_core must not load at import time
+    from task_plan import PlanPhase, PlanStep, TaskPlan
+
+    steps = []
+    for title, minutes in local_steps(user_input):
+        emoji, title = title.split(" ", 1)
+        steps.append(PlanStep(emoji=emoji, title=title, minutes=minutes))
+    return TaskPlan(header=task_name(user_input), phases=[PlanPhase(steps=steps)])
+
+
+def breakdown_problem(text: str, user_input: str):
+    """Why a breakdown answer is structurally unusable, or None if it's fine."""
+    budget = extract_duration(user_input)
+    try:
+        tasks = parse_breakdown(text)
+    except BreakdownParseError as error:
+        if "No steps found" in str(error) and budget is None and text.strip():
+            return None  # asking for a time budget, as the prompt says to
+        return "unparseable"
+    if budget is not None and not any(key.startswith("Time required") for key in tasks):
+        return "missing_times"
+    return None
+
+
+def plan_problem(plan, user_input: str):
+    """breakdown_problem for a TaskPlan (None if the model made no tool call)."""
+    if plan is None:
+        return "empty"
+    if not plan.steps:
+        return None if plan.message else "empty"
+    if extract_duration(user_input) is not None and plan.total_minutes is None:
+        return "missing_times"
+    return None
+
+
+def escalate(route: Route, tier: str, reason: str, stage: str):
+    """Record that tier's answer failed validation; returns the next tier."""
+    next_tier = TIERS[TIERS.index(tier) + 1]
+    ESCALATIONS.inc(stage=stage, from_tier=tier, reason=reason)
+    route_stats["escalated"] += 1
+    log_event("escalation", stage=stage, from_tier=tier, to_tier=next_tier, reason=reason, score=route.score)
+    return next_tier
+
+
+def run_cascade(route: Route, call, check, stage: str = "breakdown"):
+    """
+    call(tier) from route.tier upwards until check(answer) finds no problem
+    (check returns None) or the strong tier has answered. Output that
+    doesn't validate against its schema (a ValueError) counts as a problem.
+    """
+    tier = route.tier
+    while True:
+        try:
+            answer = call(tier)
+        except ValueError:
+            if tier == "strong":
+                raise
+            tier = escalate(route, tier, "invalid_output", stage)
+            continue
+        problem = check(answer)
+        if problem is None or tier == "strong":
+            return answer
+        tier = escalate(route, tier, problem, stage)
+
+
+async def arun_cascade(route: Route, call, check, stage: str = "breakdown"):
+    """Async version of run_cascade; call is a coroutine function."""
+    tier = route.tier
+    while True:
+        try:
+            answer = await call(tier)
+        except ValueError:
+            if tier == "strong":
+                raise
+            tier = escalate(route, tier, "invalid_output", stage)
+            continue
+        problem = check(answer)
+        if problem is None or tier == "strong":
+            return answer
+        tier = escalate(route, tier, problem, stage)
+
+
+def escalation_rate() -> float:
+    """Escalations per request routed to a model tier."""
+    routed = route_stats["fast"] + route_stats["strong"]
+    return route_stats["escalated"] / routed if routed else 0.0
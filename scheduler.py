@@ -0,0 +1,203 @@
+import math
+from dataclasses import dataclass, field
+
+from task_parser import extract_duration, format_minutes, iter_task_dicts, parse_duration
+
+# --- Local time-budget scheduler ---
+# The breakdown prompt asks for step times that add up to the user's
+# budget and for a step count that fits it. Models often miss both, so the
+# parsed plan is fixed here instead of being regenerated:
+# - the budget is read from the request ("in next 4 hours", "90 min", "2h30")
+# - too many steps: the shortest neighbouring pair is merged
+# - too few steps: the longest steps are split into equal parts
+# - step times are rescaled (largest remainders, in 5 minute units where
+#   possible) so they add up exactly to the budget
+# Only when that's impossible (no steps, or a budget too short for the
+# minimum step count) does the caller go back to the model.
+
+MIN_STEP_MINUTES = 5
+# Budgets longer than this are calendar time ("in 2 weeks"), not a work
+# session, and are left as the model planned them
+MAX_BUDGET_MINUTES = 16 * 60
+
+# (up to minutes, min steps, max steps), from the rules in the prompt
+STEP_COUNT_RULES = [
+    (15, 1, 3),
+    (30, 2, 4),
+    (120, 3, 5),
+    (240, 4, 8),
+    (300, 5, 12),
+]
+
+
+def step_count_range(minutes: int):
+    """Allowed (min, max) number of steps for a budget in minutes."""
+    for limit, low, high in STEP_COUNT_RULES:
+        if minutes <= limit:
+            return low, high
+    # Keep growing in the same manner: one more step per extra hour
+    extra_hours = math.ceil((minutes - STEP_COUNT_RULES[-1][0]) / 60)
+    return STEP_COUNT_RULES[-1][1] + extra_hours // 2, STEP_COUNT_RULES[-1][2] + extra_hours
+
+
+def budget_target(budget, planned):
+    """The total to aim for: the plan's own total if it's inside the budget range."""
+    low, high = budget
+    if planned is None:
+        return high
+    return min(max(planned, low), high)
+
+
+@dataclass
+class ScheduleResult:
+    tasks: dict
+    budget: tuple = None  # (low, high) minutes, None if the request has none
+    total: int = None  # minutes after scheduling
+    changes: list = field(default_factory=list)
+    ok: bool = True  # False: the structure can't be fixed locally
+
+    @property
+    def summary(self) -> str:
+        return "; ".join(self.changes)
+
+
+def read_steps(tasks: dict) -> list:
+    steps = []
+    for number, task in iter_task_dicts(tasks):
+        duration = parse_duration(task.get(f"Time required T{number}", ""))
+        steps.append({
+            "title": task[f"Task {number}"],
+            "minutes": None if duration is None else (duration[0] + duration[1]) / 2,
+            "phase": task.get(f"Phase T{number}"),
+            "parts": 1,  # original steps merged into this one
+        })
+    return steps
+
+
+def write_steps(steps: list) -> dict:
+    tasks = {}
+    for number, step in enumerate(steps, 1):
+        tasks[f"Task {number}"] = step["title"]
+        if step["minutes"] is not None:
+            tasks[f"Time required T{number}"] = format_minutes(step["minutes"], step["minutes"])
+        if step["phase"]:
+            tasks[f"Phase T{number}"] = step["phase"]
+    return tasks
+
+
+def merge_shortest_pair(steps: list) -> str:
+    """Merge the neighbours with the smallest combined time, same phase preferred."""
+    def size(step):
+        return step["parts"] if step["minutes"] is None else step["minutes"]
+
+    def cost(i):
+        a, b = steps[i], steps[i + 1]
+        return (a["phase"] != b["phase"], size(a) + size(b))
+
+    i = min(range(len(steps) - 1), key=cost)
+    a, b = steps[i], steps.pop(i + 1)
+    a["title"] = f"{a['title']} + {b['title']}"
+    a["parts"] += b["parts"]
+    if a["minutes"] is not None or b["minutes"] is not None:
+        a["minutes"] = (a["minutes"] or 0) + (b["minutes"] or 0)
+    return f"merged steps {i + 1} and {i + 2}"
+
+
+def split_longest(steps: list, count: int, scale: float = 1.0):
+    """
+    Split the longest steps into equal parts until there are count steps.
+    scale converts step minutes to the minutes they will get once the plan
+    is rescaled. Returns the changes, or None if no step is long enough.
+    """
+    pieces = [1] * len(steps)
+
+    def piece_minutes(i):
+        minutes = steps[i]["minutes"]
+        return 1 / pieces[i] if minutes is None else minutes / pieces[i]
+
+    while sum(pieces) < count:
+        i = max(range(len(steps)), key=piece_minutes)
+        minutes = steps[i]["minutes"]
+        if minutes is not None and minutes * scale / (pieces[i] + 1) < MIN_STEP_MINUTES:
+            return None
+        pieces[i] += 1
+
+    split = []
+    changes = []
+    for number, (step, n) in enumerate(zip(steps, pieces), 1):
+        if n == 1:
+            split.append(step)
+            continue
+        changes.append(f"split step {number} into {n}")
+        minutes = None if step["minutes"] is None else step["minutes"] / n
+        for part in range(1, n + 1):
+            split.append({**step, "title": f"{step['title']} (part {part} of {n})", "minutes": minutes})
+    steps[:] = split
+    return changes
+
+
+def distribute(weights: list, total: int) -> list:
+    """
+    Whole minutes proportional to weights that add up to total, in units
+    of MIN_STEP_MINUTES when total allows it. Largest remainders. Weights
+    that are all zero count as equal.
+    """
+    unit = MIN_STEP_MINUTES if total % MIN_STEP_MINUTES == 0 and total >= MIN_STEP_MINUTES * len(weights) else 1
+    units = total // unit
+    weight_sum = sum(weights)
+    if weight_sum <= 0:
+        weights, weight_sum = [1] * len(weights), len(weights)
+    exact = [weight / weight_sum * units for weight in weights]
+    # Every step gets at least one unit
+    rounded = [max(1, math.floor(value)) for value in exact]
+    while sum(rounded) > units:
+        i = max(range(len(rounded)), key=lambda i: (rounded[i] - exact[i], rounded[i]))
+        rounded[i] -= 1
+    by_remainder = sorted(range(len(exact)), key=lambda i: exact[i] - rounded[i], reverse=True)
+    for i in by_remainder[: units - sum(rounded)]:
+        rounded[i] += 1
+    return [value * unit for value in rounded]
+
+
+def enforce_budget(tasks: dict, user_input: str) -> ScheduleResult:
+    """
+    Make the plan follow the time budget in user_input: step count within
+    step_count_range and step times adding up to the budget.
+    """
+    budget = extract_duration(user_input)
+    steps = read_steps(tasks)
+    if not steps:
+        return ScheduleResult(dict(tasks), budget, ok=False, changes=["no steps"])
+    if budget is None or budget[1] > MAX_BUDGET_MINUTES:
+        return ScheduleResult(dict(tasks), budget)
+
+    planned = None
+    if all(step["minutes"] is not None for step in steps):
+        planned = sum(step["minutes"] for step in steps)
+    target = round(budget_target(budget, planned))
+    min_steps, max_steps = step_count_range(target)
+    # Every step needs MIN_STEP_MINUTES, or a minute for very short budgets
+    max_steps = min(max_steps, max(1, target // MIN_STEP_MINUTES))
+    if target < 1 or min_steps > max_steps:
+        return ScheduleResult(dict(tasks), budget, ok=False, changes=["budget too short for the plan"])
+
+    changes = []
+    while len(steps) > max_steps:
+        changes.append(merge_shortest_pair(steps))
+    if len(steps) < min_steps:
+        split = split_longest(steps, min_steps, target / planned if planned else 1.0)
+        if split is None:
+            return ScheduleResult(dict(tasks), budget, ok=False, changes=["too few steps to split"])
+        changes.extend(split)
+
+    weights = [step["minutes"] for step in steps]
+    if None in weights:
+        # Steps without estimates share the budget equally
+        weights = [1] * len(steps)
+        changes.append("added step times")
+    minutes = distribute(weights, target)
+    if planned is not None and [step["minutes"] for step in steps] != minutes:
+        changes.append(f"rescaled {round(planned)} to {target} minutes")
+    for step, value in zip(steps, minutes):
+        step["minutes"] = value
+    return ScheduleResult(write_steps(steps), budget, total=target, changes=changes)
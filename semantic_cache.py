@@ -0,0 +1,267 @@
+import re
+import math
+import threading
+from collections import Counter, OrderedDict, defaultdict
+
+from metrics import CACHE_LOOKUPS
+from task_parser import (
+    find_duration,
+    format_minutes,
+    iter_task_dicts,
+    normalize_number_words,
+    parse_duration,
+)
+
+# --- Semantic near-duplicate cache for task plans ---
+# Users ask for the same plan in many ways ("learn OOP in python in four
+# hours" vs "I have 4h to study oops"). Requests are reduced to a
+# (topic, duration) pair; topics are matched through a local IDF-weighted
+# token index, so lookups run fully offline. Numbers other than the
+# duration stay in the topic and must match exactly. A neighbour above the
+# similarity threshold with a compatible duration is served from the
+# cache, with its step times rescaled to the requested budget.
+
+# Words that lead into the duration ("within the next 4 hours")
+DURATION_LEAD_RE = re.compile(r"(?:\b(?:in|within|for|over|during)\s+)?(?:the\s+)?(?:next\s+)?~?$")
+TOKEN_RE = re.compile(r"[a-z0-9+#]+")
+
+# Filler words that say nothing about the topic
+STOPWORDS = {
+    "a", "about", "an", "and", "are", "at", "be", "break", "by", "can", "do",
+    "down", "for", "from", "get", "give", "got", "have", "help", "how", "i",
+    "in", "into", "is", "it", "its", "learn", "learning", "like", "me", "my",
+    "need", "next", "of", "on", "or", "please", "plan", "prepare", "should",
+    "some", "study", "studying", "the", "this", "time", "to", "today", "up",
+    "want", "with", "would", "you",
+}
+SYNONYMS = {
+    "oops": "oop", "oo": "oop", "object": "oop", "oriented": "oop",
+    "maths": "math", "mathematics": "math", "py": "python",
+    "js": "javascript", "ml": "machine-learning", "dsa": "algorithm",
+    "algorithms": "algorithm", "exams": "exam", "test": "exam",
+}
+
+
+def normalize_token(token: str) -> str:
+    token = SYNONYMS.get(token, token)
+    if len(token) > 4 and token.endswith("s") and not token.endswith("ss"):
+        token = token[:-1]
+    return SYNONYMS.get(token, token)
+
+
+def extract_slots(text: str):
+    """
+    Reduce a request to (topic tokens, duration).
+    The duration is (low, high) minutes or None when no budget is given.
+    """
+    lowered = normalize_number_words(text)
+    found = find_duration(lowered)
+    duration = None
+    topic = lowered
+    if found is not None:
+        # Only the budget goes; other numbers ("chapter 7") are part of the topic
+        duration, start, end = found
+        topic = DURATION_LEAD_RE.sub("", lowered[:start]) + " " + lowered[end:]
+    tokens = []
+    for token in TOKEN_RE.findall(topic):
+        if token in STOPWORDS:
+            continue
+        token = normalize_token(token)
+        if token not in tokens:
+            tokens.append(token)
+    return tuple(tokens), duration
+
+
+def durations_compatible(cached, wanted, max_ratio: float) -> bool:
+    if cached is None or wanted is None:
+        return cached == wanted
+    cached_mid = sum(cached) / 2
+    wanted_mid = sum(wanted) / 2
+    if not cached_mid or not wanted_mid:
+        return cached_mid == wanted_mid
+    ratio = wanted_mid / cached_mid
+    return 1 / max_ratio <= ratio <= max_ratio
+
+
+def rescale_tasks(tasks: dict, target_minutes: int) -> dict:
+    """
+    Scale every "Time required TN" so the plan adds up to target_minutes.
+    Rounding is done with largest remainders so the total is exact.
+    """
+    steps = []
+    for number, task in iter_task_dicts(tasks):
+        duration = parse_duration(task.get(f"Time required T{number}", ""))
+        if duration is None:
+            return dict(tasks)
+        steps.append((number, duration))
+    total = sum((low + high) / 2 for _, (low, high) in steps)
+    if not steps or not total:
+        return dict(tasks)
+
+    factor = target_minutes / total
+    exact = [(low + high) / 2 * factor for _, (low, high) in steps]
+    rounded = [math.floor(value) for value in exact]
+    by_remainder = sorted(range(len(steps)), key=lambda i: exact[i] - rounded[i], reverse=True)
+    for i in by_remainder[: target_minutes - sum(rounded)]:
+        rounded[i] += 1
+
+    scaled = dict(tasks)
+    for (number, (low, high)), minutes in zip(steps, rounded):
+        if low == high:
+            scaled[f"Time required T{number}"] = format_minutes(minutes, minutes)
+        else:
+            # keep the spread of a range around its rescaled midpoint
+            half = round((high - low) * factor / 2)
+            scaled[f"Time required T{number}"] = format_minutes(
+                max(minutes - half, 1), minutes + half
+            )
+    return scaled
+
+
+class SemanticCache:
+    """
+    Bounded (topic, duration) index over cached task plans.
+    Each plan is indexed by its topic tokens; a lookup scores candidates
+    by IDF-weighted token overlap (weighted Jaccard, 0..1) and returns the
+    best one above threshold whose duration is within max_ratio.
+    The least recently used plans are evicted once max_entries is reached.
+    """
+
+    def __init__(self, threshold=0.5, max_ratio=1.5, max_entries=10_000, max_candidates=32):
+        self.threshold = threshold
+        self.max_ratio = max_ratio
+        self.max_entries = max_entries
+        self.max_candidates = max_candidates
+        self.stats = Counter()
+        self._entries = OrderedDict()  # id -> (tokens, duration, tasks)
+        self._postings = defaultdict(set)  # token -> ids
+        self._ids_by_slots = {}  # (tokens, duration) -> id
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _idf(self, token: str) -> float:
+        return math.log(1 + len(self._entries) / (1 + len(self._postings.get(token, ()))))
+
+    def add(self, text: str, tasks: dict):
+        tokens, duration = extract_slots(text)
+        if not tokens:
+            return
+        with self._lock:
+            old_id = self._ids_by_slots.get((tokens, duration))
+            if old_id is not None:
+                self._remove(old_id)
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (tokens, duration, dict(tasks))
+            self._ids_by_slots[(tokens, duration)] = entry_id
+            for token in tokens:
+                self._postings[token].add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.stats["evictions"] += 1
+
+    def _remove(self, entry_id):
+        # caller holds the lock
+        tokens, duration, _ = self._entries.pop(entry_id)
+        del self._ids_by_slots[(tokens, duration)]
+        for token in tokens:
+            postings = self._postings[token]
+            postings.discard(entry_id)
+            if not postings:
+                del self._postings[token]
+
+    def lookup(self, text: str):
+        """
+        Return (tasks, similarity) for the best compatible neighbour,
+        rescaled to the requested duration, or None on a miss.
+        """
+        tokens, duration = extract_slots(text)
+        with self._lock:
+            match = self._best_match(tokens, duration)
+            if match is None:
+                self.stats["misses"] += 1
+                CACHE_LOOKUPS.inc(cache="semantic", result="miss")
+                return None
+            entry_id, similarity = match
+            self._entries.move_to_end(entry_id)
+            _, cached_duration, tasks = self._entries[entry_id]
+            self.stats["hits"] += 1
+            CACHE_LOOKUPS.inc(cache="semantic", result="hit")
+            rescale = duration is not None and cached_duration != duration
+            if rescale:
+                self.stats["rescaled"] += 1
+
+        if rescale:
+            tasks = rescale_tasks(tasks, round(sum(duration) / 2))
+        return dict(tasks), similarity
+
+    def _best_match(self, tokens, duration):
+        if not tokens:
+            return None
+        exact = self._ids_by_slots.get((tokens, duration))
+        if exact is not None:
+            return exact, 1.0
+
+        # Numbers name a specific chapter, unit or page: a neighbour must have the same ones
+        numbers = {token for token in tokens if token.isdigit()}
+        weights = {token: self._idf(token) for token in tokens}
+        query_weight = sum(weights.values())
+        # Walk the rarest tokens first. Once the weight still to come can't
+        # lift an unseen entry over the threshold, the long postings lists
+        # of common tokens are only used to update known candidates.
+        remaining = query_weight
+        overlap = defaultdict(float)
+        for token in sorted(weights, key=weights.get, reverse=True):
+            weight = weights[token]
+            postings = self._postings.get(token, ())
+            if remaining >= self.threshold * query_weight:
+                for entry_id in postings:
+                    overlap[entry_id] += weight
+            else:
+                for entry_id in overlap:
+                    if entry_id in postings:
+                        overlap[entry_id] += weight
+            remaining -= weight
+        if not overlap:
+            return None
+
+        # Only the strongest overlaps can reach the threshold, so the full
+        # union weight is computed for a handful of candidates.
+        candidates = sorted(overlap.items(), key=lambda item: item[1], reverse=True)
+        best = None
+        for entry_id, shared in candidates[: self.max_candidates]:
+            if shared / query_weight < self.threshold:
+                break
+            entry_tokens, entry_duration, _ = self._entries[entry_id]
+            if not durations_compatible(entry_duration, duration, self.max_ratio):
+                continue
+            if {token for token in entry_tokens if token.isdigit()} != numbers:
+                continue
+            entry_weight = sum(weights.get(token) or self._idf(token) for token in entry_tokens)
+            similarity = shared / (query_weight + entry_weight - shared)
+            if similarity >= self.threshold and (best is None or similarity > best[1]):
+                best = (entry_id, similarity)
+        return best
+
+    def hit_rate(self) -> float:
+        total = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / total if total else 0.0
+
+
+_shared_caches = {}
+_shared_lock = threading.Lock()
+
+
+def get_semantic_cache(namespace: str) -> SemanticCache:
+    """
+    Process-wide semantic cache per namespace. Use the prompt template
+    version and model name as the namespace so plans from an older prompt
+    are never served.
+    """
+    with _shared_lock:
+        if namespace not in _shared_caches:
+            _shared_caches[namespace] = SemanticCache()
+        return _shared_caches[namespace]
@@ -0,0 +1,395 @@
+"""
+HTTP planning service for clients other than the Streamlit apps.
+
+    uvicorn service:app --workers 4 --port 8000
+    python service.py --workers 4 --port 8000   # the same, through uvicorn
+
+A plain ASGI application (no web framework needed); any ASGI server runs
+it. Endpoints:
+
+    POST /v1/plan          {"input", "session_id"?, "fresh"?, "structured"?}
+                           -> {"session_id", "tasks"}
+    POST /v1/plan/stream   same body, Server-Sent Events: "session", one
+                           "step" per task as soon as it's streamed, then
+                           "done" with the scheduled plan (or "error");
+                           a structured plan sends its steps when it's done
+    POST /v1/plans/batch   {"requests": [{"input", "session_id"?}, ...]}
+                           -> {"results": [{"session_id", "tasks"} or {"error"}]}
+    GET  /healthz, GET /metrics (Prometheus text)
+
+Sessions live in the shared session backend (SQLite by default), so any
+worker process can continue any session; a request without session_id
+starts a new one and gets its id back.
+
+Backpressure: at most ANAKIN_SERVICE_CONCURRENCY plans run at once per
+worker and up to ANAKIN_SERVICE_QUEUE more wait, in order, for at most
+ANAKIN_SERVICE_QUEUE_TIMEOUT seconds. Requests beyond that get 503 with
+Retry-After instead of piling up. A batch is admitted whole, so it holds
+at most concurrency + queue requests (ANAKIN_SERVICE_MAX_BATCH can only
+lower that). A streamed plan is produced through a small bounded buffer,
+so a slow client slows its own generation down.
+"""
+import os
+import json
+import uuid
+import asyncio
+import logging
+import argparse
+import threading
+from contextlib import asynccontextmanager, closing
+from concurrent.futures import ThreadPoolExecutor
+
+import anakin_core
+from metrics import SERVICE_REQUESTS, render_prometheus, setup_from_env, timed
+from resilience import CircuitOpenError, DeadlineExceeded
+from task_parser import strip_code_fence
+
+DEFAULT_CONCURRENCY = int(os.environ.get("ANAKIN_SERVICE_CONCURRENCY", 16))
+DEFAULT_QUEUE = int(os.environ.get("ANAKIN_SERVICE_QUEUE", 64))
+DEFAULT_QUEUE_TIMEOUT = float(os.environ.get("ANAKIN_SERVICE_QUEUE_TIMEOUT", 30))
+# None: as many as the admission queue can take at once (concurrency + queue)
+MAX_BATCH = int(os.environ["ANAKIN_SERVICE_MAX_BATCH"]) if os.environ.get("ANAKIN_SERVICE_MAX_BATCH") else None
+MAX_BODY_BYTES = 1024 * 1024
+STREAM_BUFFER = 8  # steps a streamed plan may run ahead of its client
+
+logger = logging.getLogger("anakin.service")
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str, headers=()):
+        super().__init__(message)
+        self.status = status
+        self.headers = list(headers)
+
+
+class Overloaded(HTTPError):
+    def __init__(self, retry_after: int):
+        super().__init__(503, "Too many requests in progress, try again later",
+                         [(b"retry-after", str(retry_after).encode())])
+
+
+class AdmissionQueue:
+    """
+    At most max_active plans run at once; up to max_waiting more wait for
+    a slot in arrival order, each for at most timeout seconds. Anything
+    beyond that is turned away with Overloaded.
+    """
+
+    def __init__(self, max_active=DEFAULT_CONCURRENCY, max_waiting=DEFAULT_QUEUE,
+                 timeout=DEFAULT_QUEUE_TIMEOUT):
+        self.max_active = max_active
+        self.max_waiting = max_waiting
+        self.timeout = timeout
+        self.active = 0
+        self.waiting = 0
+        self._slots = asyncio.Semaphore(max_active)
+
+    def room(self) -> int:
+        """How many more plans can be admitted right now."""
+        return (self.max_active - self.active) + (self.max_waiting - self.waiting)
+
+    @asynccontextmanager
+    async def slot(self):
+        if self.room() <= 0:
+            raise Overloaded(max(1, round(self.timeout / 4)))
+        self.waiting += 1
+        try:
+            with timed("queue_wait"):
+                await asyncio.wait_for(self._slots.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            raise Overloaded(max(1, round(self.timeout / 4))) from None
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._slots.release()
+
+
+async def iterate_in_thread(executor, make_iterator, buffer=STREAM_BUFFER):
+    """
+    Run a blocking iterator on executor and yield its items. The producer
+    blocks once buffer items are waiting, so it can't outrun the consumer.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(buffer)
+    done = object()
+    stopped = threading.Event()
+
+    def put(item):
+        asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+    def produce():
+        try:
+            with closing(make_iterator()) as items:
+                for item in items:
+                    if stopped.is_set():
+                        return
+                    put(item)
+        except BaseException as error:
+            put(error)
+        else:
+            put(done)
+
+    loop.run_in_executor(executor, produce)
+    try:
+        while True:
+            item = await queue.get()
+            if item is done:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        # The consumer went away: stop the producer and unblock its last put
+        stopped.set()
+        while not queue.empty():
+            queue.get_nowait()
+
+
+def sse_event(event: str, data) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
+
+
+def plan_request(body) -> dict:
+    """Validate one plan request and fill in the session id."""
+    if not isinstance(body, dict) or not isinstance(body.get("input"), str) or not body["input"].strip():
+        raise HTTPError(400, 'Expected a JSON object with a non-empty "input" string')
+    session_id = body.get("session_id") or uuid.uuid4().hex
+    if not isinstance(session_id, str):
+        raise HTTPError(400, '"session_id" must be a string')
+    return {
+        "input": body["input"],
+        "session_id": session_id,
+        "use_cache": not body.get("fresh", False),
+        "structured": body.get("structured"),
+    }
+
+
+class PlanningService:
+    """The ASGI application; one instance per worker process."""
+
+    def __init__(self, concurrency=DEFAULT_CONCURRENCY, queue=DEFAULT_QUEUE,
+                 queue_timeout=DEFAULT_QUEUE_TIMEOUT, max_batch=MAX_BATCH):
+        self.concurrency = concurrency
+        self.queue = queue
+        self.queue_timeout = queue_timeout
+        self.max_batch = concurrency + queue if max_batch is None else max_batch
+        if self.max_batch > concurrency + queue:
+            # Such a batch would pass the size check and then always get 503
+            raise ValueError(
+                f"max_batch ({self.max_batch}) can't exceed concurrency + queue ({concurrency + queue})"
+            )
+        self._admission = None
+        self._executor = None
+        self.routes = {
+            ("POST", "/v1/plan"): self.plan,
+            ("POST", "/v1/plan/stream"): self.stream,
+            ("POST", "/v1/plans/batch"): self.batch,
+            ("GET", "/healthz"): self.health,
+            ("GET", "/metrics"): self.metrics,
+        }
+
+    @property
+    def admission(self) -> AdmissionQueue:
+        # Created on first use, inside the server's event loop
+        if self._admission is None:
+            self._admission = AdmissionQueue(self.concurrency, self.queue, self.queue_timeout)
+        return self._admission
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.concurrency, thread_name_prefix="anakin-stream")
+        return self._executor
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+        handler = self.routes.get((scope["method"], scope["path"]))
+        endpoint = scope["path"] if handler else "unknown"
+        status = 500
+        try:
+            if handler is None:
+                methods = [method for method, path in self.routes if path == scope["path"]]
+                raise HTTPError(405 if methods else 404, "Method not allowed" if methods else "Not found")
+            status = await handler(scope, receive, send)
+        except HTTPError as error:
+            status = error.status
+            await send_json(send, status, {"error": str(error)}, error.headers)
+        except CircuitOpenError:
+            status = 503
+            await send_json(send, status, {"error": "The model is unavailable, try again later"},
+                            [(b"retry-after", b"30")])
+        except DeadlineExceeded:
+            status = 504
+            await send_json(send, status, {"error": "The model took too long to answer"})
+        except Exception:
+            logger.exception("%s %s failed", scope["method"], scope["path"])
+            status = 500
+            await send_json(send, status, {"error": "Internal error"})
+        finally:
+            SERVICE_REQUESTS.inc(endpoint=endpoint, status=status)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                setup_from_env()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self._executor is not None:
+                    self._executor.shutdown(wait=False, cancel_futures=True)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def plan(self, scope, receive, send) -> int:
+        request = plan_request(await read_json(receive))
+        async with self.admission.slot():
+            tasks = await self.run_plan(request)
+        await send_json(send, 200, {"session_id": request["session_id"], "tasks": tasks})
+        return 200
+
+    async def run_plan(self, request) -> dict:
+        json_tasks = await anakin_core.aget_parsed_tasks(
+            request["input"], request["session_id"], request["use_cache"], request["structured"]
+        )
+        try:
+            return json.loads(strip_code_fence(json_tasks))
+        except ValueError:
+            raise HTTPError(502, "The model's answer could not be parsed") from None
+
+    async def batch(self, scope, receive, send) -> int:
+        body = await read_json(receive)
+        items = body.get("requests") if isinstance(body, dict) else None
+        if not isinstance(items, list) or not items:
+            raise HTTPError(400, 'Expected a JSON object with a non-empty "requests" list')
+        if len(items) > self.max_batch:
+            raise HTTPError(413, f"At most {self.max_batch} requests per batch")
+        requests = [plan_request(item) for item in items]
+        # Admit the whole batch or none of it
+        if self.admission.room() < len(requests):
+            raise Overloaded(max(1, round(self.queue_timeout / 4)))
+
+        async def run(request):
+            try:
+                async with self.admission.slot():
+                    tasks = await self.run_plan(request)
+            except HTTPError as error:
+                return {"session_id": request["session_id"], "error": str(error)}
+            except Exception as error:
+                return {"session_id": request["session_id"], "error": f"{type(error).__name__}: {error}"}
+            return {"session_id": request["session_id"], "tasks": tasks}
+
+        results = await asyncio.gather(*(run(request) for request in requests))
+        await send_json(send, 200, {"results": results})
+        return 200
+
+    async def stream(self, scope, receive, send) -> int:
+        request = plan_request(await read_json(receive))
+        async with self.admission.slot():
+            await send({
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", b"text/event-stream; charset=utf-8"),
+                    (b"cache-control", b"no-cache"),
+                    (b"x-accel-buffering", b"no"),
+                ],
+            })
+            await send_chunk(send, sse_event("session", {"session_id": request["session_id"]}))
+            plan = {}
+            try:
+                steps = iterate_in_thread(self.executor, lambda: anakin_core.stream_parsed_tasks(
+                    request["input"], request["session_id"], request["use_cache"], request["structured"]
+                ))
+                async for task in steps:
+                    plan.update(task)
+                    await send_chunk(send, sse_event("step", task))
+                # A plan that misses its budget may go back to the model, off the event loop
+                result = await asyncio.get_running_loop().run_in_executor(
+                    self.executor, anakin_core.settle_plan,
+                    request["input"], request["session_id"], plan, request["structured"],
+                )
+                await send_chunk(send, sse_event("done", {"tasks": result.tasks, "total_minutes": result.total}))
+            except Exception as error:
+                # Headers are out, report the failure as an event
+                await send_chunk(send, sse_event("error", {"error": f"{type(error).__name__}: {error}"}))
+            await send({"type": "http.response.body", "body": b""})
+        return 200
+
+    async def health(self, scope, receive, send) -> int:
+        admission = self.admission
+        await send_json(send, 200, {"status": "ok", "active": admission.active, "waiting": admission.waiting})
+        return 200
+
+    async def metrics(self, scope, receive, send) -> int:
+        body = render_prometheus().encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"text/plain; version=0.0.4; charset=utf-8")],
+        })
+        await send({"type": "http.response.body", "body": body})
+        return 200
+
+
+async def read_json(receive):
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            raise asyncio.CancelledError()
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > MAX_BODY_BYTES:
+            raise HTTPError(413, "Request body too large")
+        chunks.append(chunk)
+        if not message.get("more_body", False):
+            break
+    try:
+        return json.loads(b"".join(chunks) or b"null")
+    except ValueError:
+        raise HTTPError(400, "Request body is not valid JSON") from None
+
+
+async def send_json(send, status: int, data, headers=()):
+    body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), *headers],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def send_chunk(send, body: bytes):
+    await send({"type": "http.response.body", "body": body, "more_body": True})
+
+
+app = PlanningService()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the planning service with uvicorn")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+    try:
+        import uvicorn
+    except ImportError:
+        raise SystemExit("uvicorn is needed to serve the app: pip install uvicorn") from None
+    if args.workers > 1 and os.environ.get("ANAKIN_SESSION_BACKEND") == "memory":
+        print("warning: in-memory sessions are not shared between workers")
+    uvicorn.run("service:app", host=args.host, port=args.port, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import deque
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, message_chunk_to_message
+
+from chat_memory import DEFAULT_MAX_TOKENS, DEFAULT_RECENT_TURNS, BudgetedChatHistory, TaskState
+from metrics import HISTORY_MESSAGES, timed
+
+# --- Session storage behind get_session_history ---
+# A backend stores, per session id, an append-only message log plus the
+# TaskState summary the memory strategy maintains. Histories read only the
+# tail they need, so nothing per session has to stay in process memory and
+# any Streamlit thread or worker process can serve any session.
+
+DEFAULT_SESSION_DB = os.environ.get(
+    "ANAKIN_SESSION_DB",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".anakin_sessions.sqlite"),
+)
+DEFAULT_MAX_IDLE = 30 * 24 * 60 * 60  # forget sessions idle for 30 days
+DEFAULT_EVICTION_INTERVAL = 10 * 60
+# Writes keep last_seen current; a read only refreshes it once it's this old
+TOUCH_INTERVAL = 10 * 60
+
+MESSAGE_TYPES = {"human": HumanMessage, "ai": AIMessage, "system": SystemMessage}
+
+
+class InMemorySessionBackend:
+    """
+    Process-local backend. Only the last max_tail messages of a session are
+    kept, which is all a BudgetedChatHistory ever reads.
+    """
+
+    def __init__(self, max_tail=2 * DEFAULT_RECENT_TURNS):
+        self.max_tail = max_tail
+        self._sessions = {}  # id -> {"state", "count", "tail", "last_seen"}
+        self._lock = threading.Lock()
+
+    def load(self, session_id: str, tail: int):
+        """Return (state dict, message count, [(type, content), ...])."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return {}, 0, []
+            session["last_seen"] = time.time()
+            messages = list(session["tail"])[-tail:] if tail else []
+            return dict(session["state"]), session["count"], messages
+
+    def append(self, session_id: str, message_type: str, content: str, fold):
+        """
+        Append a message and replace the session state with fold(state),
+        as one atomic step.
+        """
+        with self._lock:
+            session = self._sessions.setdefault(
+                session_id,
+                {"state": {}, "count": 0, "tail": deque(maxlen=self.max_tail), "last_seen": 0},
+            )
+            session["state"] = fold(session["state"])
+            session["count"] += 1
+            session["tail"].append((message_type, content))
+            session["last_seen"] = time.time()
+
+    def update_state(self, session_id: str, fold):
+        """Replace the state of an existing session with fold(state)."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session["state"] = fold(session["state"])
+                session["last_seen"] = time.time()
+
+    def clear(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def evict_idle(self, max_idle: float) -> int:
+        cutoff = time.time() - max_idle
+        with self._lock:
+            idle = [sid for sid, session in self._sessions.items() if session["last_seen"] < cutoff]
+            for session_id in idle:
+                del self._sessions[session_id]
+        return len(idle)
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+class SQLiteSessionBackend:
+    """
+    SQLite backend in WAL mode. Messages are append-only rows; the state
+    row is updated inside the same IMMEDIATE transaction, so concurrent
+    writers in other threads or processes can't interleave a fold.
+    Each thread gets its own connection.
+    """
+
+    def __init__(self, path=DEFAULT_SESSION_DB):
+        self.path = path
+        self._local = threading.local()
+        db = self._connect()
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " session_id TEXT PRIMARY KEY,"
+            " state TEXT NOT NULL,"
+            " count INTEGER NOT NULL,"
+            " last_seen REAL NOT NULL)"
+        )
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " session_id TEXT NOT NULL,"
+            " type TEXT NOT NULL,"
+            " content TEXT NOT NULL)"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS messages_session ON messages (session_id, id)")
+        db.execute("CREATE INDEX IF NOT EXISTS sessions_last_seen ON sessions (last_seen)")
+
+    def _connect(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def load(self, session_id: str, tail: int):
+        db = self._connect()
+        row = db.execute(
+            "SELECT state, count, last_seen FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        if row is None:
+            return {}, 0, []
+        rows = db.execute(
+            "SELECT type, content FROM messages WHERE session_id = ?"
+            " ORDER BY id DESC LIMIT ?",
+            (session_id, tail),
+        ).fetchall()
+        now = time.time()
+        if now - row[2] > TOUCH_INTERVAL:
+            # A session that is only read (a refreshed page) must not look idle
+            db.execute("UPDATE sessions SET last_seen = ? WHERE session_id = ?", (now, session_id))
+        return json.loads(row[0]), row[1], rows[::-1]
+
+    def append(self, session_id: str, message_type: str, content: str, fold):
+        db = self._connect()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute(
+                "SELECT state, count FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            state, count = (json.loads(row[0]), row[1]) if row else ({}, 0)
+            db.execute(
+                "INSERT INTO messages (session_id, type, content) VALUES (?, ?, ?)",
+                (session_id, message_type, content),
+            )
+            db.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, state, count, last_seen)"
+                " VALUES (?, ?, ?, ?)",
+                (session_id, json.dumps(fold(state)), count + 1, time.time()),
+            )
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+    def update_state(self, session_id: str, fold):
+        db = self._connect()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute(
+                "SELECT state FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if row is not None:
+                db.execute(
+                    "UPDATE sessions SET state = ?, last_seen = ? WHERE session_id = ?",
+                    (json.dumps(fold(json.loads(row[0]))), time.time(), session_id),
+                )
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+    def clear(self, session_id: str):
+        db = self._connect()
+        db.execute("BEGIN IMMEDIATE")
+        db.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+        db.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+        db.execute("COMMIT")
+
+    def evict_idle(self, max_idle: float) -> int:
+        cutoff = time.time() - max_idle
+        db = self._connect()
+        db.execute("BEGIN IMMEDIATE")
+        db.execute(
+            "DELETE FROM messages WHERE session_id IN"
+            " (SELECT session_id FROM sessions WHERE last_seen < ?)",
+            (cutoff,),
+        )
+        evicted = db.execute("DELETE FROM sessions WHERE last_seen < ?", (cutoff,)).rowcount
+        db.execute("COMMIT")
+        return evicted
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+
+class StoredChatHistory(BudgetedChatHistory):
+    """
+    BudgetedChatHistory whose messages and TaskState live in a session
+    backend. Every read loads just the verbatim tail and the summary.
+    """
+
+    def __init__(
+        self,
+        backend,
+        session_id: str,
+        recent_turns=DEFAULT_RECENT_TURNS,
+        max_tokens=DEFAULT_MAX_TOKENS,
+    ):
+        super().__init__(recent_turns, max_tokens)
+        self.backend = backend
+        self.session_id = session_id
+
+    def _load(self):
+        state, count, tail = self.backend.load(self.session_id, self.recent.maxlen)
+        self.state = TaskState.from_dict(state)
+        self.recent.clear()
+        self.recent.extend(MESSAGE_TYPES[kind](content=content) for kind, content in tail)
+        self.folded = max(0, count - self.recent.maxlen)
+
+    def add_message(self, message) -> None:
+        message = message_chunk_to_message(message)
+
+        def fold(state):
+            task_state = TaskState.from_dict(state)
+            task_state.update(message)
+            return task_state.to_dict()
+
+        content = message.content if isinstance(message.content, str) else str(message.content)
+        self.backend.append(self.session_id, message.type, content, fold)
+
+    def current_plan(self):
+        state, _, _ = self.backend.load(self.session_id, 0)
+        self.state = TaskState.from_dict(state)
+        return self.state.plan
+
+    def set_plan(self, tasks: dict) -> None:
+        def fold(state):
+            task_state = TaskState.from_dict(state)
+            task_state.set_plan(tasks)
+            return task_state.to_dict()
+
+        self.backend.update_state(self.session_id, fold)
+
+    @property
+    def messages(self) -> list:
+        with timed("history_load"):
+            self._load()
+            messages = super().messages
+        HISTORY_MESSAGES.observe(len(messages))
+        return messages
+
+    def clear(self) -> None:
+        self.backend.clear(self.session_id)
+        super().clear()
+
+
+def start_idle_eviction(backend, max_idle=DEFAULT_MAX_IDLE, interval=DEFAULT_EVICTION_INTERVAL):
+    """
+    Evict sessions idle for longer than max_idle seconds every interval
+    seconds on a daemon thread. Returns an Event that stops the thread.
+    """
+    stop = threading.Event()
+
+    def run():
+        while not stop.wait(interval):
+            try:
+                backend.evict_idle(max_idle)
+            except sqlite3.Error:
+                pass  # the database is busy, try again next round
+
+    threading.Thread(target=run, name="anakin-session-eviction", daemon=True).start()
+    return stop
+
+
+_shared_backend = None
+_shared_lock = threading.Lock()
+
+
+def get_session_backend():
+    """
+    Process-wide session backend, created on first use.
+    ANAKIN_SESSION_BACKEND=memory keeps sessions in process memory,
+    otherwise they're stored in ANAKIN_SESSION_DB.
+    """
+    global _shared_backend
+    with _shared_lock:
+        if _shared_backend is None:
+            if os.environ.get("ANAKIN_SESSION_BACKEND") == "memory":
+                _shared_backend = InMemorySessionBackend()
+                max_idle = float(os.environ.get("ANAKIN_SESSION_MAX_IDLE", 60 * 60))
+            else:
+                _shared_backend = SQLiteSessionBackend()
+                max_idle = float(os.environ.get("ANAKIN_SESSION_MAX_IDLE", DEFAULT_MAX_IDLE))
+            start_idle_eviction(_shared_backend, max_idle)
+        return _shared_backend
+
+
+def get_stored_history(session_id: str) -> StoredChatHistory:
+    return StoredChatHistory(get_session_backend(), session_id)
@@ -0,0 +1,182 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from contextlib import asynccontextmanager, contextmanager
+
+from metrics import SESSION_WAITS, SINGLE_FLIGHT
+
+# --- Coalescing of identical in-flight calls ---
+# Streamlit reruns, double-clicks and refreshes send the same request
+# again while the first one is still waiting on the model. Calls are keyed
+# like the response cache; the first caller (the leader) does the work and
+# every concurrent duplicate (a follower) waits for its result instead of
+# calling the model again. Threads and asyncio tasks can share a flight:
+# the result travels through a concurrent.futures.Future.
+#
+# SessionGuard serializes the generations of one session, so two different
+# requests can't interleave their turns in the session history.
+
+SESSION_POLL_SECONDS = 0.01
+
+
+class SingleFlight:
+    def __init__(self, stage: str):
+        self.stage = stage
+        self._calls = {}  # key -> Future of the leader's result
+        self._lock = threading.Lock()
+
+    def claim(self, key):
+        """
+        (True, future) if the caller leads the call for key and must
+        finish() it, else (False, future) for the leader's result.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                SINGLE_FLIGHT.inc(stage=self.stage, role="follower")
+                return False, future
+            future = self._calls[key] = Future()
+            # A running future can't be cancelled by a follower giving up
+            future.set_running_or_notify_cancel()
+        SINGLE_FLIGHT.inc(stage=self.stage, role="leader")
+        return True, future
+
+    def finish(self, key, future, result=None, error=None):
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def abandon(self, key, future):
+        """The leader gave up before finishing: followers run the call themselves."""
+        self.finish(key, future, error=asyncio.CancelledError())
+
+    def do(self, key, fn):
+        """Return (fn(), shared); shared is True if another caller's result was reused."""
+        while True:
+            leader, future = self.claim(key)
+            if leader:
+                try:
+                    result = fn()
+                except BaseException as error:
+                    self.finish(key, future, error=error)
+                    raise
+                self.finish(key, future, result)
+                return result, False
+            try:
+                return future.result(), True
+            except asyncio.CancelledError:
+                continue  # the leader was cancelled or abandoned the call
+
+    async def ado(self, key, fn):
+        """Async version of do; fn is a coroutine function."""
+        while True:
+            leader, future = self.claim(key)
+            if leader:
+                try:
+                    result = await fn()
+                except BaseException as error:
+                    self.finish(key, future, error=error)
+                    raise
+                self.finish(key, future, result)
+                return result, False
+            try:
+                return await asyncio.wrap_future(future), True
+            except asyncio.CancelledError:
+                if not future.done() or not isinstance(future.exception(), asyncio.CancelledError):
+                    raise  # we were cancelled, not the leader
+                continue
+
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def get_single_flight(stage: str) -> SingleFlight:
+    with _flights_lock:
+        if stage not in _flights:
+            _flights[stage] = SingleFlight(stage)
+        return _flights[stage]
+
+
+def suppressed_calls() -> int:
+    """Calls that reused an in-flight result instead of running again."""
+    return sum(SINGLE_FLIGHT.value(stage=stage, role="follower") for stage in list(_flights))
+
+
+class SessionGuard:
+    """
+    One generation per session at a time, across threads and asyncio
+    tasks. Reentrant for the thread or task that holds the session.
+    Process-local: workers sharing a session backend should route a
+    session's requests to one worker.
+    """
+
+    def __init__(self, poll_seconds=SESSION_POLL_SECONDS):
+        self.poll_seconds = poll_seconds
+        self._holders = {}  # session id -> [owner, depth]
+        self._changed = threading.Condition()
+
+    @staticmethod
+    def _owner():
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        return threading.get_ident(), task
+
+    def _try_acquire(self, session_id, owner) -> bool:
+        holder = self._holders.get(session_id)
+        if holder is None:
+            self._holders[session_id] = [owner, 1]
+            return True
+        if holder[0] == owner:
+            holder[1] += 1
+            return True
+        return False
+
+    def _release(self, session_id):
+        with self._changed:
+            holder = self._holders[session_id]
+            holder[1] -= 1
+            if holder[1] == 0:
+                del self._holders[session_id]
+                self._changed.notify_all()
+
+    @contextmanager
+    def hold(self, session_id: str):
+        owner = self._owner()
+        with self._changed:
+            if not self._try_acquire(session_id, owner):
+                SESSION_WAITS.inc()
+                while not self._try_acquire(session_id, owner):
+                    self._changed.wait()
+        try:
+            yield
+        finally:
+            self._release(session_id)
+
+    @asynccontextmanager
+    async def ahold(self, session_id: str):
+        # Polls instead of blocking, so the event loop keeps running
+        owner = self._owner()
+        waited = False
+        while True:
+            with self._changed:
+                if self._try_acquire(session_id, owner):
+                    break
+            if not waited:
+                SESSION_WAITS.inc()
+                waited = True
+            await asyncio.sleep(self.poll_seconds)
+        try:
+            yield
+        finally:
+            self._release(session_id)
+
+
+session_guard = SessionGuard()
+
@@ -0,0 +1,356 @@
+import re
+import json
+from collections import Counter
+from dataclasses import dataclass, field
+
+from metrics import PARSES
+
+# --- Local parser for Anakin's breakdown format ---
+# The breakdown prompt forces a fixed markdown layout:
+#
+#   📋 Breaking down: Study for Math Exam
+#   ### 🎯 Phase 1: Setup
+#   **Step 1: 📚 Review Chapter Notes**
+#   Organize and read through class notes
+#   ⏱️ **Time:** 30 minutes
+#   ✨ You've got this! Take it one step at a time.
+#
+# so the tasks and times can be pulled out without a second LLM call.
+# Text that doesn't follow this grammar is reported as unparsed and the
+# caller falls back to the parser chain (chain_2).
+
+EMOJI_RE = re.compile(
+    "["
+    "\U0001F000-\U0001FAFF"  # pictographs, emoticons, transport, symbols
+    "\u2190-\u21FF"  # arrows
+    "\u2300-\u23FF"  # technical (⏱ ⌛ ⏰)
+    "\u2460-\u24FF"  # enclosed alphanumerics
+    "\u25A0-\u27BF"  # shapes, misc symbols, dingbats (✨ ✅ ☕)
+    "\u2900-\u297F"
+    "\u2B00-\u2BFF"
+    "\u3030\u303D\u3297\u3299"
+    "\uFE0E\uFE0F\u200D\u20E3"  # variation selectors, ZWJ, keycap
+    "]+"
+)
+MARKDOWN_RE = re.compile(r"(\*\*|__|`|~~)")
+
+STEP_RE = re.compile(
+    r"^\s*(?:[-*+]\s+|\d+[.)]\s+)?[*_]*\s*Step\s+(\d+)\s*[:.)\-–—]\s*(.*?)\s*[*_]*\s*$",
+    re.IGNORECASE,
+)
+PHASE_RE = re.compile(r"^\s*#{1,6}\s+(.+?)\s*#*\s*$")
+TIME_RE = re.compile(
+    r"^\s*(?:[-*+]\s+)?(?:\W*\s*)?[*_]*\s*(?:Time|Duration|Estimated time)\s*[*_]*\s*:\s*[*_]*\s*(.+?)\s*$",
+    re.IGNORECASE,
+)
+HEADER_RE = re.compile(r"Breaking down\s*:\s*(.+)", re.IGNORECASE)
+
+# Durations: "30 minutes", "1.5 hrs", "1 hour 15 min", "1h30", "45-60 minutes", "1–2 hours"
+NUMBER = r"(\d+(?:\.\d+)?)"
+UNIT_MINUTES = {
+    "m": 1, "min": 1, "mins": 1, "minute": 1, "minutes": 1,
+    "h": 60, "hr": 60, "hrs": 60, "hour": 60, "hours": 60,
+    "d": 1440, "day": 1440, "days": 1440,
+    "wk": 10080, "week": 10080, "weeks": 10080,
+    "month": 43200, "months": 43200,
+}
+UNIT = r"(minutes|minute|mins|min|months|month|m|hours|hour|hrs|hr|h|days|day|d|weeks|week|wk)\b"
+RANGE_RE = re.compile(
+    rf"^~?\s*{NUMBER}\s*(?:{UNIT})?\s*(?:-|–|—|to)\s*{NUMBER}\s*{UNIT}",
+    re.IGNORECASE,
+)
+COMPOUND_RE = re.compile(
+    rf"^~?\s*{NUMBER}\s*(hours|hour|hrs|hr|h)\s*(?:and\s*)?(?:{NUMBER}\s*(minutes|minute|mins|min|m)?\b)?",
+    re.IGNORECASE,
+)
+SINGLE_RE = re.compile(rf"^~?\s*{NUMBER}\s*{UNIT}", re.IGNORECASE)
+
+
+def strip_emoji(text: str) -> str:
+    """Remove emoji and markdown emphasis, collapsing leftover whitespace."""
+    text = EMOJI_RE.sub("", text)
+    text = MARKDOWN_RE.sub("", text)
+    return re.sub(r"\s+", " ", text).strip(" -:")
+
+
+def parse_duration(text: str):
+    """
+    Parse a duration like "1 hour 30 minutes" or "45-60 min".
+    Returns (low, high) in minutes, or None if the text isn't a duration.
+    """
+    text = MARKDOWN_RE.sub("", text).strip().lower()
+    match = match_duration(text)
+    return None if match is None else match[0]
+
+
+def match_duration(text: str):
+    """
+    Match a duration at the start of lowercase text.
+    Returns ((low, high) in minutes, characters consumed) or None.
+    """
+    match = RANGE_RE.match(text)
+    if match:
+        low, low_unit, high, high_unit = match.groups()
+        low_unit = low_unit or high_unit
+        duration = (
+            round(float(low) * UNIT_MINUTES[low_unit]),
+            round(float(high) * UNIT_MINUTES[high_unit]),
+        )
+        return duration, match.end()
+    match = COMPOUND_RE.match(text)
+    if match:
+        hours, _, minutes, _ = match.groups()
+        total = round(float(hours) * 60 + float(minutes or 0))
+        return (total, total), match.end()
+    match = SINGLE_RE.match(text)
+    if match:
+        value, unit = match.groups()
+        total = round(float(value) * UNIT_MINUTES[unit])
+        return (total, total), match.end()
+    return None
+
+
+NUMBER_WORDS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+    "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10, "eleven": 11,
+    "twelve": 12, "fifteen": 15, "twenty": 20, "thirty": 30, "forty": 40,
+    "forty-five": 45, "sixty": 60, "ninety": 90, "couple of": 2, "few": 3,
+}
+NUMBER_WORD_RE = re.compile(
+    r"\b(" + "|".join(sorted(NUMBER_WORDS, key=len, reverse=True)) + r")\s+"
+    r"(?=(?:minutes?|mins?|hours?|hrs?|days?|weeks?|months?)\b)"
+)
+HALF_RE = (
+    (re.compile(r"\b(?:an?|one) (?:hour|hr) and a half\b"), "90 minutes"),
+    (re.compile(r"\bhalf an? (?:hour|hr)\b"), "30 minutes"),
+)
+
+
+def normalize_number_words(text: str) -> str:
+    """Lowercase text and spell durations with digits ("four hours" -> "4 hours")."""
+    text = text.lower()
+    for pattern, replacement in HALF_RE:
+        text = pattern.sub(replacement, text)
+    return NUMBER_WORD_RE.sub(lambda match: f"{NUMBER_WORDS[match.group(1)]} ", text)
+
+
+def extract_duration(text: str):
+    """
+    Find the time budget in free text such as "study oops in next 4 hours",
+    "90 min", "2h30" or "four hours". Returns (low, high) in minutes or None.
+    """
+    found = find_duration(normalize_number_words(text))
+    return None if found is None else found[0]
+
+
+def find_duration(text: str):
+    """
+    The first duration in normalized text (see normalize_number_words) as
+    ((low, high) minutes, start, end), or None.
+    """
+    for match in re.finditer(r"(?<![\w.])\d+(?:\.\d+)?", text):
+        found = match_duration(text[match.start():])
+        if found is not None:
+            duration, length = found
+            return duration, match.start(), match.start() + length
+    return None
+
+
+def format_minutes(low: int, high: int) -> str:
+    if low == high:
+        return f"{low} minutes"
+    return f"{low}-{high} minutes"
+
+
+@dataclass
+class ParsedStep:
+    number: int
+    title: str
+    phase: str = None
+    description: list = field(default_factory=list)
+    time_text: str = None
+    minutes: tuple = None
+
+    @property
+    def time(self) -> str:
+        if self.minutes is None:
+            return None
+        return format_minutes(*self.minutes)
+
+
+class BreakdownParseError(ValueError):
+    """Raised when a breakdown doesn't follow the Step/Time grammar."""
+
+
+class BreakdownParser:
+    """
+    Incremental parser for the breakdown format.
+    Feed it text chunks as they arrive; every call returns the steps whose
+    block has closed so far. Call close() at the end of the stream.
+    """
+
+    def __init__(self):
+        self.header = None
+        self.phase = None
+        self.steps = []
+        self._buffer = ""
+        self._current = None
+        self._after_blank = False
+
+    def feed(self, chunk: str) -> list:
+        self._buffer += chunk
+        done = []
+        while "\n" in self._buffer:
+            line, self._buffer = self._buffer.split("\n", 1)
+            done.extend(self._feed_line(line))
+        return done
+
+    def close(self) -> list:
+        done = []
+        if self._buffer:
+            done.extend(self._feed_line(self._buffer))
+            self._buffer = ""
+        done.extend(self._finish_step())
+        self._validate()
+        return done
+
+    def _finish_step(self) -> list:
+        if self._current is None:
+            return []
+        step, self._current = self._current, None
+        self.steps.append(step)
+        return [step]
+
+    def _feed_line(self, line: str) -> list:
+        if not line.strip():
+            self._after_blank = True
+            return []
+        after_blank, self._after_blank = self._after_blank, False
+
+        match = STEP_RE.match(line)
+        if match:
+            done = self._finish_step()
+            number, title = match.groups()
+            self._current = ParsedStep(int(number), strip_emoji(title), self.phase)
+            return done
+
+        match = PHASE_RE.match(line)
+        if match:
+            self.phase = strip_emoji(match.group(1)) or None
+            return self._finish_step()
+
+        match = TIME_RE.match(line)
+        if match and self._current is not None:
+            step = self._current
+            step.time_text = match.group(1)
+            step.minutes = parse_duration(strip_emoji(match.group(1)))
+            if step.minutes is None:
+                raise BreakdownParseError(f"Unrecognised duration: {match.group(1)!r}")
+            # Time is the last line of a step block
+            return self._finish_step()
+
+        if self.header is None and not self.steps and self._current is None:
+            match = HEADER_RE.search(line)
+            if match:
+                self.header = strip_emoji(match.group(1))
+                return []
+
+        # Description lines belong to the open step until a blank line
+        # separates them from trailing text such as the closing line.
+        if self._current is not None and not (after_blank and self._current.description):
+            self._current.description.append(strip_emoji(line))
+        return []
+
+    def _validate(self):
+        if not self.steps:
+            raise BreakdownParseError("No steps found")
+        numbers = [step.number for step in self.steps]
+        if numbers != list(range(1, len(numbers) + 1)):
+            raise BreakdownParseError(f"Steps are not numbered 1..n: {numbers}")
+        timed = [step.minutes is not None for step in self.steps]
+        if any(timed) and not all(timed):
+            raise BreakdownParseError("Only some steps have a time estimate")
+
+
+def to_task_dict(steps) -> dict:
+    """Flatten parsed steps into the "Task N" / "Time required TN" dict."""
+    tasks = {}
+    for step in steps:
+        tasks[f"Task {step.number}"] = step.title
+        if step.time is not None:
+            tasks[f"Time required T{step.number}"] = step.time
+        if step.phase:
+            tasks[f"Phase T{step.number}"] = step.phase
+    return tasks
+
+
+def iter_task_dicts(tasks: dict):
+    """
+    Split a flat task dict into one dict per task, in task order.
+    Yields (number, {"Task N": ..., "Time required TN": ..., ...}).
+    """
+    number = 1
+    while f"Task {number}" in tasks:
+        keys = (f"Task {number}", f"Time required T{number}", f"Phase T{number}")
+        yield number, {key: tasks[key] for key in keys if key in tasks}
+        number += 1
+
+
+def render_tasks_markdown(tasks: dict, header: str = None) -> str:
+    """Render a task dict back into the breakdown format."""
+    lines = []
+    if header:
+        lines += [f"📋 Breaking down: {header}", ""]
+    phase = None
+    for number, task in iter_task_dicts(tasks):
+        if task.get(f"Phase T{number}", phase) != phase:
+            phase = task[f"Phase T{number}"]
+            lines += [f"### {phase}", ""]
+        lines.append(f"**Step {number}: {task[f'Task {number}']}**")
+        if f"Time required T{number}" in task:
+            lines.append(f"⏱️ **Time:** {task[f'Time required T{number}']}")
+        lines.append("")
+    lines.append("✨ You've got this! Take it one step at a time.")
+    return "\n".join(lines)
+
+
+def parse_breakdown(text: str) -> dict:
+    """
+    Parse a whole breakdown into the task dict.
+    Raises BreakdownParseError if the text doesn't match the grammar.
+    """
+    parser = BreakdownParser()
+    parser.feed(text)
+    parser.close()
+    return to_task_dict(parser.steps)
+
+
+# --- How often the local parser has to hand over to the LLM ---
+parse_stats = Counter()
+
+
+def record_parse(outcome: str):
+    """outcome is "local" or "fallback"."""
+    parse_stats[outcome] += 1
+    PARSES.inc(outcome=outcome)
+
+
+def fallback_rate() -> float:
+    total = parse_stats["local"] + parse_stats["fallback"]
+    return parse_stats["fallback"] / total if total else 0.0
+
+
+def strip_code_fence(text: str) -> str:
+    """Remove a ```json ... ``` wrapper from an LLM response."""
+    text = text.strip()
+    if text.startswith("```json"):
+        text = text[7:]
+    if text.startswith("```"):
+        text = text[3:]
+    if text.endswith("```"):
+        text = text[:-3]
+    return text.strip()
+
+
+def tasks_to_json(tasks: dict) -> str:
+    return json.dumps(tasks, indent=4, ensure_ascii=False)
@@ -0,0 +1,86 @@
+from typing import List, Optional
+
+from pydantic import BaseModel, Field
+
+from task_parser import format_minutes, strip_emoji
+
+# --- Typed task plan ---
+# Returned directly by the breakdown model in structured-output mode, so a
+# plan needs no second LLM call and no markdown/JSON clean-up. Markdown for
+# the chat and the flat "Task N" dict are both rendered from it locally.
+
+CLOSING_LINE = "✨ You've got this! Take it one step at a time."
+
+
+class PlanStep(BaseModel):
+    """One microtask."""
+
+    emoji: str = Field("", description="A single emoji that illustrates the step")
+    title: str = Field(description="Short, actionable step title without emoji")
+    description: str = Field("", description="One sentence on how to do the step, may be empty")
+    minutes: Optional[int] = Field(None, description="Time estimate in minutes, if known")
+
+
+class PlanPhase(BaseModel):
+    """A group of consecutive steps, e.g. "🎯 Phase 1: Setup"."""
+
+    name: Optional[str] = Field(None, description="Phase heading, omit for simple plans")
+    steps: List[PlanStep]
+
+
+class TaskPlan(BaseModel):
+    """A task broken down into microtasks."""
+
+    header: str = Field(description="Name of the task being broken down")
+    phases: List[PlanPhase] = Field(default_factory=list)
+    message: Optional[str] = Field(
+        None,
+        description="Only when no plan can be made: a neutral note, e.g. asking for a time budget",
+    )
+
+    @property
+    def steps(self) -> List[PlanStep]:
+        return [step for phase in self.phases for step in phase.steps]
+
+    @property
+    def total_minutes(self) -> Optional[int]:
+        minutes = [step.minutes for step in self.steps]
+        if not minutes or None in minutes:
+            return None
+        return sum(minutes)
+
+    def to_markdown(self) -> str:
+        """Render the plan in the breakdown format the prompts describe."""
+        lines = [f"📋 Breaking down: {self.header}", ""]
+        if self.message:
+            lines += [self.message, ""]
+        number = 1
+        for phase in self.phases:
+            if phase.name:
+                lines += [f"### {phase.name}", ""]
+            for step in phase.steps:
+                title = f"{step.emoji} {step.title}".strip()
+                lines.append(f"**Step {number}: {title}**")
+                if step.description:
+                    lines.append(step.description)
+                if step.minutes is not None:
+                    lines.append(f"⏱️ **Time:** {step.minutes} minutes")
+                lines.append("")
+                number += 1
+        if self.steps:
+            lines.append(CLOSING_LINE)
+        return "\n".join(lines).strip()
+
+    def to_task_dict(self) -> dict:
+        """The flat "Task N" / "Time required TN" dict used by the apps."""
+        tasks = {}
+        number = 1
+        for phase in self.phases:
+            for step in phase.steps:
+                tasks[f"Task {number}"] = strip_emoji(step.title)
+                if step.minutes is not None:
+                    tasks[f"Time required T{number}"] = format_minutes(step.minutes, step.minutes)
+                if phase.name:
+                    tasks[f"Phase T{number}"] = strip_emoji(phase.name)
+                number += 1
+        return tasks
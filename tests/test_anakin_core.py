@@ -0,0 +1,64 @@
+import asyncio
+import time
+
+import pytest
+
+import anakin_core
+from resilience import DeadlineExceeded, reset_breakers
+from scheduler import ScheduleResult
+
+
+def test_stream_parsed_tasks_survives_a_non_json_parser_answer(monkeypatch):
+    monkeypatch.setenv("ANAKIN_FAKE_LLM", "1")
+    monkeypatch.setenv("ANAKIN_SESSION_BACKEND", "memory")
+    cached = []
+    monkeypatch.setattr(anakin_core, "stream_breakdown", lambda *args: iter(["Sure, ", "let's plan that."]))
+    monkeypatch.setattr(anakin_core, "parse_with_model", lambda text, use_cache: "Sorry, I can't help.")
+    monkeypatch.setattr(anakin_core, "semantic_cache_add", lambda *args: cached.append(args))
+
+    tasks = list(anakin_core.stream_parsed_tasks("plan my day", "stream-fallback-test", use_cache=False))
+    assert tasks == []
+    assert cached == []
+
+
+def test_a_structured_call_gives_up_at_the_deadline(monkeypatch):
+    monkeypatch.setenv("ANAKIN_FAKE_LLM", "1")
+    monkeypatch.setenv("ANAKIN_FAKE_LATENCY", "5")
+    monkeypatch.setenv("ANAKIN_FAKE_LATENCY_SIGMA", "0")
+    monkeypatch.setenv("ANAKIN_LLM_DEADLINE", "0.1")
+    monkeypatch.setenv("ANAKIN_LLM_MAX_ATTEMPTS", "1")
+    anakin_core.reset_registry()
+    reset_breakers()
+    try:
+        start = time.perf_counter()
+        with pytest.raises(DeadlineExceeded):
+            anakin_core.get_structured_chain().invoke({"input": "study for my exam in 2 hours", "chat_history": ""})
+        assert time.perf_counter() - start < 1
+    finally:
+        anakin_core.reset_registry()
+        reset_breakers()
+
+
+@pytest.mark.parametrize("structured", [False, True])
+def test_a_regenerated_plan_keeps_one_turn_in_the_history(monkeypatch, structured):
+    monkeypatch.setenv("ANAKIN_FAKE_LLM", "1")
+    monkeypatch.setenv("ANAKIN_FAKE_LATENCY", "0")
+    monkeypatch.setenv("ANAKIN_SESSION_BACKEND", "memory")
+    results = []
+
+    def schedule(user_input, tasks):
+        # The first plan can't be fixed locally, the retry fits
+        results.append(tasks)
+        return ScheduleResult(tasks, (120, 120), ok=len(results) % 2 == 0)
+
+    monkeypatch.setattr(anakin_core, "schedule_tasks", schedule)
+    user_input = "study for my exam in 2 hours"
+    anakin_core.get_parsed_tasks(user_input, f"regenerate-{structured}", use_cache=False, structured=structured)
+    asyncio.run(anakin_core.aget_parsed_tasks(
+        user_input, f"aregenerate-{structured}", use_cache=False, structured=structured
+    ))
+    assert len(results) == 4
+    for session_id in (f"regenerate-{structured}", f"aregenerate-{structured}"):
+        messages = anakin_core.session_messages(session_id)
+        assert [message.content for message in messages[::2]] == [user_input]
+        assert len(messages) == 2
@@ -0,0 +1,76 @@
+import asyncio
+import io
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from batch_planner import RateLimiter, parse_request, plan_as_completed, run_cli
+
+
+def collect(items, plan, **options):
+    async def main():
+        return [result async for result in plan_as_completed(items, plan, **options)]
+
+    return asyncio.run(asyncio.wait_for(main(), timeout=5))
+
+
+def test_results_cover_every_item():
+    async def double(item):
+        return item * 2
+
+    results = collect(range(10), double, max_concurrency=3)
+    assert sorted((result.index, result.value) for result in results) == [(i, i * 2) for i in range(10)]
+
+
+def test_a_failing_cost_or_limiter_is_captured_in_its_result():
+    class Refusing(RateLimiter):
+        async def acquire(self, tokens):
+            if tokens < 0:
+                raise ValueError("negative cost")
+
+    async def echo(item):
+        return item
+
+    results = collect([1, -1, 2], echo, max_concurrency=1, limiter=Refusing(), cost=lambda item: item)
+    errors = {result.item: result.error for result in results}
+    assert isinstance(errors[-1], ValueError)
+    assert errors[1] is None and errors[2] is None
+
+    results = collect([{"input": "a"}, {}], echo, max_concurrency=2, cost=lambda item: len(item["input"]))
+    assert [type(result.error) for result in sorted(results, key=lambda result: result.index)] == [type(None), KeyError]
+
+
+def test_an_error_from_the_items_reaches_the_caller():
+    def items():
+        yield 1
+        raise OSError("disk gone")
+
+    async def echo(item):
+        return item
+
+    with pytest.raises(OSError):
+        collect(items(), echo, max_concurrency=2)
+
+
+def test_parse_request():
+    assert parse_request(3, '{"input": "read"}') == {"input": "read", "id": 3}
+    for line in ('{"input": ', '{"topic": "read"}', '["read"]'):
+        with pytest.raises(ValueError):
+            parse_request(1, line)
+
+
+def test_bad_lines_get_error_results_and_the_run_completes(tmp_path, monkeypatch):
+    monkeypatch.setenv("ANAKIN_FAKE_LLM", "1")
+    monkeypatch.setenv("ANAKIN_FAKE_LATENCY", "0")
+    monkeypatch.setenv("ANAKIN_SESSION_BACKEND", "memory")
+    requests = tmp_path / "requests.jsonl"
+    requests.write_text('{"input": "study for my exam in 2 hours"}\n{"input": \n{"topic": "no input"}\n')
+    args = SimpleNamespace(
+        requests=str(requests), concurrency=2, rpm=None, tpm=None, no_cache=True, structured=False
+    )
+    out = io.StringIO()
+    asyncio.run(asyncio.wait_for(run_cli(args, out), timeout=30))
+    lines = sorted((json.loads(line) for line in out.getvalue().splitlines()), key=lambda line: line["id"])
+    assert [(line["id"], line["ok"]) for line in lines] == [(1, True), (2, False), (3, False)]
+    assert lines[0]["input"] == "study for my exam in 2 hours"
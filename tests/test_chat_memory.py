@@ -0,0 +1,42 @@
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage, SystemMessage
+
+from chat_memory import BudgetedChatHistory, TaskState, estimate_tokens, format_history
+from fake_llm import fake_breakdown
+
+
+def test_task_state_follows_the_conversation():
+    state = TaskState()
+    state.update(HumanMessage("study for my exam in 2 hours"))
+    state.update(AIMessage(fake_breakdown("study for my exam in 2 hours")))
+    state.update(HumanMessage("I'm done with steps 1 and 2"))
+    assert state.time_budget == 120
+    assert state.completed == [1, 2]
+    assert len(state.steps) == 4 and state.plan["Task 1"] == state.steps[0][0]
+    assert TaskState.from_dict(state.to_dict()) == state
+
+
+def test_old_turns_are_folded_into_the_summary():
+    history = BudgetedChatHistory(recent_turns=1)
+    history.add_message(HumanMessage("study for my exam in 2 hours"))
+    history.add_message(AIMessage(fake_breakdown("study for my exam in 2 hours")))
+    history.add_message(HumanMessage("step 1 is done"))
+    history.add_message(AIMessageChunk(content="Great, keep going!"))
+    messages = history.messages
+    assert isinstance(messages[0], SystemMessage)
+    assert "Time budget: 120 minutes" in messages[0].content
+    assert [message.content for message in messages[1:]] == ["step 1 is done", "Great, keep going!"]
+    assert type(messages[-1]) is AIMessage
+
+
+def test_messages_stay_within_the_token_budget():
+    history = BudgetedChatHistory(recent_turns=3, max_tokens=60)
+    for number in range(3):
+        history.add_message(HumanMessage(f"question {number} " + "word " * 40))
+        history.add_message(AIMessage(f"answer {number} " + "word " * 40))
+    assert sum(estimate_tokens(str(message.content)) for message in history.messages) <= 60
+    assert isinstance(history.messages[0], SystemMessage)
+
+
+def test_format_history():
+    messages = [SystemMessage("Task state so far:"), HumanMessage("hi"), AIMessage("hello")]
+    assert format_history(messages) == "Task state so far:\nUser: hi\nAnakin: hello"
@@ -0,0 +1,36 @@
+from chat_view import ConversationView, messages_markdown, plan_markdown
+
+
+def conversation(size):
+    return [{"role": "user" if n % 2 == 0 else "assistant", "content": f"message {n}"} for n in range(size)]
+
+
+def test_full_pages_are_rendered_once():
+    view = ConversationView(page_size=4)
+    messages = conversation(6)
+    view.sync(messages)
+    assert view.pages == [messages_markdown(messages[:4])]
+    first_page = view.pages[0]
+    messages += conversation(10)[6:]
+    view.sync(messages)
+    assert view.pages[0] is first_page and len(view.pages) == 2
+    assert view.tail(messages) == messages_markdown(messages[8:])
+
+
+def test_a_reset_conversation_drops_the_pages():
+    view = ConversationView(page_size=2)
+    view.sync(conversation(5))
+    view.sync(conversation(1))
+    assert view.pages == [] and view.tail(conversation(1)) == "**🧑 You:** message 0"
+
+
+def test_plan_markdown():
+    tasks = {
+        "Task 1": "Install", "Time required T1": "10 minutes", "Phase T1": "Setup",
+        "Task 2": "Read the docs", "Phase T2": "Setup",
+        "Task 3": "Build it", "Time required T3": "1 hour", "Phase T3": "Build",
+    }
+    text = plan_markdown(tasks, note="Fitted to 1 hour")
+    assert text.count("#### ") == 2
+    assert "**Time required:** N/A" in text
+    assert text.endswith("*Fitted to 1 hour*")
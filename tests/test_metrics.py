@@ -0,0 +1,41 @@
+import metrics
+from metrics import LLM_CALLS, STAGE_SECONDS, MetricsRegistry, timed
+
+
+def test_prometheus_text():
+    registry = MetricsRegistry()
+    calls = registry.counter("calls_total", "Calls", ("model",))
+    seconds = registry.histogram("seconds", "Latency", ("stage",), buckets=(0.1, 1))
+    calls.inc(model='say "hi"')
+    calls.inc(2, model='say "hi"')
+    for value in (0.05, 0.5, 5):
+        seconds.observe(value, stage="parse")
+    text = registry.render_prometheus()
+    assert 'calls_total{model="say \\"hi\\""} 3' in text
+    assert 'seconds_bucket{stage="parse",le="0.1"} 1' in text
+    assert 'seconds_bucket{stage="parse",le="1"} 2' in text
+    assert 'seconds_bucket{stage="parse",le="+Inf"} 3' in text
+    assert 'seconds_count{stage="parse"} 3' in text
+    assert registry.counter("calls_total", "Calls", ("model",)) is calls
+
+
+def test_timed_follows_the_sample_rate(monkeypatch):
+    monkeypatch.setattr(metrics, "sample_rate", 0.0)
+    with timed("metrics-test-off"):
+        pass
+    assert STAGE_SECONDS.count(stage="metrics-test-off") == 0
+    monkeypatch.setattr(metrics, "sample_rate", 1.0)
+    with timed("metrics-test-on"):
+        pass
+    assert STAGE_SECONDS.count(stage="metrics-test-on") == 1
+
+
+def test_llm_calls_are_counted(monkeypatch):
+    from fake_llm import FakeChatModel
+
+    monkeypatch.setenv("ANAKIN_FAKE_LATENCY", "0")
+    metrics.install_llm_metrics()
+    model = FakeChatModel.from_env("fake-metrics-test")
+    before = LLM_CALLS.value(model="fake-metrics-test", outcome="ok")
+    model.invoke("study for my exam in 2 hours")
+    assert LLM_CALLS.value(model="fake-metrics-test", outcome="ok") == before + 1
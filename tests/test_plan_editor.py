@@ -0,0 +1,85 @@
+import pytest
+
+from plan_editor import PlanEdit, apply_edit, classify_followup
+from task_parser import iter_task_dicts
+
+PLAN = {
+    "Task 1": "📖 Read the chapter",
+    "Time required T1": "30 minutes",
+    "Task 2": "✍️ Write the summary",
+    "Time required T2": "60 minutes",
+    "Task 3": "🔍 Review your notes",
+    "Time required T3": "20 minutes",
+    "Task 4": "✅ Hand it in",
+    "Time required T4": "10 minutes",
+}
+
+
+def titles(tasks):
+    return [task[f"Task {number}"] for number, task in iter_task_dicts(tasks)]
+
+
+@pytest.mark.parametrize("text, edit", [
+    ("drop step 3", PlanEdit("drop", [3])),
+    ("Please remove steps 1 and 2", PlanEdit("drop", [1, 2])),
+    ("get rid of step three", PlanEdit("drop", [3])),
+    ("swap steps 1 and 3", PlanEdit("swap", [1, 3])),
+    ("swap step 2 with step 4", PlanEdit("swap", [2, 4])),
+    ("move step 4 to the top", PlanEdit("move", [4], position=1)),
+    ("move step 1 to the end", PlanEdit("move", [1], position=4)),
+    ("move step 1 after step 3", PlanEdit("move", [1], position=3)),
+    ("move step 4 before step 2", PlanEdit("move", [4], position=2)),
+    ("split step 2", PlanEdit("split", [2])),
+    ("split step 2 into 3", PlanEdit("split", [2], parts=3)),
+    ("split step two into four", PlanEdit("split", [2], parts=4)),
+    ("break up step 1 into 3 smaller pieces", PlanEdit("split", [1], parts=3)),
+    ("split step 2 into smaller steps", PlanEdit("split", [2])),
+    ("make it 2 hours instead", PlanEdit("rescale")),
+    ("actually I only have 90 minutes", PlanEdit("rescale")),
+])
+def test_classify_followup(text, edit):
+    assert classify_followup(text, 4) == edit
+
+
+@pytest.mark.parametrize("text", [
+    "drop step 5",  # the plan has 4 steps
+    "drop steps 1, 2, 3 and 4",  # nothing would be left
+    "swap steps 2 and 2",
+    "split step 2 into 12",
+    "split step 2 into 3 hours",
+    "move step 2 before step 2",
+    "plan my week in 2 hours",
+    "what should I do first?",
+])
+def test_classify_followup_rejects(text):
+    assert classify_followup(text, 4) is None
+
+
+def test_apply_drop_move_and_swap():
+    assert titles(apply_edit(PLAN, PlanEdit("drop", [1, 3]), "drop steps 1 and 3")) == [
+        "✍️ Write the summary", "✅ Hand it in",
+    ]
+    assert titles(apply_edit(PLAN, PlanEdit("move", [4], position=1), "move step 4 to the top"))[0] == "✅ Hand it in"
+    swapped = apply_edit(PLAN, PlanEdit("swap", [1, 2]), "swap steps 1 and 2")
+    assert titles(swapped)[:2] == ["✍️ Write the summary", "📖 Read the chapter"]
+    assert swapped["Time required T1"] == "60 minutes"
+
+
+def test_apply_split_shares_the_step_time():
+    answer = "- 📝 Outline the summary (10 minutes)\n- ✍️ Write it out (30 minutes)\n- 🔍 Tidy it up (20 minutes)"
+    tasks = apply_edit(PLAN, PlanEdit("split", [2], parts=3), "split step 2 into 3", answer)
+    assert titles(tasks)[1:4] == ["Outline the summary", "Write it out", "Tidy it up"]
+    assert [tasks[f"Time required T{number}"] for number in (2, 3, 4)] == ["10 minutes", "30 minutes", "20 minutes"]
+    assert len(titles(tasks)) == 6
+
+
+def test_apply_split_without_a_usable_answer():
+    tasks = apply_edit(PLAN, PlanEdit("split", [2], parts=2), "split step 2 into 2", "Sure!")
+    assert titles(tasks)[1:3] == ["✍️ Write the summary (part 1 of 2)", "✍️ Write the summary (part 2 of 2)"]
+    assert tasks["Time required T2"] == tasks["Time required T3"] == "30 minutes"
+
+
+def test_apply_rescale():
+    tasks = apply_edit(PLAN, PlanEdit("rescale"), "make it 1 hour instead")
+    minutes = [int(task[f"Time required T{number}"].split()[0]) for number, task in iter_task_dicts(tasks)]
+    assert sum(minutes) == 60
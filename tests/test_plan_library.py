@@ -0,0 +1,84 @@
+import pytest
+
+import plan_library
+from plan_library import PlanLibrary, library_stamp, open_library, validate_plan, write_library
+
+CHAPTER_5 = {"Task 1": "Read chapter 5", "Time required T1": "60 minutes"}
+CHAPTER_7 = {"Task 1": "Read chapter 7", "Time required T1": "60 minutes"}
+OOP = {}
+for number, title in enumerate(["Classes", "Inheritance", "Polymorphism", "Practice"], 1):
+    OOP.update({f"Task {number}": title, f"Time required T{number}": "60 minutes"})
+
+
+@pytest.fixture
+def library(tmp_path):
+    path = str(tmp_path / "plans.lib")
+    write_library(path, "v1", [
+        ("read chapter 5 of biology in 1 hour", CHAPTER_5),
+        ("read chapter 7 of biology in 1 hour", CHAPTER_7),
+        ("study python oop in 4 hours", OOP),
+    ])
+    library = PlanLibrary(path)
+    yield library
+    library.close()
+
+
+def test_round_trip(library):
+    assert len(library) == 3
+    assert library.version == library_stamp("v1")
+    assert library.lookup("I want to study oops in python in next 4 hours") == (OOP, True)
+
+
+def test_numbers_pick_their_own_slot(library):
+    assert library.lookup("read chapter 7 of biology in 1 hour") == (CHAPTER_7, True)
+    assert library.lookup("read chapter 5 of biology in 60 minutes") == (CHAPTER_5, True)
+    assert library.lookup("read chapter 9 of biology in 1 hour") is None
+
+
+def test_close_duration_is_rescaled(library):
+    tasks, exact = library.lookup("study python oop in 5 hours")
+    assert not exact
+    assert tasks["Time required T1"] == "75 minutes"
+    assert library.lookup("study python oop in 10 hours") is None
+
+
+def test_misses(library):
+    assert library.lookup("learn rust in 2 hours") is None
+    assert library.lookup("in 2 hours") is None
+
+
+def test_many_plans(tmp_path):
+    path = str(tmp_path / "many.lib")
+    plans = [(f"topic{i} unit {i % 7} in {30 * (1 + i % 5)} minutes", {"Task 1": str(i)}) for i in range(5000)]
+    assert write_library(path, "v1", plans) == 5000
+    library = PlanLibrary(path)
+    for i in (0, 1234, 4999):
+        assert library.lookup(f"topic{i} unit {i % 7} in {30 * (1 + i % 5)} minutes") == ({"Task 1": str(i)}, True)
+    library.close()
+
+
+def test_other_version_is_stale(tmp_path):
+    path = str(tmp_path / "plans.lib")
+    write_library(path, "v1", [("study python oop in 4 hours", OOP)])
+    assert open_library(path, "v2") is None
+    assert len(open_library(path, "v1")) == 1
+
+
+def test_library_from_older_key_format_is_stale(tmp_path, monkeypatch):
+    path = str(tmp_path / "plans.lib")
+    monkeypatch.setattr(plan_library, "KEY_VERSION", plan_library.KEY_VERSION - 1)
+    write_library(path, "v1", [("study python oop in 4 hours", OOP)])
+    monkeypatch.undo()
+    assert open_library(path, "v1") is None
+
+
+def test_not_a_library(tmp_path):
+    path = tmp_path / "plans.lib"
+    path.write_bytes(b"not a plan library at all")
+    assert open_library(str(path), "v1") is None
+
+
+def test_validate_plan():
+    assert validate_plan("study python oop in 4 hours", OOP) is None
+    assert validate_plan("study python oop in 4 hours", {}) == "no steps"
+    assert validate_plan("study python oop in 1 hour", OOP) is not None
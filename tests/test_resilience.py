@@ -0,0 +1,160 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    DeadlineExceeded,
+    HedgePool,
+    ResiliencePolicy,
+    ResilientCaller,
+)
+
+
+def open_breaker(reset_timeout=30.0):
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=reset_timeout)
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    return breaker
+
+
+def test_breaker_opens_after_failures_in_a_row():
+    breaker = CircuitBreaker("test", failure_threshold=2)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker = open_breaker()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_breaker_lets_one_probe_through_once_cooled_down():
+    breaker = open_breaker(reset_timeout=0)
+    breaker.before_call()
+    assert breaker.state == "half-open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()  # only one probe at a time
+    breaker.record_success()
+    assert breaker.state == "closed"
+    breaker.before_call()
+
+
+def test_failed_probe_reopens_the_breaker():
+    breaker = open_breaker(reset_timeout=0)
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    breaker.reset_timeout = 30.0
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_backoff_stays_within_the_cap():
+    policy = ResiliencePolicy(base_delay=0.5, max_delay=2.0)
+    for attempt in range(1, 8):
+        assert 0 <= policy.backoff(attempt) <= min(2.0, 0.5 * 2 ** (attempt - 1))
+
+
+def caller(**policy):
+    options = {"base_delay": 0, "max_delay": 0, **policy}
+    return ResilientCaller("test", ResiliencePolicy(**options), CircuitBreaker("test"))
+
+
+def test_calls_without_hedging_run_in_the_callers_thread():
+    assert caller().call(threading.get_ident) == threading.get_ident()
+
+
+def test_retryable_errors_are_retried():
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ConnectionError("reset")
+        return "ok"
+
+    assert caller(max_attempts=3).call(flaky) == "ok"
+    assert len(attempts) == 3
+
+
+def test_other_errors_are_not_retried():
+    attempts = []
+
+    def refused():
+        attempts.append(1)
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        caller(max_attempts=3).call(refused)
+    assert len(attempts) == 1
+
+
+def test_a_client_timeout_past_the_deadline_is_a_deadline_exceeded():
+    def slow():
+        time.sleep(0.05)
+        raise TimeoutError("client timeout")
+
+    with pytest.raises(DeadlineExceeded):
+        caller(deadline=0.05).call(slow)
+
+
+def test_hedge_pool_never_holds_more_than_its_workers():
+    pool = HedgePool(2)
+    release = threading.Event()
+    futures = [pool.submit(release.wait), pool.submit(release.wait)]
+    assert pool.submit(release.wait) is None
+    release.set()
+    for future in futures:
+        future.result(timeout=1)
+    time.sleep(0.01)  # the slots are released by done callbacks
+    assert pool.submit(lambda: "ok").result(timeout=1) == "ok"
+
+
+def half_open_caller():
+    breaker = open_breaker(reset_timeout=0)
+    return ResilientCaller("test", ResiliencePolicy(deadline=None), breaker), breaker
+
+
+def test_a_probe_stream_closed_early_lets_the_next_call_through():
+    caller, breaker = half_open_caller()
+    stream = caller.stream(lambda: iter(["a", "b", "c"]))
+    assert next(stream) == "a"
+    stream.close()
+    assert caller.call(lambda: "ok") == "ok"
+    assert breaker.state == "closed"
+
+
+def test_an_abandoned_async_probe_lets_the_next_call_through():
+    caller, breaker = half_open_caller()
+
+    async def chunks():
+        for chunk in ("a", "b", "c"):
+            yield chunk
+
+    async def answer():
+        return "ok"
+
+    async def stall():
+        await asyncio.sleep(10)
+
+    async def main():
+        stream = caller.astream(chunks)
+        assert await stream.__anext__() == "a"
+        await stream.aclose()
+        assert breaker._probing is False
+
+        probe = asyncio.create_task(caller.acall(stall))
+        await asyncio.sleep(0.01)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+        return await caller.acall(answer)
+
+    assert asyncio.run(main()) == "ok"
+    assert breaker.state == "closed"
@@ -0,0 +1,48 @@
+from langchain_core.messages import AIMessage, HumanMessage
+
+from response_cache import ResponseCache, make_key, normalize_input
+
+
+def test_keys_ignore_casing_and_punctuation_but_not_history():
+    assert normalize_input("  Study  OOPS in 4 hours!! ") == "study oops in 4 hours"
+    key = make_key("breakdown", "Study oops.", "template", "model")
+    assert key == make_key("breakdown", "study   OOPS", "template", "model")
+    assert key != make_key("parse", "study oops", "template", "model")
+    assert key != make_key("breakdown", "study oops", "template v2", "model")
+    history = [HumanMessage("study oops"), AIMessage("**Step 1: Read**")]
+    assert key != make_key("breakdown", "study oops", "template", "model", history)
+    assert make_key("parse", "A", "t", "m", normalize=False) != make_key("parse", "a", "t", "m", normalize=False)
+
+
+def test_disk_tier_outlives_the_process(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    ResponseCache(path).set("key", "answer")
+    cache = ResponseCache(path)
+    assert cache.get("key") == "answer"
+    assert cache.get("key") == "answer"
+    assert cache.stats["disk_hits"] == 1 and cache.stats["memory_hits"] == 1
+
+
+def test_expired_entries_are_misses(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"), ttl=-1)
+    cache.set("key", "answer")
+    assert cache.get("key") is None
+    assert cache.hit_rate() == 0.0
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"), max_memory_entries=2, max_disk_entries=2)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    cache.get("a")
+    cache.set("c", "3")
+    assert list(cache._memory) == ["a", "c"]
+    (count,) = cache._db.execute("SELECT COUNT(*) FROM responses").fetchone()
+    assert count == 2
+
+
+def test_memory_only_cache():
+    cache = ResponseCache(path=None, max_memory_entries=1)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    assert cache.get("a") is None and cache.get("b") == "2"
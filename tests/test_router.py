@@ -0,0 +1,157 @@
+import subprocess
+import sys
+
+import pytest
+
+import router
+from conftest import ROOT
+from router import Route, breakdown_problem, local_breakdown, route_request, run_cascade, score_request
+from task_parser import parse_breakdown
+
+
+def test_core_import_stays_lazy():
+    code = "import sys, anakin_core; sys.exit('pydantic' in sys.modules or 'langchain_core' in sys.modules)"
+    assert subprocess.run([sys.executable, "-c", code], cwd=ROOT).returncode == 0
+
+
+def test_score_request():
+    assert sum(score_request("read one chapter in 30 minutes").values()) == 0
+    assert score_request("learn full stack in 3 months") == {"duration": 3, "breadth": 2, "history": 0, "length": 0}
+    assert score_request("study oops", history_length=6)["history"] == 2
+
+
+def test_route_request(monkeypatch):
+    monkeypatch.delenv("ANAKIN_ROUTER", raising=False)
+    monkeypatch.delenv("ANAKIN_ROUTER_LOCAL", raising=False)
+    assert route_request("read one chapter in 30 minutes").tier == "fast"
+    assert route_request("learn html, css and javascript for full stack in 3 months").tier == "strong"
+    monkeypatch.setenv("ANAKIN_ROUTER_LOCAL", "1")
+    assert route_request("read one chapter in 30 minutes").tier == "local"
+    monkeypatch.setenv("ANAKIN_ROUTER", "0")
+    assert route_request("read one chapter in 30 minutes").tier == "strong"
+
+
+def test_local_breakdown_fits_the_budget():
+    tasks = parse_breakdown(local_breakdown("write my essay in 15 minutes"))
+    minutes = [int(tasks[f"Time required T{n}"].split()[0]) for n in range(1, 4)]
+    assert "Task 4" not in tasks and sum(minutes) == 15
+
+
+def test_breakdown_problem():
+    assert breakdown_problem(local_breakdown("read one chapter in 30 minutes"), "read in 30 minutes") is None
+    assert breakdown_problem("Sure, just read it.", "read a chapter in 30 minutes") == "unparseable"
+    assert breakdown_problem("How much time do you have?", "read a chapter") is None
+    assert breakdown_problem("**Step 1: Read**\n", "read a chapter in 30 minutes") == "missing_times"
+
+
+def test_plan_problem():
+    from task_plan import PlanPhase, PlanStep, TaskPlan
+
+    timed = TaskPlan(header="x", phases=[PlanPhase(steps=[PlanStep(title="Read", minutes=30)])])
+    untimed = TaskPlan(header="x", phases=[PlanPhase(steps=[PlanStep(title="Read")])])
+    assert router.plan_problem(timed, "read in 30 minutes") is None
+    assert router.plan_problem(untimed, "read in 30 minutes") == "missing_times"
+    assert router.plan_problem(TaskPlan(header="x", message="How long?"), "read") is None
+    assert router.plan_problem(TaskPlan(header="x"), "read") == "empty"
+    assert router.plan_problem(None, "read in 30 minutes") == "empty"
+
+
+def test_cascade_escalates_until_an_answer_validates():
+    calls = []
+
+    def call(tier):
+        calls.append(tier)
+        return "bad" if tier == "fast" else "good"
+
+    answer = run_cascade(Route("fast", 0), call, lambda answer: None if answer == "good" else "unparseable")
+    assert answer == "good" and calls == ["fast", "strong"]
+
+
+def test_cascade_escalates_invalid_output_and_keeps_the_strong_answer():
+    def call(tier):
+        if tier == "fast":
+            raise ValueError("not a TaskPlan")
+        return "still bad"
+
+    assert run_cascade(Route("fast", 0), call, lambda answer: "unparseable") == "still bad"
+    with pytest.raises(ValueError):
+        run_cascade(Route("strong", 0), lambda tier: (_ for _ in ()).throw(ValueError()), lambda answer: None)
+
+
+def test_cascade_does_not_escalate_other_errors():
+    def call(tier):
+        raise TimeoutError
+
+    with pytest.raises(TimeoutError):
+        run_cascade(Route("fast", 0), call, lambda answer: None)
+
+
+def test_structured_answer_without_a_plan_escalates(monkeypatch):
+    import anakin_core
+    from fake_llm import fake_plan
+
+    monkeypatch.setenv("ANAKIN_FAKE_LLM", "1")
+    monkeypatch.setenv("ANAKIN_SESSION_BACKEND", "memory")
+    monkeypatch.delenv("ANAKIN_ROUTER", raising=False)
+    monkeypatch.delenv("ANAKIN_ROUTER_LOCAL", raising=False)
+    answers = {"fake-anakin-fast": None, "fake-anakin": fake_plan("read a chapter in 30 minutes")}
+
+    class Chain:
+        def __init__(self, model):
+            self.model = model
+
+        def invoke(self, variables):
+            return answers[self.model]
+
+    monkeypatch.setattr(anakin_core, "get_structured_chain", Chain)
+    monkeypatch.setattr(anakin_core, "structured_input", lambda user_input, session_id: {})
+    plan = anakin_core.routed_plan("read a chapter in 30 minutes", "router-test")
+    assert plan is answers["fake-anakin"]
+
+    answers["fake-anakin"] = None
+    with pytest.raises(ValueError):
+        anakin_core.routed_plan("read a chapter in 30 minutes", "router-test")
+
+
+def test_an_empty_json_plan_does_not_escalate():
+    import anakin_core
+
+    calls = []
+
+    def call(tier):
+        calls.append(tier)
+        return "{}" if tier == "fast" else '{"Task 1": "Read"}'
+
+    assert run_cascade(Route("fast", 0), call, anakin_core.parse_problem, stage="parse") == "{}"
+    assert calls == ["fast"]
+    assert anakin_core.parse_problem("Sorry, I can't help.") == "invalid_json"
+
+
+def test_async_structured_answer_without_a_plan_escalates(monkeypatch):
+    import asyncio
+
+    import anakin_core
+    from fake_llm import fake_plan
+
+    monkeypatch.setenv("ANAKIN_FAKE_LLM", "1")
+    monkeypatch.setenv("ANAKIN_SESSION_BACKEND", "memory")
+    monkeypatch.delenv("ANAKIN_ROUTER", raising=False)
+    monkeypatch.delenv("ANAKIN_ROUTER_LOCAL", raising=False)
+    answers = {"fake-anakin-fast": None, "fake-anakin": fake_plan("read a chapter in 30 minutes")}
+    calls = []
+
+    class Chain:
+        def __init__(self, model):
+            self.model = model
+
+        async def ainvoke(self, variables):
+            calls.append(self.model)
+            return answers[self.model]
+
+    monkeypatch.setattr(anakin_core, "get_structured_chain", Chain)
+    plan = asyncio.run(anakin_core.arouted_plan("read a chapter in 30 minutes", "arouter-test"))
+    assert plan is answers["fake-anakin"] and calls == ["fake-anakin-fast", "fake-anakin"]
+
+    answers["fake-anakin"] = None
+    with pytest.raises(ValueError):
+        asyncio.run(anakin_core.arouted_plan("read a chapter in 30 minutes", "arouter-test"))
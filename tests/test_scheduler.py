@@ -0,0 +1,79 @@
+import random
+
+import pytest
+
+from scheduler import MIN_STEP_MINUTES, distribute, enforce_budget, step_count_range
+from task_parser import iter_task_dicts, parse_duration
+
+
+def plan(*minutes):
+    tasks = {}
+    for number, value in enumerate(minutes, 1):
+        tasks[f"Task {number}"] = f"Step {number}"
+        if value is not None:
+            tasks[f"Time required T{number}"] = f"{value} minutes"
+    return tasks
+
+
+def step_times(tasks):
+    times = []
+    for number, task in iter_task_dicts(tasks):
+        low, high = parse_duration(task[f"Time required T{number}"])
+        times.append(round((low + high) / 2))
+    return times
+
+
+def test_distribute_adds_up_to_the_total():
+    generator = random.Random(0)
+    for _ in range(500):
+        weights = [generator.uniform(0.1, 100) for _ in range(generator.randint(1, 12))]
+        total = generator.randint(len(weights), 16 * 60)
+        minutes = distribute(weights, total)
+        assert sum(minutes) == total
+        assert min(minutes) >= 1
+
+
+def test_distribute_uses_five_minute_units_when_it_can():
+    minutes = distribute([1, 2, 3], 60)
+    assert minutes == [10, 20, 30]
+    assert all(value % MIN_STEP_MINUTES == 0 for value in distribute([1, 1, 1], 100))
+
+
+def test_distribute_shares_zero_weights_equally():
+    assert distribute([0, 0, 0], 60) == [20, 20, 20]
+    assert sum(distribute([0, 0], 7)) == 7
+
+
+@pytest.mark.parametrize("minutes, low, high", [(10, 1, 3), (30, 2, 4), (120, 3, 5), (240, 4, 8), (300, 5, 12)])
+def test_step_count_range(minutes, low, high):
+    assert step_count_range(minutes) == (low, high)
+
+
+@pytest.mark.parametrize("tasks, user_input", [
+    (plan(30, 30), "study for my exam in 2 hours"),  # too few steps
+    (plan(*[10] * 12), "clean the kitchen in 1 hour"),  # too many steps
+    (plan(20, 40, 30, 10), "write my essay in 3 hours"),  # right count, wrong total
+    (plan(None, None, None, None), "revise chemistry in 90 minutes"),  # no estimates
+    (plan(45, 45), "read the chapter in 30 minutes"),
+])
+def test_enforce_budget_fits_count_and_total(tasks, user_input):
+    result = enforce_budget(tasks, user_input)
+    assert result.ok
+    low, high = step_count_range(result.total)
+    times = step_times(result.tasks)
+    assert low <= len(times) <= high
+    assert sum(times) == result.total
+    assert result.budget[0] <= result.total <= result.budget[1]
+
+
+def test_enforce_budget_keeps_a_plan_that_fits():
+    tasks = plan(30, 60, 20, 10)
+    result = enforce_budget(tasks, "study for 2 hours")
+    assert result.ok and result.changes == []
+    assert result.tasks == tasks
+
+
+def test_enforce_budget_leaves_calendar_budgets_and_plans_without_budget():
+    tasks = plan(60, 60)
+    assert enforce_budget(tasks, "learn python in 3 months").tasks == tasks
+    assert enforce_budget(tasks, "learn python").total is None
@@ -0,0 +1,39 @@
+from semantic_cache import SemanticCache, extract_slots, rescale_tasks
+from task_parser import extract_duration
+
+PLAN = {"Task 1": "Read", "Time required T1": "40 minutes", "Task 2": "Review", "Time required T2": "20 minutes"}
+
+
+def test_duration_is_removed_from_the_topic():
+    assert extract_slots("I want to study oops in next 4 hours") == (("oop",), (240, 240))
+    assert extract_slots("study OOP for 4h") == (("oop",), (240, 240))
+    assert extract_slots("within the next 45-60 minutes revise maths") == (("revise", "math"), (45, 60))
+
+
+def test_other_numbers_stay_in_the_topic():
+    tokens, duration = extract_slots("read chapter 7 of biology in 1 hour")
+    assert tokens == ("read", "chapter", "7", "biology")
+    assert duration == (60, 60)
+    assert extract_slots("revise unit 3 in 2 hours")[0] == ("revise", "unit", "3")
+
+
+def test_requests_differing_only_by_a_number_do_not_match():
+    cache = SemanticCache()
+    cache.add("read chapter 5 of biology in 1 hour", PLAN)
+    assert cache.lookup("read chapter 7 of biology in 1 hour") is None
+    tasks, similarity = cache.lookup("read chapter 5 of biology in 1 hour")
+    assert tasks == PLAN and similarity == 1.0
+
+
+def test_near_duplicate_is_rescaled_to_the_new_budget():
+    cache = SemanticCache()
+    cache.add("study python oop in 1 hour", PLAN)
+    tasks, _ = cache.lookup("I want to learn oops in python in 75 minutes")
+    assert tasks["Time required T1"] == "50 minutes"
+    assert tasks["Time required T2"] == "25 minutes"
+
+
+def test_rescale_keeps_the_total_exact():
+    tasks = rescale_tasks(PLAN, 61)
+    minutes = [extract_duration(tasks[f"Time required T{n}"])[0] for n in (1, 2)]
+    assert sum(minutes) == 61
@@ -0,0 +1,107 @@
+import asyncio
+import json
+import threading
+import time
+
+import httpx
+import pytest
+
+import anakin_core
+from service import PlanningService
+
+
+@pytest.fixture
+def fake_model(monkeypatch):
+    monkeypatch.setenv("ANAKIN_FAKE_LLM", "1")
+    monkeypatch.setenv("ANAKIN_SESSION_BACKEND", "memory")
+
+
+def post(app, path, body):
+    async def main():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://service") as client:
+            return await client.post(path, json=body)
+
+    return asyncio.run(main())
+
+
+def batch(size):
+    return {"requests": [{"input": f"read chapter {number} in 30 minutes"} for number in range(size)]}
+
+
+def test_batches_the_queue_can_never_admit_are_rejected_as_too_large():
+    app = PlanningService(concurrency=2, queue=3)
+    response = post(app, "/v1/plans/batch", batch(6))
+    assert response.status_code == 413
+
+
+def test_a_full_size_batch_is_admitted_on_an_idle_server(fake_model):
+    app = PlanningService(concurrency=2, queue=3)
+    response = post(app, "/v1/plans/batch", batch(5))
+    assert response.status_code == 200
+    assert all("tasks" in result for result in response.json()["results"])
+
+
+def test_max_batch_is_checked_at_startup():
+    with pytest.raises(ValueError):
+        PlanningService(concurrency=2, queue=3, max_batch=6)
+    assert PlanningService(concurrency=16, queue=64).max_batch == 80
+
+
+def sse_events(text):
+    events = []
+    for block in text.strip().split("\n\n"):
+        event, data = block.split("\n")
+        events.append((event.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+    return events
+
+
+@pytest.mark.parametrize("structured", [False, True])
+def test_stream_sends_every_step_then_the_plan(fake_model, monkeypatch, structured):
+    monkeypatch.setenv("ANAKIN_FAKE_LATENCY", "0")
+    get_task_plan, planned = anakin_core.get_task_plan, []
+    monkeypatch.setattr(anakin_core, "get_task_plan", lambda *args: planned.append(args) or get_task_plan(*args))
+    body = {"input": "study for my exam in 2 hours", "fresh": True, "structured": structured}
+    response = post(PlanningService(), "/v1/plan/stream", body)
+    events = sse_events(response.text)
+    assert [event for event, _ in events[:2]] == ["session", "step"]
+    assert events[-1][0] == "done" and events[-1][1]["total_minutes"] == 120
+    steps = {key: value for event, data in events if event == "step" for key, value in data.items()}
+    assert set(steps) == set(events[-1][1]["tasks"])
+    assert bool(planned) == structured
+
+
+def test_a_cancelled_stream_stops_its_producer_and_frees_its_slot(monkeypatch):
+    closed = threading.Event()
+
+    def endless(*args):
+        try:
+            for number in range(1, 10_000):
+                time.sleep(0.005)
+                yield {f"Task {number}": "Read", f"Time required T{number}": "5 minutes"}
+        finally:
+            closed.set()
+
+    monkeypatch.setattr(anakin_core, "stream_parsed_tasks", endless)
+    app = PlanningService(concurrency=1, queue=0)
+    scope = {"type": "http", "method": "POST", "path": "/v1/plan/stream", "headers": []}
+
+    async def receive():
+        return {"type": "http.request", "body": b'{"input": "read a chapter"}', "more_body": False}
+
+    async def main():
+        first_step = asyncio.Event()
+
+        async def send(message):
+            if message.get("body", b"").startswith(b"event: step"):
+                first_step.set()
+
+        request = asyncio.create_task(app(scope, receive, send))
+        await asyncio.wait_for(first_step.wait(), 5)
+        request.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await request
+        assert app.admission.active == 0
+        return await asyncio.to_thread(closed.wait, 5)
+
+    assert asyncio.run(main())
@@ -0,0 +1,27 @@
+import session_store
+from session_store import SQLiteSessionBackend
+
+
+def add_message(backend, session_id, content):
+    backend.append(session_id, "human", content, lambda state: {**state, "turns": state.get("turns", 0) + 1})
+
+
+def test_reads_do_not_write(tmp_path):
+    backend = SQLiteSessionBackend(str(tmp_path / "sessions.sqlite"))
+    add_message(backend, "s1", "study for my exam in 2 hours")
+    db = backend._connect()
+    writes = db.total_changes
+    for _ in range(3):
+        state, count, messages = backend.load("s1", 10)
+    assert db.total_changes == writes
+    assert (state, count, messages) == ({"turns": 1}, 1, [("human", "study for my exam in 2 hours")])
+
+
+def test_reads_refresh_a_stale_last_seen(tmp_path, monkeypatch):
+    backend = SQLiteSessionBackend(str(tmp_path / "sessions.sqlite"))
+    add_message(backend, "s1", "hello")
+    monkeypatch.setattr(session_store.time, "time", lambda: 10**10)
+    backend.load("s1", 10)
+    assert backend.evict_idle(60) == 0
+    (last_seen,) = backend._connect().execute("SELECT last_seen FROM sessions").fetchone()
+    assert last_seen == 10**10
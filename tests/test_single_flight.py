@@ -0,0 +1,118 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from single_flight import SessionGuard, SingleFlight
+
+
+def test_follower_gets_the_leaders_result():
+    flight = SingleFlight("test")
+    leader, future = flight.claim("key")
+    follower, shared = flight.claim("key")
+    assert leader and not follower and shared is future
+    flight.finish("key", future, "answer")
+    assert shared.result(timeout=1) == "answer"
+    assert flight.claim("key")[0]  # a finished call is not reused
+
+
+def test_finish_with_an_error_reaches_the_followers():
+    flight = SingleFlight("test")
+    _, future = flight.claim("key")
+    _, shared = flight.claim("key")
+    flight.finish("key", future, error=ConnectionError("down"))
+    with pytest.raises(ConnectionError):
+        shared.result(timeout=1)
+
+
+def test_do_runs_once_for_concurrent_callers():
+    flight = SingleFlight("test")
+    calls = []
+    started = threading.Event()
+    release = threading.Event()
+
+    def work():
+        calls.append(1)
+        started.set()
+        release.wait(1)
+        return "answer"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do("key", work)))
+    leader.start()
+    started.wait(1)
+    follower = threading.Thread(target=lambda: results.append(flight.do("key", work)))
+    follower.start()
+    time.sleep(0.05)
+    release.set()
+    leader.join(1)
+    follower.join(1)
+    assert len(calls) == 1
+    assert sorted(results) == [("answer", False), ("answer", True)]
+
+
+def test_followers_of_an_abandoned_call_run_it_themselves():
+    flight = SingleFlight("test")
+    _, future = flight.claim("key")
+    result = []
+    follower = threading.Thread(target=lambda: result.append(flight.do("key", lambda: "own answer")))
+    follower.start()
+    time.sleep(0.05)
+    flight.abandon("key", future)
+    follower.join(1)
+    assert result == [("own answer", False)]
+
+
+def test_ado_retries_after_an_abandoned_leader():
+    flight = SingleFlight("test")
+
+    async def main():
+        _, future = flight.claim("key")
+
+        async def work():
+            return "own answer"
+
+        follower = asyncio.create_task(flight.ado("key", work))
+        await asyncio.sleep(0.01)
+        flight.abandon("key", future)
+        return await follower
+
+    assert asyncio.run(main()) == ("own answer", False)
+
+
+def test_session_guard_is_reentrant_and_serializes_threads():
+    guard = SessionGuard()
+    order = []
+
+    def other():
+        with guard.hold("s1"):
+            order.append("other")
+
+    with guard.hold("s1"):
+        with guard.hold("s1"):  # the holder may enter again
+            thread = threading.Thread(target=other)
+            thread.start()
+            time.sleep(0.05)
+            order.append("holder")
+    thread.join(1)
+    assert order == ["holder", "other"]
+    with guard.hold("s2"):
+        pass  # other sessions are independent
+
+
+def test_session_guard_serializes_asyncio_tasks():
+    guard = SessionGuard(poll_seconds=0.001)
+    order = []
+
+    async def turn(name):
+        async with guard.ahold("s1"):
+            order.append(f"{name} start")
+            await asyncio.sleep(0.01)
+            order.append(f"{name} end")
+
+    async def main():
+        await asyncio.gather(turn("a"), turn("b"))
+
+    asyncio.run(main())
+    assert order in (["a start", "a end", "b start", "b end"], ["b start", "b end", "a start", "a end"])
@@ -0,0 +1,67 @@
+import pytest
+
+from fake_llm import fake_breakdown, fake_malformed
+from task_parser import (
+    BreakdownParseError,
+    BreakdownParser,
+    extract_duration,
+    parse_breakdown,
+    parse_duration,
+    strip_code_fence,
+    to_task_dict,
+)
+
+
+@pytest.mark.parametrize("text, duration", [
+    ("30 minutes", (30, 30)),
+    ("**1 hour 30 minutes**", (90, 90)),
+    ("45-60 min", (45, 60)),
+    ("2h30", (150, 150)),
+    ("a while", None),
+])
+def test_parse_duration(text, duration):
+    assert parse_duration(text) == duration
+
+
+@pytest.mark.parametrize("text, duration", [
+    ("study oops in next 4 hours", (240, 240)),
+    ("read chapter 5 in four hours", (240, 240)),
+    ("finish the essay in an hour and a half", (90, 90)),
+    ("plan my week", None),
+])
+def test_extract_duration(text, duration):
+    assert extract_duration(text) == duration
+
+
+def test_parse_breakdown():
+    tasks = parse_breakdown(fake_breakdown("study for math exam in 2 hours"))
+    assert tasks["Task 1"] == "Skim the material"
+    assert tasks["Time required T4"] == "30 minutes"
+    assert len([key for key in tasks if key.startswith("Task ")]) == 4
+
+
+def test_parse_breakdown_rejects_other_formats():
+    with pytest.raises(BreakdownParseError):
+        parse_breakdown(fake_malformed("study for math in 2 hours"))
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, 64])
+def test_streamed_steps_match_the_whole_answer(size):
+    text = fake_breakdown("write my essay in 3 hours")
+    parser = BreakdownParser()
+    steps = []
+    for start in range(0, len(text), size):
+        steps.extend(parser.feed(text[start:start + size]))
+    steps.extend(parser.close())
+    assert to_task_dict(steps) == parse_breakdown(text)
+
+
+def test_a_step_is_emitted_once_its_time_line_is_complete():
+    parser = BreakdownParser()
+    assert parser.feed("**Step 1: 📚 Read**\n⏱️ **Time:** 10 min") == []
+    emitted = parser.feed("utes\n")
+    assert to_task_dict(emitted) == {"Task 1": "Read", "Time required T1": "10 minutes"}
+
+
+def test_strip_code_fence():
+    assert strip_code_fence('```json\n{"Task 1": "Read"}\n```') == '{"Task 1": "Read"}'
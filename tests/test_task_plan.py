@@ -0,0 +1,43 @@
+import anakin_core
+from task_parser import parse_breakdown
+from task_plan import PlanPhase, PlanStep, TaskPlan
+
+PLAN = TaskPlan(
+    header="Study for the exam",
+    phases=[
+        PlanPhase(steps=[
+            PlanStep(emoji="📖", title="Read the notes", description="Skim every chapter.", minutes=45),
+            PlanStep(emoji="✍️", title="Do practice questions", minutes=60),
+            PlanStep(title="Review mistakes", minutes=15),
+        ]),
+    ],
+)
+
+
+def test_markdown_parses_back_to_the_task_dict():
+    assert parse_breakdown(PLAN.to_markdown()) == PLAN.to_task_dict()
+    assert PLAN.total_minutes == 120
+
+
+def test_phases_and_missing_times():
+    plan = TaskPlan(header="x", phases=[PlanPhase(name="🎯 Setup", steps=[PlanStep(title="Install")])])
+    assert plan.to_task_dict() == {"Task 1": "Install", "Phase T1": "Setup"}
+    assert plan.total_minutes is None
+    assert "### 🎯 Setup" in plan.to_markdown()
+
+
+def test_a_plan_without_steps_shows_its_message():
+    plan = TaskPlan(header="Learn python", message="How much time do you have?")
+    assert plan.to_task_dict() == {}
+    assert "How much time do you have?" in plan.to_markdown()
+
+
+def test_structured_planning_records_the_plan_as_markdown(monkeypatch):
+    monkeypatch.setenv("ANAKIN_FAKE_LLM", "1")
+    monkeypatch.setenv("ANAKIN_FAKE_LATENCY", "0")
+    monkeypatch.setenv("ANAKIN_SESSION_BACKEND", "memory")
+    plan = anakin_core.get_task_plan("study for my exam in 2 hours", "task-plan-test", use_cache=False)
+    assert plan.steps
+    messages = anakin_core.session_messages("task-plan-test")
+    assert [message.type for message in messages] == ["human", "ai"]
+    assert messages[1].content == plan.to_markdown()